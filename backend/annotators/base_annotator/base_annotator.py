@@ -2,6 +2,11 @@ from dataclasses import dataclass, field, asdict
 from abc import ABC, abstractmethod
 @dataclass
 class BaseAnnotator:
+    # _annotate(paragraphs) returns one output per paragraph and output i only
+    # depends on paragraphs[i]; the inference cache relies on this to annotate
+    # a subset of a document. Set to False when outputs depend on the whole input.
+    paragraph_local = True
+
     def __init__(self):
         self.type="base_annotator"
     
@@ -20,6 +25,13 @@ class BaseAnnotator:
     @abstractmethod
     def _predict_relation(self,input_string):
         raise NotImplementedError
+
+    def cache_fingerprint(self):
+        """
+        Identifies the model behind this annotator for the inference cache
+        (utils/inference_cache.py); override when outputs depend on checkpoints or settings.
+        """
+        return self.type
     
     # @abstractmethod
     # def _predict(self,input_string):
@@ -29,6 +29,9 @@ class BiomedicalAnnotator(BaseAnnotator):
         final_output = kapipe_to_brat(outputs)
         return final_output,final_output
 
+    def cache_fingerprint(self):
+        return f"{self.type}:{self.identifier}"
+
     
     def _predict_entity(self,text):
         outputs= []
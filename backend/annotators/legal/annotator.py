@@ -3,46 +3,48 @@ from typing import List, Dict
 import spacy
 
 from ..base_annotator import BaseAnnotator
-from .dependencies import extract_entities_from_judgment_text
+from .dependencies import extract_entities_from_judgment_text, extract_entities_from_paragraphs, load_sentence_splitter
 import traceback
 
 class LegalAnnotator(BaseAnnotator):
-    def __init__(self,**kwagrs):
+    def __init__(self,document_level=False,batch_size=64,n_process=1,**kwagrs):
         super()
         self.type="legal_annotator"
         self.legal_nlp=spacy.load('en_legal_ner_trf')
         self.preamble_spiltting_nlp = spacy.load('en_core_web_sm')
         self.run_type='sent'
         self.do_postprocess=True 
+        # document_level: one preamble split and one streamed legal_nlp.pipe per document instead of per paragraph
+        self.document_level = document_level
+        # a paragraph's output then depends on the rest of the document: no per-paragraph caching or brokering
+        self.paragraph_local = not document_level
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.sentence_nlp = load_sentence_splitter('en_core_web_sm') if document_level else None
+
+    @staticmethod
+    def _to_brat(combined_doc, paragraph):
+        if combined_doc is None:
+            return {"text": paragraph, "entities": [], "relations": []}
+        entitites = []
+        for index,ent in enumerate(combined_doc.ents,start=1):
+            entitites.append([f"T{index}", ent.label_, [[ent.start_char, ent.end_char]], "", ent.text])
+        return {"text": combined_doc.text, "entities": entitites, "relations": []}
 
     def _annotate(self,text: List[str]):
+        if self.document_level and text:
+            try:
+                docs = extract_entities_from_paragraphs(text,self.legal_nlp,self.preamble_spiltting_nlp,self.sentence_nlp,
+                                                        self.do_postprocess,self.batch_size,self.n_process)
+                outputs = [self._to_brat(doc, paragraph) for doc, paragraph in zip(docs, text)]
+                return outputs,outputs
+            except:
+                print(traceback.format_exc())
         outputs= []
         for paragraph in text:
             try:
-                # print(paragraph)
                 combined_doc = extract_entities_from_judgment_text(paragraph,self.legal_nlp,self.preamble_spiltting_nlp,self.run_type,self.do_postprocess)
-                entitites = []
-                for index,ent in enumerate(combined_doc.ents,start=1):
-                    entitites.append(
-                        [
-                            f"T{index}",
-                            ent.label_,
-                            [
-                                [
-                                    ent.start_char,
-                                    ent.end_char
-                                ]
-                            ],
-                            "",
-                            ent.text
-                        ]
-                    )
-                # print(entitites)
-                outputs.append({
-                    "text":  combined_doc.text,
-                    "entities":entitites,
-                    "relations":[]
-                })
+                outputs.append(self._to_brat(combined_doc, paragraph))
             except:
                 print(traceback.format_exc())
                 outputs.append({
@@ -52,6 +54,10 @@ class LegalAnnotator(BaseAnnotator):
                 })
         return outputs,outputs
 
+    def cache_fingerprint(self):
+        meta = self.legal_nlp.meta
+        return f"{self.type}:{meta.get('name')}-{meta.get('version')}:{self.run_type}:{self.do_postprocess}:{self.document_level}"
+
     
     def _predict_entity(self,text):
         outputs= []
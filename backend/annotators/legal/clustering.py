@@ -0,0 +1,112 @@
+######### Name clustering for legal coreference postprocessing
+import bisect
+import collections
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Levenshtein distance between a and b (same costs as nltk.edit_distance)
+    when it is at most max_distance, otherwise max_distance + 1. Only the
+    diagonal band of width 2 * max_distance + 1 is filled and the scan stops
+    as soon as a whole row exceeds the bound.
+    """
+    if a == b:
+        return 0
+    over = max_distance + 1
+    if max_distance < 0:
+        return over
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > max_distance:
+        return over
+    # common prefix and suffix never change the distance
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    la, lb = len(a), len(b)
+    if la == 0:
+        return lb if lb <= max_distance else over
+
+    prev = [j if j <= max_distance else over for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        lo, hi = max(1, i - max_distance), min(lb, i + max_distance)
+        cur = [over] * (lb + 1)
+        if i <= max_distance:
+            cur[0] = i
+        row_min = cur[0]
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            value = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if cur[j - 1] + 1 < value:
+                value = cur[j - 1] + 1
+            if value > over:
+                value = over
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return over
+        prev = cur
+    return prev[lb]
+
+
+class NameIndex:
+    """
+    Distinct names bucketed by length, so a lookup within edit distance
+    `threshold` only compares names whose lengths differ by at most the
+    threshold and whose character multisets are close enough (both are lower
+    bounds of the edit distance, so no match within the threshold is lost).
+    """
+    def __init__(self, names):
+        self.names = sorted(set(names), key=len)
+        self.lengths = [len(name) for name in self.names]
+        self.counts = {name: collections.Counter(name) for name in self.names}
+
+    def within(self, name, threshold):
+        if threshold < 0:
+            return []
+        counts = self.counts.get(name) or collections.Counter(name)
+        lo = bisect.bisect_left(self.lengths, len(name) - threshold)
+        hi = bisect.bisect_right(self.lengths, len(name) + threshold)
+        found = []
+        for other in self.names[lo:hi]:
+            if other != name:
+                other_counts = self.counts[other]
+                if max(sum((counts - other_counts).values()), sum((other_counts - counts).values())) > threshold:
+                    continue
+                if bounded_edit_distance(name, other, threshold) > threshold:
+                    continue
+            found.append(other)
+        return found
+
+
+def cluster_names(names, threshold):
+    """
+    Same result as the pairwise scan: in input order, every name not yet
+    claimed collects all later names within edit distance `threshold` (claimed
+    or not) and claims them. Returns ({i: [j, ...]}, number of clusters).
+    """
+    positions = collections.defaultdict(list)
+    for i, name in enumerate(names):
+        positions[name].append(i)
+    index = NameIndex(names)
+    pairs = {}
+    claimed = set()
+    for i, name in enumerate(names):
+        if i in claimed:
+            continue
+        pair = []
+        for other in index.within(name, threshold):
+            occurrences = positions[other]
+            pair.extend(occurrences[bisect.bisect_right(occurrences, i):])
+        pair.sort()
+        claimed.update(pair)
+        pairs[i] = pair
+    return pairs, len(pairs)
@@ -9,7 +9,9 @@ import re
 
 # from utils import get_unique_precedent_count,get_unique_statute_count,get_unique_provision_count
 from .utils import seperate_and_clean_preamble,get_text_from_indiankanoon_url,get_sentence_docs
-from .utils import postprocessing,get_csv
+from .utils import postprocessing,get_csv,convert_upper_case_to_title
+
+PARAGRAPH_SEPARATOR = "\n\n"
 
 def extract_entities_from_judgment_text(txt,legal_nlp,nlp_preamble_splitting,text_type,do_postprocess):
     ######### Seperate Preamble and judgment text
@@ -51,6 +53,80 @@ def extract_entities_from_judgment_text(txt,legal_nlp,nlp_preamble_splitting,tex
 
 
 
+def load_sentence_splitter(model_name='en_core_web_sm'):
+    ######### sentence boundaries only: the trained senter without tagger/parser/ner, or a rule-based sentencizer
+    try:
+        nlp = spacy.load(model_name, exclude=['tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner'])
+        if 'senter' in nlp.disabled:
+            nlp.enable_pipe('senter')
+        if 'senter' in nlp.pipe_names:
+            return nlp
+    except (OSError, ValueError):
+        pass
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def extract_entities_from_paragraphs(paragraphs,legal_nlp,nlp_preamble_splitting,sentence_nlp,do_postprocess,batch_size=64,n_process=1):
+    """
+    Document-level variant of extract_entities_from_judgment_text for the
+    paragraphs of one document: the preamble is detected once on the joined
+    text, sentences come from the light sentence_nlp, and every preamble piece
+    and sentence of the document is streamed through one legal_nlp.pipe.
+    Postprocessing (coreference) runs over the whole document; the result is
+    sliced back into one doc per paragraph.
+    """
+    ######### Seperate Preamble once for the whole document
+    seperation_start_time = time.time()
+    _, preamble_end = seperate_and_clean_preamble(PARAGRAPH_SEPARATOR.join(paragraphs), nlp_preamble_splitting)
+    preamble_parts, judgement_parts = [], []
+    offset = 0
+    for paragraph in paragraphs:
+        cut = min(max(preamble_end - offset, 0), len(paragraph))
+        preamble_parts.append(convert_upper_case_to_title(paragraph[:cut]))
+        judgement_parts.append(re.sub(r'(\w[ -]*)(\n+)', r'\1 ', paragraph[cut:]))
+        offset += len(paragraph) + len(PARAGRAPH_SEPARATOR)
+    print("Seperating Preamble took " + str(time.time() - seperation_start_time))
+
+    ########## split sentences, then one streamed legal_nlp pass over the document
+    judgement_start_time = time.time()
+    texts, owners = [], []
+    for index, (preamble_text, judgement_doc) in enumerate(
+            zip(preamble_parts, sentence_nlp.pipe(judgement_parts, batch_size=batch_size))):
+        if preamble_text:
+            texts.append(preamble_text)
+            owners.append(index)
+        for sent in judgement_doc.sents:
+            texts.append(sent.text)
+            owners.append(index)
+    paragraph_docs = [[] for _ in paragraphs]
+    for index, doc in zip(owners, legal_nlp.pipe(texts, batch_size=batch_size, n_process=n_process)):
+        paragraph_docs[index].append(doc)
+    paragraph_docs = [spacy.tokens.Doc.from_docs(docs) if docs else None for docs in paragraph_docs]
+    print("Creating docs for " + str(len(texts)) + " sentences took " + str(time.time() - judgement_start_time))
+
+    if not do_postprocess or all(doc is None for doc in paragraph_docs):
+        return paragraph_docs
+    try:
+        combined_doc = postprocessing(spacy.tokens.Doc.from_docs([doc for doc in paragraph_docs if doc is not None]))
+    except:
+        msg.warn(
+            'There was some issue while performing postprocessing, skipping postprocessing...')
+        return paragraph_docs
+
+    ######### slice the postprocessed entities back onto the paragraph docs
+    token_start = 0
+    for doc in paragraph_docs:
+        if doc is None:
+            continue
+        token_end = token_start + len(doc)
+        doc.ents = [Span(doc, ent.start - token_start, ent.end - token_start, label=ent.label_)
+                    for ent in combined_doc.ents if token_start <= ent.start and ent.end <= token_end]
+        token_start = token_end
+    return paragraph_docs
+
+
 if __name__ == "__main__":
     indiankanoon_url = 'https://indiankanoon.org/doc/11757180/'
 
@@ -1,9 +1,11 @@
 import re
-import nltk
+import bisect
 import spacy
 import copy
 import collections
 
+from .clustering import NameIndex, bounded_edit_distance, cluster_names
+
 
 def get_entities(doc, labels):
     entities = []
@@ -14,21 +16,7 @@ def get_entities(doc, labels):
 
 
 def calculate_lev(names, threshold):
-    pairs = {}
-    deselect = []
-    for i, name in enumerate(names):
-        if i in deselect:
-            continue
-        pair = []
-
-        for j in range(i + 1, len(names)):
-            dis = nltk.edit_distance(name, names[j])
-            if dis <= threshold:
-                pair.append(j)
-                deselect.append(j)
-        pairs[i] = pair
-
-    return pairs, len(pairs.keys())
+    return cluster_names(names, threshold)
 
 
 def get_precedent_supras(doc, entities_pn, entities_precedents):
@@ -67,51 +55,57 @@ def get_precedent_supras(doc, entities_pn, entities_precedents):
 
 
 def create_precedent_clusters(precedent_breakup, threshold):
+    precedents = list(precedent_breakup.keys())
+    breakup = list(precedent_breakup.values())
+
+    ######## index the precedents once instead of rescanning all later ones for every precedent
+    with_parties = collections.defaultdict(list)  # petitioner -> indices of precedents with both parties
+    without_parties = []
+    by_cit = collections.defaultdict(list)
+    without_parties_by_cit = collections.defaultdict(list)
+    for j, (pet_1, res_1, cit_1) in enumerate(breakup):
+        if cit_1 != None:
+            by_cit[cit_1].append(j)
+        if pet_1 == None or res_1 == None:
+            without_parties.append(j)
+            if cit_1 != None:
+                without_parties_by_cit[cit_1].append(j)
+        else:
+            with_parties[pet_1].append(j)
+    petitioners = NameIndex(with_parties.keys())
+
+    def after(indices, i):
+        return indices[bisect.bisect_right(indices, i):]
+
     cluster_num = 0
-    exclude = []
+    exclude = set()
     precedent_clusters = {}
-    for i, pre in enumerate(precedent_breakup.keys()):
+    for i, pre in enumerate(precedents):
 
         if i in exclude:
             continue
-        pet = precedent_breakup[pre][0]
-        res = precedent_breakup[pre][1]
-        cit=precedent_breakup[pre][2]
+        pet, res, cit = breakup[i]
 
-        cluster = []
-        cluster.append(pre)
+        cluster = [pre]
         if pet != None and res != None:
-
-            for j in range(i + 1, len(precedent_breakup)):
-
-                pet_1 = list(precedent_breakup.values())[j][0]
-                res_1 = list(precedent_breakup.values())[j][1]
-                cit_1 = list(precedent_breakup.values())[j][2]
-                if (pet_1 == None or res_1 == None) :
-                    if cit_1==None:
-                        exclude.append(j)
-
-                    else:
-                        if cit_1==cit:
-                            exclude.append(j)
-                            cluster.append(list(precedent_breakup.keys())[j])
-                else:
-
-                    dis_pet = nltk.edit_distance(pet, pet_1)
-                    dis_res = nltk.edit_distance(res, res_1)
-
-                    if dis_pet < threshold and dis_res < threshold:
-                        exclude.append(j)
-                        cluster.append(list(precedent_breakup.keys())[j])
+            ####### precedents without parties: same citation joins, no citation is dropped
+            exclude.update(j for j in after(without_parties, i) if breakup[j][2] == None)
+            members = after(without_parties_by_cit[cit], i) if cit != None else []
+            ####### precedents with parties: both names closer than the threshold
+            for pet_1 in petitioners.within(pet, threshold - 1):
+                for j in after(with_parties[pet_1], i):
+                    if bounded_edit_distance(res, breakup[j][1], threshold - 1) < threshold:
+                        members.append(j)
+            members.sort()
+            exclude.update(members)
+            cluster.extend(precedents[j] for j in members)
 
             precedent_clusters[cluster_num] = cluster
             cluster_num = cluster_num + 1
         elif cit != None:
-            for j in range(i + 1, len(precedent_breakup)):
-                cit_1=list(precedent_breakup.values())[j][2]
-                if  cit_1 !=None and  cit_1==cit:
-                        exclude.append(j)
-                        cluster.append(list(precedent_breakup.keys())[j])
+            members = after(by_cit[cit], i)
+            exclude.update(members)
+            cluster.extend(precedents[j] for j in members)
             precedent_clusters[cluster_num] = cluster
             cluster_num = cluster_num + 1
 
@@ -224,18 +218,21 @@ def map_exact_other_person(doc):
     other_person_text = [' '.join(oth.text.split()).lower().replace(',', '') for oth in other_person]
 
     ents_text = [' '.join(oth.text.split()).lower().replace(',', '') for oth in entities]
+    ######## first position and distinct labels of every entity text
+    ents_index = {}
+    for j, x in enumerate(ents_text):
+        ents_index.setdefault(x, (j, set()))[1].add(entities[j].label_)
     count = 0
     other_person_found = []
     other_person_to_remove = []
     for i, other_p in enumerate(other_person):
 
-        if other_person_text[i] in ents_text:
-            labels = [entities[j].label_ for j, x in enumerate(ents_text) if other_person_text[i] == x]
+        if other_person_text[i] in ents_index:
+            index, labels = ents_index[other_person_text[i]]
 
-            if len(set(labels)) == 1:
+            if len(labels) == 1:
                 count = count + 1
                 other_person_to_remove.append(other_p)
-                index = ents_text.index(other_person_text[i])
 
                 other_person_found.append(other_p)
                 if entities[index].label_ in ['PETITIONER', 'RESPONDENT', 'JUDGE', 'WITNESS', 'LAWYER']:
@@ -280,16 +277,13 @@ def separate_name(names, only_first_last_name):
 
 def remove_ambiguous_names(known_person_cleaned):
     unique_known_person_cleaned = {}
-    to_remove = []
     for i, el in enumerate(known_person_cleaned):
 
         if el[0] not in unique_known_person_cleaned.keys():
             unique_known_person_cleaned[el[0]] = [el[1]]
         else:
             unique_known_person_cleaned[el[0]].append(el[1])
-    for kno in unique_known_person_cleaned.keys():
-        if len(list(set(unique_known_person_cleaned[kno]))) > 1:
-            to_remove.append(kno)
+    to_remove = {kno for kno, labels in unique_known_person_cleaned.items() if len(set(labels)) > 1}
     known_person_left = []
     for kno in known_person_cleaned:
         if kno[0] not in to_remove:
@@ -300,13 +294,16 @@ def remove_ambiguous_names(known_person_cleaned):
 
 def map_name_wise_other_person(other_person_cleaned, known_person_cleaned):
     known_person_cleaned_text, known_person_left = remove_ambiguous_names(known_person_cleaned)
+    first_known = {}
+    for k, text in enumerate(known_person_cleaned_text):
+        first_known.setdefault(text, k)
     c = 0
     other_person_found = []
 
     for i, other in enumerate(other_person_cleaned):
 
-        if other[0] in known_person_cleaned_text:
-            other_person_found.append([other[2], known_person_left[known_person_cleaned_text.index(other[0])][1]])
+        if other[0] in first_known:
+            other_person_found.append([other[2], known_person_left[first_known[other[0]]][1]])
 
             c = c + 1
     return other_person_found
@@ -1,7 +1,7 @@
 import torch
 import torch.autograd
 from torch.utils.data import DataLoader
-from transformers import AutoConfig, AutoModel, AutoTokenizer
+from transformers import AutoModel
 
 import json
 import sys
@@ -19,18 +19,43 @@ from .utils import NER_utils as ner_utils
 from .models.RE_model import DocREModel
 from .utils.RE_utils import set_seed, convert_to_RE_model_input_format
 from .utils.NER_utils import convert_index_to_text, convert_to_NER_model_input_format, convert_text_to_index
+from .utils.batching import TokenBudgetBatchSampler
+from .utils.pair_schema import PairSchema
+from .utils.tokenizer_utils import get_tokenizer, get_pretrained_config
+from .utils.device_utils import select_device, configure_cpu_threads, use_quantization, quantize_encoder, empty_cache
+from .utils.shared_encoding import EncodingCache, encoder_digest, use_shared_encoder
+from .utils.onnx_backend import select_backend, onnx_encoder
 from .models.RE_model import Config as RE_Config
 
 from .dependencies import read_docred_real,split_continuous_arrays,model_predict, report
+from utils.inference_cache import checkpoint_fingerprint
+
+NER_CONFIG_PATH = "annotators/polymer/configs/NER_config/polymer_MatSciBERT.json"
+RE_CONFIG_PATH = "annotators/polymer/configs/RE_config/DocRE_model_MatSciBERT.json"
 
 
 
 
 
 class PolymerAnnotator(BaseAnnotator):
-    def __init__(self):
+    def __init__(self, device=None, num_threads=None, interop_threads=None, quantize=None, share_encoder=None,
+                 backend=None, onnx_dir=None, **kwargs):
         super()
         self.type="polymer_annotator"
+
+        # device: "auto" | "cpu" | "cuda" | "cuda:N"; falls back to the DOCORA_DEVICE env setting
+        self.device = select_device(device)
+        self.quantize = use_quantization(quantize) and self.device.type == "cpu"
+        # encoder backend: "torch" | "onnx" (ONNX Runtime, CPU only); falls back to the DOCORA_BACKEND env setting
+        self.backend = select_backend(backend, self.device)
+        self.onnx_dir = onnx_dir
+        self.num_threads = num_threads
+        # reuse NER encoder outputs in the DocRE pass when both encoders hold the same weights
+        self.share_encoder = use_shared_encoder(share_encoder)
+        if self.device.type == "cpu":
+            configure_cpu_threads(num_threads, interop_threads)
+        elif self.device.index is not None:
+            torch.cuda.set_device(self.device)
         
         self.ner_model = None
         self.ner_logger = None
@@ -40,12 +65,17 @@ class PolymerAnnotator(BaseAnnotator):
         self.re_base_model=None
         self.re_config = None
         self.re_args = None
+        self.re_model = None
+        self.re_pair_schema = None
+        self.ner_encoder_digest = None
+        self.re_encoder_digest = None
+        self.encoders_match = False
 
     def load_NER_model(self,new_model=False):
         if new_model:
             config = Config("annotators/polymer/configs/NER_config/polymer_MatBERT.json")
         else:
-            config = Config("annotators/polymer/configs/NER_config/polymer_MatSciBERT.json")
+            config = Config(NER_CONFIG_PATH)
         logger = ner_utils.get_logger(config.dataset)    
         config.logger = logger
 
@@ -58,18 +88,27 @@ class PolymerAnnotator(BaseAnnotator):
         config.label_num = len(vocab.label2id)
         print(vocab.label2id)
         config.vocab = vocab
+        config.device = self.device
         # Load model    
         logger.info("Building Model")
         model = NER_Model(config)
-        model = model.cuda()
-        model.load_state_dict(torch.load(config.save_path),  strict=False)
+        model.load_state_dict(torch.load(config.save_path, map_location="cpu"),  strict=False)
+        model = model.to(self.device)
         model.eval()
-        device = 0
-        if torch.cuda.is_available():
-            torch.cuda.set_device(device)
+        if self.share_encoder:
+            self.ner_encoder_digest = encoder_digest(model.bert)
+        if self.backend == "onnx":
+            # the attention is only read when the NER encoder outputs are reused by DocRE
+            model.bert = onnx_encoder(model.bert, "ner", config.save_path,
+                                      num_hidden_states=4 if config.use_bert_last_4_layers else 0,
+                                      with_attention=self.share_encoder, quantize=self.quantize,
+                                      onnx_dir=self.onnx_dir, num_threads=self.num_threads)
+        elif self.quantize:
+            quantize_encoder(model.bert)
         self.ner_model = model
         self.ner_logger = logger
         self.ner_config = config
+        self.match_encoders()
         
         # return model, logger, config
 
@@ -78,38 +117,99 @@ class PolymerAnnotator(BaseAnnotator):
         if new_model:
             args = RE_Config("annotators/polymer/configs/RE_config/DocRE_model_DeBERTa.json")
         else:
-            args = RE_Config("annotators/polymer/configs/RE_config/DocRE_model_MatSciBERT.json")
-        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-        args.n_gpu = torch.cuda.device_count()
-        args.device = device
+            args = RE_Config(RE_CONFIG_PATH)
+        args.n_gpu = torch.cuda.device_count() if self.device.type == "cuda" else 0
+        args.device = self.device
 
-        config = AutoConfig.from_pretrained(
+        config = get_pretrained_config(
             args.model_name_or_path,
             num_labels=args.num_class,
         )
-        tokenizer = AutoTokenizer.from_pretrained(
-            args.model_name_or_path,
-        )
+        tokenizer = get_tokenizer(args.model_name_or_path)
         base_model = AutoModel.from_pretrained(
             args.model_name_or_path,
             from_tf=bool(".ckpt" in args.model_name_or_path),
             config=config,
         )
         set_seed(args)
+        config.cls_token_id = tokenizer.cls_token_id
+        config.sep_token_id = tokenizer.sep_token_id
+        config.transformer_type = args.transformer_type
+        # Assemble the DocRE head once; the checkpoint is deserialized here and not per call.
+        model = DocREModel(config, base_model, num_labels=args.num_labels).to(args.device)
+        model.load_state_dict(torch.load(args.load_path, map_location=args.device), strict=False)
+        model.eval()
+        if self.share_encoder:
+            self.re_encoder_digest = encoder_digest(model.model)
+        if self.backend == "onnx":
+            model.model = onnx_encoder(model.model, "docre", args.load_path, with_attention=True,
+                                       quantize=self.quantize, onnx_dir=self.onnx_dir, num_threads=self.num_threads)
+        elif self.quantize:
+            quantize_encoder(model.model)
         self.re_tokenizer = tokenizer
         self.re_base_model = base_model
         self.re_config = config
         self.re_args = args
+        self.re_model = model
+        self.re_pair_schema = (PairSchema.from_file(args.relation_schema, args.max_mention_distance)
+                               if args.relation_schema else None)
+        self.match_encoders()
 
         # return tokenizer, base_model, config, args
 
+    def reload_re_model(self, new_model=False):
+        """
+        Drop the cached DocRE model and load it again from disk,
+        e.g. after the checkpoint at `load_path` has been replaced.
+        """
+        self.re_model = None
+        self.re_base_model = None
+        empty_cache(self.device)
+        self.load_re_model(new_model=new_model)
+
+    def cache_fingerprint(self):
+        # default checkpoints, as loaded by check_load_model
+        with open(NER_CONFIG_PATH) as f:
+            ner_checkpoint = json.load(f)["save_path"]
+        with open(RE_CONFIG_PATH) as f:
+            re_config = json.load(f)
+        files = [ner_checkpoint, re_config["load_path"]] + ([re_config["relation_schema"]] if re_config.get("relation_schema") else [])
+        return (f"{self.type}:{checkpoint_fingerprint(*files)}:quantize={self.quantize}:backend={self.backend}"
+                f":max_mention_distance={re_config.get('max_mention_distance')}"
+                f":share_encoder={self.share_encoder}"
+                f":tokenizer={ner_utils.tokenizer_backend.name}")
+
     def check_load_model(self):
         if self.ner_model is None:
             self.load_NER_model()
-        if self.re_base_model is None:
+        if self.re_model is None:
             self.load_re_model()
 
-    def _predict_entity(self, test_data):
+    def match_encoders(self):
+        """
+        Compare the NER and DocRE encoders once both are loaded. They match only
+        when the fine-tuned weights are identical and the vocabularies agree,
+        i.e. when both configs load one jointly fine-tuned encoder. The shipped
+        checkpoints (NER_model_MatSciBERT_2024.pt, the DocRE load_path) are
+        fine-tuned separately, so with them sharing never takes effect.
+        """
+        self.encoders_match = False
+        if self.ner_encoder_digest is None or self.re_encoder_digest is None:
+            return
+        if self.ner_encoder_digest == self.re_encoder_digest:
+            ner_tokenizer = get_tokenizer(self.ner_config.bert_name, cache_dir="./cache/")
+            self.encoders_match = ner_tokenizer.get_vocab() == self.re_tokenizer.get_vocab()
+        if not self.encoders_match:
+            print("share_encoder: the NER and DocRE encoders differ, DocRE re-encodes every paragraph")
+
+    def encoders_shared(self):
+        """
+        True when sharing is enabled and the NER and DocRE encoders are the same
+        checkpoint (see match_encoders), so NER encodings can stand in.
+        """
+        return self.share_encoder and self.encoders_match
+
+    def _predict_entity(self, test_data, encoding_cache=None):
         """
         NER predicting function
         """
@@ -119,16 +219,19 @@ class PolymerAnnotator(BaseAnnotator):
         config = self.ner_config
         logger = self.ner_logger
         datasets, ori_data = load_data_bert_predict(test_data, config)
+        # group sentences of similar length so short ones are not padded to the longest grid
+        sampler = TokenBudgetBatchSampler(datasets.sent_length,
+                    max_tokens=config.max_batch_tokens,
+                    max_batch_size=config.batch_size)
         test_loader_real = DataLoader(dataset=datasets,
-                    batch_size=config.batch_size,
+                    batch_sampler=sampler,
                     collate_fn=collate_fn,
-                    shuffle=False,
-                    num_workers=4,
-                    drop_last=False)
+                    num_workers=4)
 
 
         print('Predicting NER ...')
-        result = model_predict(model, config,test_loader_real, ori_data)
+        result = model_predict(model, config,test_loader_real, ori_data, batches=sampler.batches,
+                               encoding_cache=encoding_cache)
         print('Finished predicting.')
         print('Converting to Brat format...')
         assert len(result) == len(ori_data)
@@ -197,32 +300,30 @@ class PolymerAnnotator(BaseAnnotator):
         final_result = list(dict(sorted(final_result.items())).values())
         # final_result.append(tmp_cp)
         print('# of discontinuous mentions:', no_discontinuous_mentions)
-        torch.cuda.empty_cache()
+        empty_cache(self.device)
         print('Finished.')
         return final_result
     
 
 
-    def _predict_relation(self,test_data, ner_data):
+    def _predict_relation(self,test_data, ner_data, encoding_cache=None):
         self.check_load_model()
         args = self.re_args
         tokenizer=self.re_tokenizer
-        base_model=self.re_base_model
-        config=self.re_config
+        model=self.re_model
 
-        test_features = read_docred_real(test_data, tokenizer, max_seq_length=args.max_seq_length)
-        config.cls_token_id = tokenizer.cls_token_id
-        config.sep_token_id = tokenizer.sep_token_id
-        config.transformer_type = args.transformer_type
-        model = DocREModel(config, base_model, num_labels=args.num_labels).to(args.device)
-        model.load_state_dict(torch.load(args.load_path), strict=False)
-        pred = report(args, model, test_features, ner_data)
+        test_features = read_docred_real(test_data, tokenizer, max_seq_length=args.max_seq_length,
+                                         pair_schema=self.re_pair_schema,
+                                         record_sources=encoding_cache is not None)
+        pred = report(args, model, test_features, ner_data, encoding_cache=encoding_cache)
         return pred
     
     def _annotate(self,text):
         self.check_load_model()
-        ner_model_output = self._predict_entity(convert_to_NER_model_input_format(text))
+        # per-call cache of NER encoder outputs, only when the two stages share a checkpoint
+        encoding_cache = EncodingCache() if self.encoders_shared() else None
+        ner_model_output = self._predict_entity(convert_to_NER_model_input_format(text), encoding_cache=encoding_cache)
         re_model_input = convert_to_RE_model_input_format(ner_model_output)
-        model_output = self._predict_relation(re_model_input, ner_model_output)  
+        model_output = self._predict_relation(re_model_input, ner_model_output, encoding_cache=encoding_cache)  
         
         return model_output, ner_model_output
\ No newline at end of file
@@ -1,4 +1,6 @@
 
+import time
+
 import numpy as np
 import ujson as json
 
@@ -14,50 +16,60 @@ sys.path.append("../../annotators")
 from tqdm import tqdm
 
 from .utils.RE_utils import collate_fn_real, convert_sentence_to_output_format
+from .utils.tokenizer_utils import tokenize_words
+from .utils.batching import TokenBudgetBatchSampler, BatchingReport
 
 docred_rel2id = json.load(open('RE/meta/rel2id_polymer.json', 'r'))
 
-def read_docred_real(data, tokenizer, max_seq_length=1024):
+def read_docred_real(data, tokenizer, max_seq_length=1024, pair_schema=None, record_sources=False):
+    """
+    DocRE features for `data`. With `record_sources`, each feature also maps every
+    input position to (sentence index, position in "[CLS] sentence pieces [SEP]"),
+    which lets EncodingCache rebuild the encoding from per-sentence NER outputs.
+    """
     i_line = 0
     pos_samples = 0
     neg_samples = 0
+    pruned_samples = 0
+    num_relations = len(docred_rel2id)
     features = []
     for sample in tqdm(data, desc="Example"):
         sents = []
         sent_map = []
+        sources = []
 
         entities = sample['vertexSet']
-        entity_start, entity_end = [], []
+        entity_start, entity_end = set(), set()
         for entity in entities:
             for mention in entity:
                 sent_id = mention["sent_id"]
                 pos = mention["pos"]
-                entity_start.append((sent_id, pos[0],))
-                entity_end.append((sent_id, pos[1] - 1,))
+                entity_start.add((sent_id, pos[0],))
+                entity_end.add((sent_id, pos[1] - 1,))
+        sent_pieces = tokenize_words(tokenizer, sample['sents'])
         for i_s, sent in enumerate(sample['sents']):
             new_map = {}
+            piece = 1
             for i_t, token in enumerate(sent):
-                tokens_wordpiece = tokenizer.tokenize(token)
-                if (i_s, i_t) in entity_start:
-                    tokens_wordpiece = ["*"] + tokens_wordpiece
-                if (i_s, i_t) in entity_end:
-                    tokens_wordpiece = tokens_wordpiece + ["*"]
+                tokens_wordpiece = sent_pieces[i_s][i_t]
                 new_map[i_t] = len(sents)
+                if (i_s, i_t) in entity_start:
+                    sents.append("*")
+                    sources.append((i_s, piece))
                 sents.extend(tokens_wordpiece)
+                sources.extend((i_s, piece + k) for k in range(len(tokens_wordpiece)))
+                piece += len(tokens_wordpiece)
+                if (i_s, i_t) in entity_end:
+                    sents.append("*")
+                    sources.append((i_s, piece - 1))
             new_map[i_t + 1] = len(sents)
             sent_map.append(new_map)
 
         train_triple = {}
         if "labels" in sample:
             for label in sample['labels']:
-                evidence = label['evidence']
                 r = int(docred_rel2id[label['r']])
-                if (label['h'], label['t']) not in train_triple:
-                    train_triple[(label['h'], label['t'])] = [
-                        {'relations': r, 'evidence': evidence}]
-                else:
-                    train_triple[(label['h'], label['t'])].append(
-                        {'relations': r, 'evidence': evidence})
+                train_triple.setdefault((label['h'], label['t']), []).append(r)
 
         entity_pos = []
         for e in entities:
@@ -67,24 +79,21 @@ def read_docred_real(data, tokenizer, max_seq_length=1024):
                 end = sent_map[m["sent_id"]][m["pos"][1]]
                 entity_pos[-1].append((start, end,))
 
-        relations, hts = [], []
-        for h, t in train_triple.keys():
-            relation = [0] * len(docred_rel2id)
-            for mention in train_triple[h, t]:
-                relation[mention["relations"]] = 1
-                evidence = mention["evidence"]
-            relations.append(relation)
-            hts.append([h, t])
-            pos_samples += 1
-
-        for h in range(len(entities)):
-            for t in range(len(entities)):
-                if h != t and [h, t] not in hts:
-                    relation = [1] + [0] * (len(docred_rel2id) - 1)
-                    relations.append(relation)
-                    hts.append([h, t])
-                    neg_samples += 1
+        # labelled pairs first (in label order), then every other ordered pair as NA
+        num_entities = len(entities)
+        hts = [[h, t] for h, t in train_triple]
+        hts += [[h, t] for h in range(num_entities) for t in range(num_entities)
+                if h != t and (h, t) not in train_triple]
+        labels = np.zeros((len(hts), num_relations), dtype=np.int64)
+        for k, rs in enumerate(train_triple.values()):
+            labels[k, rs] = 1
+        labels[len(train_triple):, 0] = 1
+        relations = labels.tolist()
+        pos_samples += len(train_triple)
+        neg_samples += len(hts) - len(train_triple)
         assert len(relations) == len(entities) * (len(entities) - 1)
+        pruned = pair_schema.prune(entities, entity_pos, hts, relations) if pair_schema is not None else 0
+        pruned_samples += pruned
 
         sents = sents[:max_seq_length - 2]
         input_ids = tokenizer.convert_tokens_to_ids(sents)
@@ -97,12 +106,22 @@ def read_docred_real(data, tokenizer, max_seq_length=1024):
                    'hts': hts,
                    'title': sample['title'],
                    'entities': entities,
+                   'pruned_pairs': pruned,
                    }
+        if record_sources and sample['sents']:
+            last = len(sample['sents']) - 1
+            feature['piece_sources'] = ([(0, 0)] + sources[:max_seq_length - 2]
+                                        + [(last, sum(map(len, sent_pieces[last])) + 1)])
+            feature['sents'] = sample['sents']
+            feature['sent_pieces'] = sent_pieces
         features.append(feature)
 
     print("# of documents {}.".format(i_line))
     print("# of positive examples {}.".format(pos_samples))
     print("# of negative examples {}.".format(neg_samples))
+    if pair_schema is not None:
+        print("# of pruned entity pairs {} (per document: {}).".format(
+            pruned_samples, [f['pruned_pairs'] for f in features]))
     return features
 
 
@@ -123,62 +142,112 @@ def split_continuous_arrays(arr):
     result.append(temp_array)
     return result
 
-def model_predict(model, config, data_loader, data):
+def model_predict(model, config, data_loader, data, batches=None, encoding_cache=None):
+    """
+    Run W2NER over `data_loader`. `batches` lists the dataset indices of each
+    loader batch (e.g. from a TokenBudgetBatchSampler); predictions are
+    returned in dataset order regardless of how the items were grouped.
+    With `encoding_cache`, the encoder outputs of every sentence are kept for the DocRE pass.
+    """
     model.eval()
-    result = []
-    i = 0
-    with torch.no_grad():
-        for data_batch in data_loader:
-            sentence_batch = data[i:i+config.batch_size]
+    if batches is None:
+        num_items = len(data_loader.dataset)
+        batches = [list(range(k, min(k + config.batch_size, num_items)))
+                   for k in range(0, num_items, config.batch_size)]
+    batching_report = BatchingReport("NER", power=2)
+    result = {}
+    with torch.inference_mode():
+        for batch_indices, data_batch in zip(batches, data_loader):
+            sentence_batch = [data[k] for k in batch_indices]
             entity_text = data_batch[-1]
-            data_batch = [data.cuda() for data in data_batch[:-1]]
+            data_batch = [data.to(config.device) for data in data_batch[:-1]]
             bert_inputs, grid_labels, grid_mask2d, pieces2word, dist_inputs, sent_length = data_batch
 
-            outputs = model(bert_inputs, grid_mask2d, dist_inputs, pieces2word, sent_length)
+            forward_start = time.perf_counter()
+            if encoding_cache is not None:
+                outputs, (hidden, attention) = model(bert_inputs, grid_mask2d, dist_inputs, pieces2word,
+                                                     sent_length, return_encoder=True)
+                encoding_cache.add_batch([s["sentence"] for s in sentence_batch], pieces2word,
+                                         bert_inputs, hidden, attention)
+            else:
+                outputs = model(bert_inputs, grid_mask2d, dist_inputs, pieces2word, sent_length)
             length = sent_length
 
-            grid_mask2d = grid_mask2d.clone()
+            outputs = torch.argmax(outputs, -1).cpu().numpy()
+            decode_start = time.perf_counter()
+            ent_c, ent_p, ent_r, decode_entities = decode(outputs, entity_text, length.cpu().numpy())
+            batching_report.add_time("forward", decode_start - forward_start)
+            batching_report.add_time("decode", time.perf_counter() - decode_start)
+            batching_report.add_batch(length.tolist())
 
-            outputs = torch.argmax(outputs, -1)
-            ent_c, ent_p, ent_r, decode_entities = decode(outputs.cpu().numpy(), entity_text, length.cpu().numpy())
-
-            for ent_list, sentence in zip(decode_entities, sentence_batch):
+            for k, ent_list, sentence in zip(batch_indices, decode_entities, sentence_batch):
                 sentence = sentence["sentence"]
                 instance = {"sentence": sentence, "entities": []}
                 for ent in ent_list:
                     instance["entities"].append({"text": [sentence[x] for x in ent[0]],
                                                 "type": config.vocab.id_to_label(ent[1]),
                                                 "index": ent[0]})
-                result.append(instance)
-            i += config.batch_size
-    return result
+                result[k] = instance
+    print(batching_report.summary())
+    return [result[k] for k in sorted(result)]
 
-def report(args, model, features, ner_data):
+def report(args, model, features, ner_data, encoding_cache=None):
     # for row in features:
         # with open('test_middle_output/para_length.txt','a',encoding='utf-8') as f:
         #     f.write("{}\n".format(len(row['input_ids'])))
-    dataloader = DataLoader(features, batch_size=args.test_batch_size, shuffle=False, collate_fn=collate_fn_real, drop_last=False)
-    preds = []
-    for batch in dataloader:
-        model.eval()
-
-        inputs = {'input_ids': batch[0].to(args.device),
-                  'attention_mask': batch[1].to(args.device),
-                  'entity_pos': batch[3],
-                  'hts': batch[4],
-                  }
-        
-        with torch.no_grad():
-            pred, *_ = model(**inputs)
-            pred = pred.cpu().numpy()
-            pred[np.isnan(pred)] = 0
-            preds.append(pred)
+    # documents left without candidate pairs (e.g. all pruned by the pair schema) skip the model
+    scored = [k for k, f in enumerate(features) if len(f["hts"]) > 0]
+    # with an EncodingCache, documents whose sentences were all encoded by the NER pass
+    # are batched separately and skip the DocRE encoder
+    groups = [(scored, False)]
+    if encoding_cache is not None:
+        shared = [k for k in scored if encoding_cache.covers(features[k])]
+        shared_set = set(shared)
+        groups = [(shared, True), ([k for k in scored if k not in shared_set], False)]
+    batching_report = BatchingReport("RE")
+    feature_preds = {}
+    for group, shared in groups:
+        if not group:
+            continue
+        sampler = TokenBudgetBatchSampler([len(features[k]["input_ids"]) for k in group],
+                                          max_tokens=args.max_batch_tokens, max_batch_size=args.test_batch_size)
+        dataloader = DataLoader([features[k] for k in group], batch_sampler=sampler, collate_fn=collate_fn_real)
+        for batch_positions, batch in zip(sampler.batches, dataloader):
+            batch_indices = [group[k] for k in batch_positions]
+            model.eval()
+
+            inputs = {'input_ids': batch[0].to(args.device),
+                      'attention_mask': batch[1].to(args.device),
+                      'entity_pos': batch[3],
+                      'hts': batch[4],
+                      }
+
+            start = time.perf_counter()
+            with torch.inference_mode():
+                if shared:
+                    inputs['encoded'] = encoding_cache.assemble([features[k] for k in batch_indices], args.device)
+                pred, *_ = model(**inputs)
+                pred = pred.cpu().numpy()
+                pred[np.isnan(pred)] = 0
+            if encoding_cache is not None:
+                encoding_cache.record(len(batch_indices), time.perf_counter() - start, shared)
+            batching_report.add_batch([len(features[k]["input_ids"]) for k in batch_indices])
+
+            # split the flat pair predictions back per document, then restore input order
+            offset = 0
+            for k in batch_indices:
+                num_pairs = len(features[k]["hts"])
+                feature_preds[k] = pred[offset:offset + num_pairs]
+                offset += num_pairs
+    print(batching_report.summary())
+    if encoding_cache is not None:
+        print(encoding_cache.summary())
 
     # if no relation is predicted, return ner_data
-    if len(preds) == 0:
+    if len(feature_preds) == 0:
         return ner_data
     
-    preds = np.concatenate(preds, axis=0).astype(np.float32)
+    preds = np.concatenate([feature_preds[k] for k in sorted(feature_preds)], axis=0).astype(np.float32)
     #preds = to_official(preds, features)
 
     # to_official
@@ -187,7 +256,8 @@ def report(args, model, features, ner_data):
 
     h_idx, t_idx, title, entities = [], [], [], []
 
-    for f in features:
+    for k in sorted(feature_preds):
+        f = features[k]
         hts = f["hts"]
         h_idx += [ht[0] for ht in hts]
         t_idx += [ht[1] for ht in hts]
@@ -3,7 +3,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence, pad_sequence
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoModel
 
 from torch.utils.data import Dataset
 
@@ -13,8 +13,10 @@ import prettytable as pt
 
 import os
 import sys
+from functools import lru_cache
 sys.path.append("../../annotators")
 from ..utils.NER_utils import convert_index_to_text
+from ..utils.tokenizer_utils import get_tokenizer, tokenize_words
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
@@ -29,6 +31,51 @@ dis2idx[64:] = 7
 dis2idx[128:] = 8
 dis2idx[256:] = 9
 
+# Signed-distance lookup: _dist_lut[d + MAX_DIST - 1] is the W2NER distance bucket
+# for d = i - j (negative distances shifted by 9, the diagonal mapped to 19).
+MAX_DIST = len(dis2idx)
+_signed_dist = np.arange(-(MAX_DIST - 1), MAX_DIST)
+_dist_lut = np.where(_signed_dist < 0, dis2idx[-_signed_dist] + 9, dis2idx[np.abs(_signed_dist)])
+_dist_lut[_signed_dist == 0] = 19
+
+
+@lru_cache(maxsize=512)
+def dist_grid(length):
+    """
+    Distance-bucket grid [length, length] shared by every sentence of the same
+    length. Callers must not modify the returned array in place.
+    """
+    idx = np.arange(length)
+    return _dist_lut[idx[:, None] - idx[None, :] + MAX_DIST - 1]
+
+
+def pool_word_pieces(bert_embs, pieces2word):
+    """
+    Max-pool word-piece embeddings [B, L', H] into word representations [B, L, H]
+    following pieces2word [B, L, L'], without expanding bert_embs to [B, L, L', H].
+
+    The pieces of a word are contiguous, so every word gathers K pieces from its
+    first one on (K = most pieces of any word in the batch, usually a handful)
+    and the max is taken over the valid ones. Words without pieces get the global
+    minimum of bert_embs, as in the masked_fill/max formulation; that minimum
+    stays on the device, but reading K (int(counts.max())) still syncs with the host.
+    """
+    batch_size, num_pieces, hidden_size = bert_embs.shape
+    length = pieces2word.size(1)
+
+    counts = pieces2word.sum(-1)                                # [B, L]
+    first = pieces2word.int().argmax(-1)                        # [B, L]
+    max_count = max(int(counts.max()), 1)
+    offsets = torch.arange(max_count, device=bert_embs.device)
+    index = (first.unsqueeze(-1) + offsets).clamp(max=num_pieces - 1)  # [B, L, K]
+    valid = offsets < counts.unsqueeze(-1)                      # [B, L, K]
+
+    index = index.view(batch_size, -1, 1).expand(-1, -1, hidden_size)
+    pieces = torch.gather(bert_embs, 1, index).view(batch_size, length, max_count, hidden_size)
+    pieces = torch.where(valid.unsqueeze(-1), pieces, bert_embs.min())
+    word_reps, _ = torch.max(pieces, dim=2)
+    return word_reps
+
 
 class Config:
     def __init__(self, config_path):
@@ -55,6 +102,8 @@ class Config:
 
         self.epochs = config["epochs"]
         self.batch_size = config["batch_size"]
+        # padded word budget per batch for length-bucketed inference
+        self.max_batch_tokens = config.get("max_batch_tokens", 1024)
 
         self.learning_rate = config["learning_rate"]
         self.weight_decay = config["weight_decay"]
@@ -273,29 +322,26 @@ class Model(nn.Module):
 
         self.cln = LayerNorm(config.lstm_hid_size, config.lstm_hid_size, conditional=True)
 
-    def forward(self, bert_inputs, grid_mask2d, dist_inputs, pieces2word, sent_length):
+    def forward(self, bert_inputs, grid_mask2d, dist_inputs, pieces2word, sent_length, return_encoder=False):
         '''
         :param bert_inputs: [B, L']
         :param grid_mask2d: [B, L, L]
         :param dist_inputs: [B, L, L]
         :param pieces2word: [B, L, L']
         :param sent_length: [B]
+        :param return_encoder: also return the last-layer (hidden states [B, L', H], attention [B, heads, L', L'])
         :return:
         '''
-        bert_embs = self.bert(input_ids=bert_inputs, attention_mask=bert_inputs.ne(0).float())
+        bert_embs = self.bert(input_ids=bert_inputs, attention_mask=bert_inputs.ne(0).float(),
+                              output_attentions=return_encoder)
+        encoder_outputs = (bert_embs.last_hidden_state, bert_embs.attentions[-1]) if return_encoder else None
         if self.use_bert_last_4_layers:
-            bert_embs = torch.stack(bert_embs[2][-4:], dim=-1).mean(-1)
+            bert_embs = torch.stack(bert_embs.hidden_states[-4:], dim=-1).mean(-1)
         else:
-            bert_embs = bert_embs[0]
-
-        length = pieces2word.size(1)
-
-        min_value = torch.min(bert_embs).item()
+            bert_embs = bert_embs.last_hidden_state
 
         # Max pooling word representations from pieces
-        _bert_embs = bert_embs.unsqueeze(1).expand(-1, length, -1, -1)
-        _bert_embs = torch.masked_fill(_bert_embs, pieces2word.eq(0).unsqueeze(-1), min_value)
-        word_reps, _ = torch.max(_bert_embs, dim=2)
+        word_reps = pool_word_pieces(bert_embs, pieces2word)
 
         word_reps = self.dropout(word_reps)
         packed_embs = pack_padded_sequence(word_reps, sent_length.cpu(), batch_first=True, enforce_sorted=False)
@@ -315,6 +361,8 @@ class Model(nn.Module):
         conv_outputs = torch.masked_fill(conv_outputs, grid_mask2d.eq(0).unsqueeze(-1), 0.0)
         outputs = self.predictor(word_reps, word_reps, conv_outputs)
 
+        if return_encoder:
+            return outputs, encoder_outputs
         return outputs
 
 class Vocabulary(object):
@@ -403,11 +451,13 @@ def process_bert(data, tokenizer, vocab):
     pieces2word = []
     sent_length = []
 
+    all_tokens = tokenize_words(tokenizer, [instance['sentence'] for instance in data])
+
     for index, instance in enumerate(data):
         if len(instance['sentence']) == 0:
             continue
 
-        tokens = [tokenizer.tokenize(word) for word in instance['sentence']]
+        tokens = all_tokens[index]
         pieces = [piece for pieces in tokens for piece in pieces]
         _bert_inputs = tokenizer.convert_tokens_to_ids(pieces)
         _bert_inputs = np.array([tokenizer.cls_token_id] + _bert_inputs + [tokenizer.sep_token_id])
@@ -419,7 +469,6 @@ def process_bert(data, tokenizer, vocab):
         # _grid_mask2d = np.ones((length, length), dtype=np.bool)
         _grid_labels = np.zeros((length, length), dtype=int)
         _pieces2word = np.zeros((length, len(_bert_inputs)), dtype=bool)
-        _dist_inputs = np.zeros((length, length), dtype=int)
         _grid_mask2d = np.ones((length, length), dtype=bool)
 
         if tokenizer is not None:
@@ -431,17 +480,7 @@ def process_bert(data, tokenizer, vocab):
                 _pieces2word[i, pieces[0] + 1:pieces[-1] + 2] = 1
                 start += len(pieces)
 
-        for k in range(length):
-            _dist_inputs[k, :] += k
-            _dist_inputs[:, k] -= k
-
-        for i in range(length):
-            for j in range(length):
-                if _dist_inputs[i, j] < 0:
-                    _dist_inputs[i, j] = dis2idx[-_dist_inputs[i, j]] + 9
-                else:
-                    _dist_inputs[i, j] = dis2idx[_dist_inputs[i, j]]
-        _dist_inputs[_dist_inputs == 0] = 19
+        _dist_inputs = dist_grid(length)
 
         for entity in instance["ner"]:
             index = entity["index"]
@@ -475,7 +514,7 @@ def fill_vocab(vocab, dataset):
 
 
 def load_data_bert_predict(test_data, config):
-    tokenizer = AutoTokenizer.from_pretrained(config.bert_name, cache_dir="./cache/")
+    tokenizer = get_tokenizer(config.bert_name, cache_dir="./cache/")
     test_dataset = RelationDataset(*process_bert(test_data, tokenizer, config.vocab))
     return test_dataset, test_data
 
@@ -2,7 +2,6 @@ import json
 
 import torch
 import torch.nn as nn
-from opt_einsum import contract
 from RE.long_seq import process_long_input
 from RE.losses import ATLoss
 
@@ -35,55 +34,69 @@ class DocREModel(nn.Module):
         return sequence_output, attention
 
     def get_hrt(self, sequence_output, attention, entity_pos, hts):
+        """
+        Head, context and tail representations of every candidate pair in the batch.
+        All mentions are gathered at once: an entity is the logsumexp of its mention
+        embeddings and the mean of its mention attentions (zeros when every mention
+        is truncated), reduced over an [n_e, max_mentions] layout padded with -inf.
+        Pair attentions are then taken per document from one [seq_len, E, E] Gram
+        matrix over the heads instead of gathering [pairs, heads, seq_len] twice.
+        """
         offset = 1 if self.config.transformer_type in ["bert", "roberta"] else 0
         n, h, _, c = attention.size()
-        hss, tss, rss = [], [], []
+        device = sequence_output.device
+
+        # flatten the mentions of the whole batch; entities are numbered across documents
+        mention_doc, mention_pos, mention_ent, mention_slot, entity_counts = [], [], [], [], []
+        doc_entities = [0]
         for i in range(len(entity_pos)):
-            entity_embs, entity_atts = [], []
             for e in entity_pos[i]:
-                if len(e) > 1:
-                    e_emb, e_att = [], []
-                    for start, end in e:
-                        if start + offset < c:
-                            # In case the entity mention is truncated due to limited max seq length.
-                            e_emb.append(sequence_output[i, start + offset])
-                            e_att.append(attention[i, :, start + offset])
-                    if len(e_emb) > 0:
-                        e_emb = torch.logsumexp(torch.stack(e_emb, dim=0), dim=0)
-                        e_att = torch.stack(e_att, dim=0).mean(0)
-                    else:
-                        e_emb = torch.zeros(self.config.hidden_size).to(sequence_output)
-                        e_att = torch.zeros(h, c).to(attention)
-                else:
-                    start, end = e[0]
+                kept = 0
+                for start, end in e:
                     if start + offset < c:
-                        e_emb = sequence_output[i, start + offset]
-                        e_att = attention[i, :, start + offset]
-                    else:
-                        e_emb = torch.zeros(self.config.hidden_size).to(sequence_output)
-                        e_att = torch.zeros(h, c).to(attention)
-                entity_embs.append(e_emb)
-                entity_atts.append(e_att)
-
-            entity_embs = torch.stack(entity_embs, dim=0)  # [n_e, d]
-            entity_atts = torch.stack(entity_atts, dim=0)  # [n_e, h, seq_len]
-
-            ht_i = torch.LongTensor(hts[i]).to(sequence_output.device)
-            hs = torch.index_select(entity_embs, 0, ht_i[:, 0])
-            ts = torch.index_select(entity_embs, 0, ht_i[:, 1])
-
-            h_att = torch.index_select(entity_atts, 0, ht_i[:, 0])
-            t_att = torch.index_select(entity_atts, 0, ht_i[:, 1])
-            ht_att = (h_att * t_att).mean(1)
-            ht_att = ht_att / (ht_att.sum(1, keepdim=True) + 1e-5)
-            rs = contract("ld,rl->rd", sequence_output[i], ht_att)
-            hss.append(hs)
-            tss.append(ts)
-            rss.append(rs)
-        hss = torch.cat(hss, dim=0)
-        tss = torch.cat(tss, dim=0)
-        rss = torch.cat(rss, dim=0)
-        return hss, rss, tss
+                        # In case the entity mention is truncated due to limited max seq length.
+                        mention_doc.append(i)
+                        mention_pos.append(start + offset)
+                        mention_ent.append(len(entity_counts))
+                        mention_slot.append(kept)
+                        kept += 1
+                entity_counts.append(kept)
+            doc_entities.append(len(entity_counts))
+
+        mention_doc = torch.tensor(mention_doc, dtype=torch.long, device=device)
+        mention_pos = torch.tensor(mention_pos, dtype=torch.long, device=device)
+        mention_ent = torch.tensor(mention_ent, dtype=torch.long, device=device)
+        mention_slot = torch.tensor(mention_slot, dtype=torch.long, device=device)
+        # row gathers on flattened views (advanced indexing around the head dim is much slower)
+        mention_rows = mention_doc * c + mention_pos
+        mention_embs = sequence_output.reshape(n * c, -1).index_select(0, mention_rows)  # [n_m, d]
+        head_rows = (mention_doc * h * c + mention_pos).unsqueeze(1) + torch.arange(h, device=device) * c
+        mention_atts = attention.reshape(n * h * c, c).index_select(0, head_rows.view(-1)).view(-1, h, c)  # [n_m, h, seq_len]
+
+        num_entities = len(entity_counts)
+        counts = torch.tensor(entity_counts, device=device)
+        padded_embs = sequence_output.new_full((num_entities, max(max(entity_counts), 1), self.config.hidden_size),
+                                               float("-inf"))
+        padded_embs[mention_ent, mention_slot] = mention_embs
+        entity_embs = torch.logsumexp(padded_embs, dim=1).masked_fill(counts.eq(0).unsqueeze(-1), 0)  # [n_e, d]
+
+        entity_atts = attention.new_zeros((num_entities, h, c)).index_add(0, mention_ent, mention_atts)
+        entity_atts = entity_atts / counts.clamp(min=1).to(attention).view(-1, 1, 1)  # [n_e, h, seq_len]
+
+        hss, tss, rss = [], [], []
+        for i in range(len(entity_pos)):
+            ht_i = torch.tensor(hts[i], dtype=torch.long, device=device).view(-1, 2)
+            first, last = doc_entities[i], doc_entities[i + 1]
+            num = last - first
+            # (h_att * t_att).mean(1) for every entity pair at once: sum over heads per position
+            atts = entity_atts[first:last].permute(2, 0, 1).contiguous()  # [seq_len, E, h]
+            gram = torch.bmm(atts, atts.transpose(1, 2)).view(c, num * num)
+            ht_att = gram.index_select(1, ht_i[:, 0] * num + ht_i[:, 1]) / h  # [seq_len, pairs]
+            ht_att = ht_att / (ht_att.sum(0, keepdim=True) + 1e-5)
+            rss.append(ht_att.t() @ sequence_output[i])
+            hss.append(entity_embs[first:last].index_select(0, ht_i[:, 0]))
+            tss.append(entity_embs[first:last].index_select(0, ht_i[:, 1]))
+        return torch.cat(hss, dim=0), torch.cat(rss, dim=0), torch.cat(tss, dim=0)
 
     def forward(self,
                 input_ids=None,
@@ -92,9 +105,14 @@ class DocREModel(nn.Module):
                 entity_pos=None,
                 hts=None,
                 instance_mask=None,
+                encoded=None,
                 ):
 
-        sequence_output, attention = self.encode(input_ids, attention_mask)
+        # `encoded`: precomputed (sequence_output, attention), e.g. from EncodingCache.assemble
+        if encoded is not None:
+            sequence_output, attention = encoded
+        else:
+            sequence_output, attention = self.encode(input_ids, attention_mask)
         hs, rs, ts = self.get_hrt(sequence_output, attention, entity_pos, hts)
 
         hs = torch.tanh(self.head_extractor(torch.cat([hs, rs], dim=1)))
@@ -125,6 +143,11 @@ class Config:
 
         self.max_seq_length = config["max_seq_length"]
         self.test_batch_size = config["test_batch_size"]
+        # padded word-piece budget per batch for length-bucketed inference
+        self.max_batch_tokens = config.get("max_batch_tokens", 4096)
+        # entity type pairs that can hold a relation; other pairs are never scored
+        self.relation_schema = config.get("relation_schema")
+        self.max_mention_distance = config.get("max_mention_distance")
         self.seed = config["seed"]
         self.num_class = config["num_class"]
         self.num_labels = config["num_labels"]
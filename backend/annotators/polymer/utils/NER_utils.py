@@ -4,7 +4,13 @@ import time
 from collections import defaultdict, deque
 import json
 
+import numpy as np
+
 from ..configs.NER_config.ner_config import nlp
+from utils.tokenization import create_backend
+
+# Batched, cached CoreNLP tokenization shared with RE_utils; see utils/tokenization.py
+tokenizer_backend = create_backend(nlp)
 
 def get_logger(dataset):
     pathname = "./log/{}_{}.txt".format(dataset, time.strftime("%m-%d_%H-%M-%S"))
@@ -50,36 +56,71 @@ def convert_text_to_index(text):
     return index, int(type)
 
 
-def decode(outputs, entities, length):
-    class Node:
-        def __init__(self):
-            self.THW = []                # [(tail, type)]
-            self.NNW = defaultdict(set)   # {(head,tail): {next_index}}
+def grid_cells(outputs, length):
+    """
+    Sparse view of a batch of W2NER label grids: per sentence, the THW cells
+    (cur, pre, type) with pre <= cur and the NNW cells (pre, cur) with
+    pre < cur, inside the sentence length. Both are ordered by cur descending,
+    then pre ascending, with a THW cell before an NNW cell of the same pre,
+    i.e. the order in which the dense scan visits them.
+    """
+    outputs = np.asarray(outputs)
+    length = np.asarray(length)
+    n, size = outputs.shape[0], outputs.shape[1]
+    rows = np.arange(size)
+    valid = (rows[None, :, None] < length[:, None, None]) & (rows[None, None, :] < length[:, None, None])
+    lower = rows[:, None] >= rows[None, :]
+    b_thw, cur_thw, pre_thw = np.nonzero(valid & lower & (outputs > 1))
+    b_nnw, pre_nnw, cur_nnw = np.nonzero(valid & ~lower & (outputs == 1))
+
+    b = np.concatenate([b_thw, b_nnw])
+    cur = np.concatenate([cur_thw, cur_nnw])
+    pre = np.concatenate([pre_thw, pre_nnw])
+    kind = np.concatenate([np.zeros(len(b_thw), dtype=np.int64), np.ones(len(b_nnw), dtype=np.int64)])
+    value = np.concatenate([outputs[b_thw, cur_thw, pre_thw], np.ones(len(b_nnw), dtype=outputs.dtype)])
+    order = np.lexsort((kind, pre, -cur, b))
+    cells = [[] for _ in range(n)]
+    for i, c, p, k, v in zip(b[order].tolist(), cur[order].tolist(), pre[order].tolist(),
+                             kind[order].tolist(), value[order]):
+        cells[i].append((c, p, k, v))
+    return cells
 
+
+def decode(outputs, entities, length):
+    """
+    Entities from W2NER label grids (THW = tail-head-with-type, NNW = next
+    neighbouring word). Only the non-zero cells found by grid_cells are
+    visited, in the same order as a full l x l scan, so the result - including
+    the order of decode_entities - is that of the dense decoder.
+    """
     ent_r, ent_p, ent_c = 0, 0, 0
     decode_entities = []
     q = deque()
-    for instance, ent_set, l in zip(outputs, entities, length):
+    for instance_cells, ent_set, l in zip(grid_cells(outputs, length), entities, length):
         predicts = []
-        nodes = [Node() for _ in range(l)]
-        for cur in reversed(range(l)):
+        thw = defaultdict(list)                          # pre -> [(tail, type)]
+        nnw = defaultdict(lambda: defaultdict(set))      # pre -> {(head,tail): {next_index}}
+        position = 0
+        for cur in reversed(range(int(l))):
             heads = []
-            for pre in range(cur+1):
-                # THW
-                if instance[cur, pre] > 1: 
-                    nodes[pre].THW.append((cur, instance[cur, pre]))
+            while position < len(instance_cells) and instance_cells[position][0] == cur:
+                _, pre, kind, value = instance_cells[position]
+                position += 1
+                if kind == 0:
+                    # THW
+                    thw[pre].append((cur, value))
                     heads.append(pre)
-                # NNW
-                if pre < cur and instance[pre, cur] == 1:
-                    # cur node
-                    for head in heads:
-                        nodes[pre].NNW[(head,cur)].add(cur)
-                    # post nodes
-                    for head,tail in nodes[cur].NNW.keys():
+                    continue
+                # NNW: cur node
+                for head in heads:
+                    nnw[pre][(head,cur)].add(cur)
+                # post nodes
+                if cur in nnw:
+                    for head,tail in nnw[cur].keys():
                         if tail >= cur and head <= pre:
-                            nodes[pre].NNW[(head,tail)].add(cur)
+                            nnw[pre][(head,tail)].add(cur)
             # entity
-            for tail,type_id in nodes[cur].THW:
+            for tail,type_id in thw.get(cur, ()):
                 if cur == tail:
                     predicts.append(([cur], type_id))
                     continue
@@ -87,12 +128,12 @@ def decode(outputs, entities, length):
                 q.append([cur])
                 while len(q) > 0:
                     chains = q.pop()
-                    for idx in nodes[chains[-1]].NNW[(cur,tail)]:
+                    for idx in nnw[chains[-1]][(cur,tail)]:
                         if idx == tail:
                             predicts.append((chains + [idx], type_id))
                         else:
                             q.append(chains + [idx])
-        
+
         predicts = set([convert_index_to_text(x[0], x[1]) for x in predicts])
         decode_entities.append([convert_text_to_index(x) for x in predicts])
         ent_r += len(ent_set)
@@ -112,21 +153,15 @@ def cal_f1(c, p, r):
         return 2 * p * r / (p + r), p, r
     return 0, p, r
 
-def convert_to_NER_model_input_format(paragraphs):
+def convert_to_NER_model_input_format(paragraphs, backend=None):
+    backend = backend or tokenizer_backend
     json_list = []
     counters = []
-    for idx, paragraph_text in enumerate(paragraphs):
-        output = nlp.annotate(paragraph_text, properties={
-            'annotators': 'tokenize',
-            'outputFormat': 'json'
-        })
-        
-        if type(output) == str:
-            output = json.loads(output)
-        
+    tokenized_paragraphs = backend.tokenize(paragraphs)
+    for idx, sentences in enumerate(tokenized_paragraphs):
         sent_id = 0
         
-        for sentence in output['sentences']:
+        for sentence in sentences:
             sent_id += 1
             json_item = {}
             json_item_tokens = []
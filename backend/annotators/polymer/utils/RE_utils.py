@@ -3,7 +3,7 @@ import torch
 import random
 import numpy as np
 
-from ..configs.NER_config.ner_config import nlp
+from .NER_utils import tokenizer_backend
 
 def set_seed(args):
     random.seed(args.seed)
@@ -50,9 +50,11 @@ def collate_fn_real(batch): # For real data (prediction)
     #output = (input_ids, input_mask, labels, entity_pos, hts, [f["title"] for f in batch]) # DEBUG
     return output
 
-def convert_to_RE_model_input_format(ner_output_paragraphs):
+def convert_to_RE_model_input_format(ner_output_paragraphs, backend=None):
+    backend = backend or tokenizer_backend
     count_multi_span = 0
     json_list = []
+    tokenized_paragraphs = backend.tokenize([paragraph["text"] for paragraph in ner_output_paragraphs])
     for idx, paragraph in enumerate(ner_output_paragraphs):
         entities = []
         for entity in paragraph["entities"]:
@@ -68,20 +70,12 @@ def convert_to_RE_model_input_format(ner_output_paragraphs):
                 ent['word'] = entity_text
                 entities.append(ent)
 
-        output = nlp.annotate(paragraph["text"], properties={
-            'annotators': 'tokenize',
-            'outputFormat': 'json'
-        })
-        
-        if type(output) == str:
-            output = json.loads(output)
-    
         json_item = {}
         json_item_sents = []
         json_item_vertexSet = {}
 
         sent_id = -1
-        for sentence in output['sentences']:
+        for sentence in tokenized_paragraphs[idx]:
             sent_id += 1
             json_item_tokens = []
             text = []
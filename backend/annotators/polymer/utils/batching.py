@@ -0,0 +1,74 @@
+import time
+
+from torch.utils.data import Sampler
+
+
+class TokenBudgetBatchSampler(Sampler):
+    """
+    Groups dataset items of similar length into batches whose padded size
+    (batch size x longest item) stays under `max_tokens`, capped at
+    `max_batch_size` items. Batches are yielded shortest-first and in a
+    deterministic order, so callers can map outputs back with `batches`.
+    """
+    def __init__(self, lengths, max_tokens, max_batch_size=None):
+        self.lengths = list(lengths)
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.batches = self._build_batches()
+
+    def _build_batches(self):
+        order = sorted(range(len(self.lengths)), key=lambda i: self.lengths[i])
+        batches, current, current_max = [], [], 0
+        for idx in order:
+            new_max = max(current_max, self.lengths[idx])
+            too_many = self.max_batch_size is not None and len(current) >= self.max_batch_size
+            if current and (too_many or (len(current) + 1) * new_max > self.max_tokens):
+                batches.append(current)
+                current, new_max = [], self.lengths[idx]
+            current.append(idx)
+            current_max = new_max
+        if current:
+            batches.append(current)
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+
+class BatchingReport:
+    """
+    Padding waste and throughput of one inference run. `power` is 1 for
+    sequence inputs and 2 for the L x L grids of the W2NER model.
+    """
+    def __init__(self, name, power=1):
+        self.name = name
+        self.power = power
+        self.real = 0
+        self.padded = 0
+        self.tokens = 0
+        self.num_batches = 0
+        self.stage_seconds = {}
+        self.start = time.perf_counter()
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def add_batch(self, lengths):
+        if not lengths:
+            return
+        longest = max(lengths)
+        self.real += sum(length ** self.power for length in lengths)
+        self.padded += len(lengths) * longest ** self.power
+        self.tokens += sum(lengths)
+        self.num_batches += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        waste = 1 - self.real / self.padded if self.padded else 0.0
+        rate = self.tokens / elapsed if elapsed > 0 else 0.0
+        stages = "".join(", {} {:.3f}s".format(stage, seconds) for stage, seconds in self.stage_seconds.items())
+        return "{}: {} batches, padding waste {:.1%}, {:.0f} tokens/s{}".format(
+            self.name, self.num_batches, waste, rate, stages)
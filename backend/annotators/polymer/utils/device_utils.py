@@ -0,0 +1,60 @@
+import os
+
+import torch
+import torch.nn as nn
+
+DEVICE_ENV = "DOCORA_DEVICE"
+NUM_THREADS_ENV = "DOCORA_NUM_THREADS"
+INTEROP_THREADS_ENV = "DOCORA_INTEROP_THREADS"
+QUANTIZE_ENV = "DOCORA_QUANTIZE"
+
+
+def select_device(device=None):
+    """
+    Resolve the inference device. An explicit annotator kwarg wins, then the
+    DOCORA_DEVICE environment variable; "auto" (the default) picks cuda:0 when
+    a GPU is visible and the CPU otherwise.
+    """
+    device = device or os.environ.get(DEVICE_ENV, "auto")
+    if device == "auto":
+        device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+    if device.type == "cuda" and not torch.cuda.is_available():
+        print("CUDA requested but not available, falling back to CPU")
+        device = torch.device("cpu")
+    return device
+
+
+def configure_cpu_threads(num_threads=None, interop_threads=None):
+    """
+    Tune intra-/inter-op parallelism for CPU inference. Values fall back to
+    DOCORA_NUM_THREADS / DOCORA_INTEROP_THREADS; unset values keep torch defaults.
+    """
+    num_threads = num_threads or os.environ.get(NUM_THREADS_ENV)
+    interop_threads = interop_threads or os.environ.get(INTEROP_THREADS_ENV)
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    if interop_threads:
+        try:
+            torch.set_interop_threads(int(interop_threads))
+        except RuntimeError:
+            # Can only be set once per process, before any inter-op work has started.
+            print("Inter-op thread count already fixed, keeping {}".format(torch.get_num_interop_threads()))
+
+
+def use_quantization(quantize=None):
+    if quantize is None:
+        quantize = os.environ.get(QUANTIZE_ENV, "0").lower() in ("1", "true", "yes")
+    return bool(quantize)
+
+
+def quantize_encoder(module):
+    """
+    Dynamic int8 quantization of the Linear layers of a transformer encoder (CPU only).
+    """
+    return torch.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def empty_cache(device):
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
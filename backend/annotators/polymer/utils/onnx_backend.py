@@ -0,0 +1,141 @@
+import inspect
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from transformers.modeling_outputs import BaseModelOutput
+
+from utils.inference_cache import checkpoint_fingerprint
+
+BACKEND_ENV = "DOCORA_BACKEND"
+ONNX_DIR_ENV = "DOCORA_ONNX_DIR"
+DEFAULT_ONNX_DIR = "cache/onnx"
+
+
+def select_backend(backend=None, device=None):
+    """
+    Resolve the encoder backend: "torch" (default) or "onnx". An explicit annotator
+    kwarg wins, then DOCORA_BACKEND. ONNX Runtime is optional and CPU only; without
+    it, or on a GPU device, the torch backend is used.
+    """
+    backend = (backend or os.environ.get(BACKEND_ENV, "torch")).lower()
+    if backend != "onnx":
+        return "torch"
+    if device is not None and device.type != "cpu":
+        print("ONNX backend runs on the CPU only, using torch on {}".format(device))
+        return "torch"
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("onnxruntime is not installed, using the torch backend")
+        return "torch"
+    return "onnx"
+
+
+class _ExportWrapper(nn.Module):
+    # Tensor-only outputs for tracing: last hidden state, the last `num_hidden_states`
+    # hidden states and, with `with_attention`, the last-layer attention.
+    def __init__(self, encoder, num_hidden_states, with_attention):
+        super().__init__()
+        self.encoder = encoder
+        self.num_hidden_states = num_hidden_states
+        self.with_attention = with_attention
+
+    def forward(self, input_ids, attention_mask):
+        output = self.encoder(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True,
+                              output_attentions=self.with_attention, return_dict=True)
+        hidden_states = output.hidden_states[-self.num_hidden_states:] if self.num_hidden_states else ()
+        attention = (output.attentions[-1],) if self.with_attention else ()
+        return (output.last_hidden_state,) + tuple(hidden_states) + attention
+
+
+def export_encoder(encoder, path, num_hidden_states=0, with_attention=False, opset_version=13):
+    """
+    Export a transformers encoder to ONNX with dynamic batch and sequence axes.
+    The last-layer attention is only exported with `with_attention` (DocRE needs it,
+    NER only when its encoder outputs are shared with DocRE).
+    """
+    output_names = ["last_hidden_state"] + ["hidden_state_{}".format(k) for k in range(num_hidden_states)]
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"}}
+    for name in output_names:
+        dynamic_axes[name] = {0: "batch", 1: "sequence"}
+    if with_attention:
+        output_names.append("attention")
+        dynamic_axes["attention"] = {0: "batch", 2: "sequence", 3: "sequence"}
+
+    wrapper = _ExportWrapper(encoder, num_hidden_states, with_attention).eval()
+    input_ids = torch.full((2, 16), 100, dtype=torch.long)
+    attention_mask = torch.ones((2, 16), dtype=torch.float)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    # the TorchScript exporter (dynamic_axes); torch >= 2.9 defaults to the dynamo one, which needs onnxscript
+    exporter = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(wrapper, (input_ids, attention_mask), tmp_path,
+                          input_names=["input_ids", "attention_mask"], output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, do_constant_folding=True,
+                          **exporter)
+    os.replace(tmp_path, path)
+    return path
+
+
+class OnnxEncoder(nn.Module):
+    """
+    Drop-in for a transformers encoder, served by an ONNX Runtime CPU session with
+    all graph optimizations. It is called like the encoder and returns a
+    BaseModelOutput, so NER_Model.forward and process_long_input use it unchanged.
+    `hidden_states` only holds the exported last layers, `attentions` only the
+    last-layer attention and only when it was exported.
+    """
+    def __init__(self, path, num_threads=None):
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.with_attention = "attention" in self.output_names
+
+    def forward(self, input_ids=None, attention_mask=None, output_attentions=False, **kwargs):
+        if output_attentions and not self.with_attention:
+            raise ValueError("{} was exported without attention".format(self.path))
+        if attention_mask is None:
+            attention_mask = input_ids.ne(0)
+        outputs = self.session.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.float32),
+        })
+        outputs = dict(zip(self.output_names, (torch.from_numpy(output) for output in outputs)))
+        hidden_states = tuple(outputs[name] for name in self.output_names if name.startswith("hidden_state_"))
+        return BaseModelOutput(last_hidden_state=outputs["last_hidden_state"],
+                               hidden_states=hidden_states or None,
+                               attentions=(outputs["attention"],) if self.with_attention else None)
+
+
+def onnx_encoder(encoder, name, checkpoint, num_hidden_states=0, with_attention=False, quantize=False,
+                 onnx_dir=None, num_threads=None):
+    """
+    OnnxEncoder for `encoder`, exported once per checkpoint file (size/mtime
+    fingerprint) and attention output into `onnx_dir` (DOCORA_ONNX_DIR, default
+    cache/onnx) and reused afterwards. With `quantize`, the export is dynamically
+    quantized to int8 by ONNX Runtime.
+    """
+    onnx_dir = onnx_dir or os.environ.get(ONNX_DIR_ENV, DEFAULT_ONNX_DIR)
+    path = os.path.join(onnx_dir, "{}-{}{}.onnx".format(name, checkpoint_fingerprint(checkpoint),
+                                                        "-att" if with_attention else ""))
+    if not os.path.exists(path):
+        print("Exporting {} encoder to {}".format(name, path))
+        export_encoder(encoder, path, num_hidden_states=num_hidden_states, with_attention=with_attention)
+    if quantize:
+        quantized_path = path[:-len(".onnx")] + "-int8.onnx"
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        path = quantized_path
+    return OnnxEncoder(path, num_threads=num_threads)
@@ -0,0 +1,61 @@
+import json
+
+
+class PairSchema:
+    """
+    Entity type pairs (head -> tail) that can hold at least one relation, and
+    an optional limit on how far apart (in word pieces) the closest mentions
+    of the two entities may be. DocRE pairs outside the schema are dropped
+    before the model runs, so they are never scored.
+    """
+    def __init__(self, relations, entity_groups=None, max_mention_distance=None):
+        groups = {name: {t.upper() for t in types} for name, types in (entity_groups or {}).items()}
+
+        def expand(types):
+            return {member for t in types for member in groups.get(t, {t.upper()})}
+
+        self.allowed = set()
+        for heads, tails in relations.values():
+            self.allowed.update((h, t) for h in expand(heads) for t in expand(tails))
+        self.max_mention_distance = max_mention_distance
+
+    @classmethod
+    def from_file(cls, path, max_mention_distance=None):
+        """
+        Either a schema file ({"relations": {type: [heads, tails]}, "entity_groups": ...})
+        or an annotation setting.json, whose relation_types are the pairs annotators can draw.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        if "setting" in schema:
+            return cls.from_relation_types(schema["setting"]["relation_types"], max_mention_distance)
+        return cls(schema["relations"], schema.get("entity_groups"), max_mention_distance)
+
+    @classmethod
+    def from_relation_types(cls, relation_types, max_mention_distance=None):
+        relations = {}
+        for relation_type in relation_types:
+            targets = {arg["role"]: arg["targets"] for arg in relation_type["args"]}
+            # skip <OVERLAP>-style pseudo relations over any "<ENTITY>"
+            if any(t.startswith("<") for types in targets.values() for t in types):
+                continue
+            relations[relation_type["type"]] = [targets["Arg1"], targets["Arg2"]]
+        return cls(relations, max_mention_distance=max_mention_distance)
+
+    def keep(self, head_type, tail_type, head_pos, tail_pos):
+        if (head_type.upper(), tail_type.upper()) not in self.allowed:
+            return False
+        if self.max_mention_distance is None:
+            return True
+        distance = min(abs(h[0] - t[0]) for h in head_pos for t in tail_pos)
+        return distance <= self.max_mention_distance
+
+    def prune(self, entities, entity_pos, hts, labels):
+        """Filter the feature's hts/labels in place; returns the number of pairs dropped."""
+        types = [entity[0]["type"] for entity in entities]
+        kept = [k for k, (h, t) in enumerate(hts) if self.keep(types[h], types[t], entity_pos[h], entity_pos[t])]
+        pruned = len(hts) - len(kept)
+        if pruned:
+            hts[:] = [hts[k] for k in kept]
+            labels[:] = [labels[k] for k in kept]
+        return pruned
@@ -0,0 +1,107 @@
+import hashlib
+import os
+
+import torch
+
+SHARE_ENCODER_ENV = "DOCORA_SHARE_ENCODER"
+
+
+def use_shared_encoder(share_encoder=None):
+    if share_encoder is None:
+        share_encoder = os.environ.get(SHARE_ENCODER_ENV, "0").lower() in ("1", "true", "yes")
+    return bool(share_encoder)
+
+
+def encoder_digest(module):
+    """
+    Content hash of an encoder's weights. Taken before quantization, so the NER
+    and DocRE encoders can be compared once at load time.
+    """
+    sha = hashlib.sha1()
+    for name, tensor in sorted(module.state_dict().items()):
+        sha.update(name.encode("utf-8"))
+        sha.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return sha.hexdigest()
+
+
+class EncodingCache:
+    """
+    Last-layer encoder outputs of the NER pass, per sentence, for reuse by the
+    DocRE pass of the same _annotate call when both stages share a checkpoint.
+
+    Entries hold the hidden states [n, H] and last-layer attention [heads, n, n]
+    of "[CLS] pieces [SEP]", keyed by the sentence words, plus the number of
+    word pieces per word so the DocRE tokenization can be checked against it.
+    """
+    def __init__(self):
+        self.sentences = {}
+        self.shared_docs = 0
+        self.encoded_docs = 0
+        self.shared_seconds = 0.0
+        self.encoded_seconds = 0.0
+
+    def add(self, words, word_pieces, hidden, attention):
+        self.sentences[tuple(words)] = (tuple(word_pieces), hidden, attention)
+
+    def add_batch(self, sentences, pieces2word, bert_inputs, hidden, attention):
+        """Store one NER batch (model_predict inputs and Model.forward encoder outputs)."""
+        num_pieces = bert_inputs.ne(0).sum(-1).tolist()
+        word_pieces = pieces2word.sum(-1).tolist()
+        for b, words in enumerate(sentences):
+            n = num_pieces[b]
+            self.add(words, word_pieces[b][:len(words)], hidden[b, :n], attention[b, :, :n, :n])
+
+    def covers(self, feature):
+        sources = feature.get("piece_sources")
+        if not sources or len(sources) != len(feature["input_ids"]):
+            return False
+        for words, pieces in zip(feature["sents"], feature["sent_pieces"]):
+            entry = self.sentences.get(tuple(words))
+            if entry is None or entry[0] != tuple(len(p) for p in pieces):
+                return False
+        return True
+
+    def assemble(self, features, device):
+        """
+        Batched (sequence_output, attention) for DocREModel.forward, built from
+        cached sentence encodings instead of running the encoder.
+
+        Each DocRE position copies the state of its source piece (entity markers
+        take the first/last piece of the mention). Attention stays within each
+        sentence and is renormalized per row, so cross-sentence context is lost:
+        this is an approximation of the paragraph-level encoding.
+        """
+        max_len = max(len(f["input_ids"]) for f in features)
+        _, hidden, attention = next(iter(self.sentences.values()))
+        heads = attention.size(0)
+        sequence_output = hidden.new_zeros((len(features), max_len, hidden.size(-1)))
+        doc_attention = attention.new_zeros((len(features), heads, max_len, max_len))
+
+        for i, f in enumerate(features):
+            sources = torch.tensor(f["piece_sources"], dtype=torch.long)
+            for s, words in enumerate(f["sents"]):
+                rows = torch.nonzero(sources[:, 0] == s).squeeze(-1)
+                if len(rows) == 0:
+                    continue
+                _, hidden, attention = self.sentences[tuple(words)]
+                src = sources[rows, 1].to(hidden.device)
+                rows = rows.to(hidden.device)
+                sequence_output[i, rows] = hidden[src]
+                doc_attention[i][:, rows[:, None], rows[None, :]] = attention[:, src[:, None], src[None, :]]
+        doc_attention = doc_attention / doc_attention.sum(-1, keepdim=True).clamp_min(1e-12)
+        return sequence_output.to(device), doc_attention.to(device)
+
+    def record(self, num_docs, seconds, shared):
+        if shared:
+            self.shared_docs += num_docs
+            self.shared_seconds += seconds
+        else:
+            self.encoded_docs += num_docs
+            self.encoded_seconds += seconds
+
+    def summary(self):
+        def per_doc(seconds, docs):
+            return "{:.1f} ms/document".format(seconds / docs * 1000) if docs else "n/a"
+        return "RE encoder sharing: {} documents reused NER encodings ({}), {} re-encoded ({})".format(
+            self.shared_docs, per_doc(self.shared_seconds, self.shared_docs),
+            self.encoded_docs, per_doc(self.encoded_seconds, self.encoded_docs))
@@ -0,0 +1,69 @@
+import copy
+import threading
+
+from transformers import AutoConfig, AutoTokenizer
+
+_tokenizers = {}
+_configs = {}
+_lock = threading.Lock()
+
+
+def get_tokenizer(name_or_path, **kwargs):
+    """
+    Process-wide tokenizer registry: each (model name, kwargs) pair is loaded
+    from disk once and shared by NER preprocessing and the DocRE feature builder.
+    Fast (Rust) tokenizers are preferred.
+    """
+    key = (name_or_path, tuple(sorted(kwargs.items())))
+    with _lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is None:
+            tokenizer = AutoTokenizer.from_pretrained(name_or_path, use_fast=True, **kwargs)
+            _tokenizers[key] = tokenizer
+    return tokenizer
+
+
+def get_pretrained_config(name_or_path, **kwargs):
+    """
+    Cached AutoConfig lookup. A copy is returned because callers attach
+    runtime attributes (cls_token_id, transformer_type, ...) to the config.
+    """
+    key = (name_or_path, tuple(sorted(kwargs.items())))
+    with _lock:
+        config = _configs.get(key)
+        if config is None:
+            config = AutoConfig.from_pretrained(name_or_path, **kwargs)
+            _configs[key] = config
+    return copy.deepcopy(config)
+
+
+def _supports_word_batching(tokenizer):
+    # Only WordPiece splits each pre-split word exactly like tokenizer.tokenize(word);
+    # BPE/SentencePiece models add a word-boundary prefix when is_split_into_words is set.
+    if not getattr(tokenizer, "is_fast", False):
+        return False
+    return type(tokenizer.backend_tokenizer.model).__name__ == "WordPiece"
+
+
+def tokenize_words(tokenizer, sentences):
+    """
+    Word pieces grouped per word for a batch of pre-split sentences, i.e. the
+    same as [[tokenizer.tokenize(word) for word in words] for words in sentences]
+    but in a single batched call when the tokenizer allows it.
+    """
+    if not _supports_word_batching(tokenizer):
+        return [[tokenizer.tokenize(word) for word in words] for words in sentences]
+
+    non_empty = [i for i, words in enumerate(sentences) if len(words) > 0]
+    output = [[] for _ in sentences]
+    if not non_empty:
+        return output
+    encoding = tokenizer([list(sentences[i]) for i in non_empty],
+                         is_split_into_words=True, add_special_tokens=False)
+    for batch_idx, i in enumerate(non_empty):
+        pieces = [[] for _ in sentences[i]]
+        for token, word_id in zip(encoding.tokens(batch_idx), encoding.word_ids(batch_idx)):
+            if word_id is not None:
+                pieces[word_id].append(token)
+        output[i] = pieces
+    return output
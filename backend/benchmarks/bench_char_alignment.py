@@ -0,0 +1,99 @@
+"""
+Benchmark for the model-text -> original-text character map used by
+convert_to_output_v2: the original difflib/dict implementation of
+build_character_mapping versus utils.char_alignment (anchored Myers diff,
+NumPy index map).
+
+The two aligners can pick different alignments wherever several are valid
+(ties between equal characters, and difflib's longest-match recursion is not a
+minimal diff), on short strings as well as long ones, so only the agreement
+rate is reported, together with how often each one maps a character onto an
+identical original character. The edge cases and accepted tie-breaks are
+pinned in tests/test_char_alignment.py.
+
+Run from the backend directory:
+    python -m benchmarks.bench_char_alignment --paragraphs 500
+"""
+import argparse
+import difflib
+import random
+import re
+import time
+
+from utils.char_alignment import character_index_map
+
+WORDS = ("The glass transition temperature ( Tg ) of poly(methyl methacrylate) PMMA films was 105 °C , "
+         "whereas the tensile strength reached 45 MPa at 25 °C . Moreover , the Young's modulus of "
+         "2.4 GPa [ 12 ] was obtained ; see Fig. 3a – c .").split()
+
+
+def difflib_mapping(model_output_text, original_text):
+    # Reference: build_character_mapping before the switch to utils.char_alignment.
+    s = difflib.SequenceMatcher(None, model_output_text, original_text)
+    mapping_dict = {}
+    o_idx = -1
+    for tag, i1, i2, j1, j2 in s.get_opcodes():
+        if tag == 'equal' or tag == 'replace':
+            for m_pos, o_pos in zip(range(i1, i2), range(j1, j2)):
+                mapping_dict[m_pos] = o_pos
+                o_idx = o_pos
+            if tag == 'replace' and i2 - i1 > j2 - j1:
+                for m_pos in range(i1 + j2 - j1, i2):
+                    mapping_dict[m_pos] = o_idx
+        elif tag == 'delete':
+            for m_pos in range(i1, i2):
+                mapping_dict[m_pos] = o_idx
+    for idx in range(len(model_output_text)):
+        if idx not in mapping_dict:
+            mapping_dict[idx] = o_idx
+    return mapping_dict
+
+
+def synthetic_paragraph(rng):
+    original = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(20, 400)))
+    for spaced, joined in [("( ", "("), (" )", ")"), (" ,", ","), (" .", "."), ("[ ", "["), (" ]", "]")]:
+        original = original.replace(spaced, joined)
+    if rng.random() < 0.5:
+        original = original.replace("°C", "℃")
+    model_text = " ".join(re.findall(r"\w+(?:[.'-]\w+)*|[^\w\s]", original)).replace("℃", "C")
+    present = set(model_text)
+    normalized = "".join(c * 2 if c not in present else c for c in original)
+    return model_text, normalized
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pairs = [synthetic_paragraph(rng) for _ in range(args.paragraphs)]
+
+    start = time.perf_counter()
+    reference = [difflib_mapping(m, o) for m, o in pairs]
+    difflib_time = time.perf_counter() - start
+    start = time.perf_counter()
+    aligned = [character_index_map(m, o) for m, o in pairs]
+    aligned_time = time.perf_counter() - start
+
+    agree = same_ref = same_new = chars = 0
+    for (model_text, original), ref, new in zip(pairs, reference, aligned):
+        new = new.tolist()
+        agree += new == [ref[i] for i in range(len(model_text))]
+        for i, c in enumerate(model_text):
+            if not c.isspace():
+                chars += 1
+                same_ref += original[ref[i]] == c
+                same_new += original[new[i]] == c
+
+    mean_len = sum(len(m) for m, _ in pairs) / len(pairs)
+    print(f"{len(pairs)} paragraphs, mean length {mean_len:.0f} chars")
+    print(f"{'difflib + dict':>22}: {difflib_time / len(pairs) * 1e3:8.3f} ms/paragraph")
+    print(f"{'anchored Myers + array':>22}: {aligned_time / len(pairs) * 1e3:8.3f} ms/paragraph")
+    print(f"identical maps: {agree}/{len(pairs)}")
+    print(f"non-space chars mapped onto the same character: "
+          f"difflib {same_ref / chars:.2%}, Myers {same_new / chars:.2%}")
+
+
+if __name__ == "__main__":
+    main()
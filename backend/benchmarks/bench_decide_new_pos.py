@@ -0,0 +1,114 @@
+"""
+Benchmark for click-to-create entity resolution (/create-entity): the original
+decide_new_pos scan (a pydantic Rect per character, every character tested
+against every selected rect) versus the page/paragraph bucketed character
+index, cold and reused from the cache. Results are checked to be identical.
+
+Run from the backend directory:
+    python -m benchmarks.bench_decide_new_pos --pages 40 --queries 50
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from schemas.document import Rect
+from utils import utils
+from utils.char_index import CharacterIndexCache
+
+
+def legacy_decide_new_pos(new_entity, char_positions):
+    # Reference: decide_new_pos before the character index.
+    entity_rects = new_entity.position.rects
+    found_para_id = -1
+    found_idx = []
+    for para_id, char_list in enumerate(char_positions):
+        relative_indices = []
+        flattened_char_positions = [(idx, Rect(**char)) for idx, char in enumerate(char_list)]
+        if not flattened_char_positions:
+            return []
+        _, first_server_rect = flattened_char_positions[0]
+        width_scale = first_server_rect.width / entity_rects[0].width
+        height_scale = first_server_rect.height / entity_rects[0].height
+        scaled_entity_rects = [
+            Rect(x1=rect.x1 * width_scale, y1=rect.y1 * height_scale, x2=rect.x2 * width_scale,
+                 y2=rect.y2 * height_scale, width=first_server_rect.width,
+                 height=first_server_rect.height, pageNumber=rect.pageNumber)
+            for rect in entity_rects
+        ]
+        for scaled_entity_rect in scaled_entity_rects:
+            for idx, char_rect in flattened_char_positions:
+                if utils.check_character_inside_bounding_rect(scaled_entity_rect, char_rect):
+                    relative_indices.append(idx)
+        if relative_indices != []:
+            found_para_id = para_id
+            found_idx = sorted(list(set(relative_indices)))
+    return found_para_id, found_idx
+
+
+def make_document(n_pages, rng, page_width=612.0, page_height=792.0):
+    # Two-column layout, ~12 paragraphs per page of 4-10 lines, 6pt-wide characters.
+    char_positions = []
+    for page in range(1, n_pages + 1):
+        for column in range(2):
+            y = 60.0
+            while y < page_height - 120:
+                chars = []
+                for _ in range(rng.randrange(4, 10)):
+                    x = 50.0 + column * 280
+                    for _ in range(rng.randrange(30, 45)):
+                        chars.append({"x1": x, "y1": y, "x2": x + 5.5, "y2": y + 11.0, "width": page_width,
+                                      "height": page_height, "pageNumber": page})
+                        x += 6.0
+                    y += 13.0
+                char_positions.append(chars)
+                y += 10.0
+    return char_positions
+
+
+def make_selection(char_positions, rng, scale=1.5):
+    para = rng.choice(char_positions)
+    start = rng.randrange(len(para) - 12)
+    chars = para[start:start + rng.randrange(3, 12)]
+    # the viewer works in its own (zoomed) coordinate system
+    rects = [Rect(x1=c["x1"] * scale, y1=c["y1"] * scale + rng.uniform(-1, 1), x2=c["x2"] * scale,
+                  y2=c["y2"] * scale + rng.uniform(-1, 1), width=c["width"] * scale,
+                  height=c["height"] * scale, pageNumber=c["pageNumber"]) for c in (chars[0], chars[-1])]
+    return SimpleNamespace(position=SimpleNamespace(rects=rects))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    char_positions = make_document(args.pages, rng)
+    selections = [make_selection(char_positions, rng) for _ in range(args.queries)]
+    utils.character_index_cache = CharacterIndexCache()
+    utils.print = lambda *a, **k: None  # decide_new_pos logs every call
+
+    start = time.perf_counter()
+    expected = [legacy_decide_new_pos(sel, char_positions) for sel in selections]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cold = [utils.decide_new_pos(sel, char_positions) for sel in selections]
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm = [utils.decide_new_pos(sel, char_positions, index_key=("bench", 0)) for sel in selections]
+    warm_time = time.perf_counter() - start
+
+    assert cold == expected and warm == expected
+    n_chars = sum(len(p) for p in char_positions)
+    print(f"{args.pages} pages, {len(char_positions)} paragraphs, {n_chars} characters, "
+          f"{sum(1 for r in expected if r[0] >= 0)}/{len(expected)} selections resolved")
+    for label, elapsed in [("original scan", legacy_time), ("index per call", cold_time),
+                           ("cached index", warm_time)]:
+        print(f"{label:>16}: {elapsed / len(selections) * 1e3:9.2f} ms/call")
+
+
+if __name__ == "__main__":
+    main()
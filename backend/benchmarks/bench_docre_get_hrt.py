@@ -0,0 +1,123 @@
+"""
+Benchmark for DocREModel.get_hrt: the original loop over documents and
+entities versus the batched mention gather (logsumexp over a -inf padded
+[entity, mention] layout, mean via index_add) with pair attentions taken from
+a per-document [seq_len, E, E] Gram matrix over the heads. Inputs include
+multi-mention entities, mentions cut off by the sequence length and entities
+with no surviving mention. Numerical equivalence is tested in
+tests/test_docre_get_hrt.py; the script re-checks it on its own inputs.
+
+Run from the backend directory:
+    python -m benchmarks.bench_docre_get_hrt --batches 20 --batch-size 4 --entities 10 20 40 80
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+import torch
+
+from annotators.polymer.models.RE_model import DocREModel
+
+
+def legacy_get_hrt(config, sequence_output, attention, entity_pos, hts):
+    # Reference: get_hrt before vectorization.
+    offset = 1 if config.transformer_type in ["bert", "roberta"] else 0
+    n, h, _, c = attention.size()
+    hss, tss, rss = [], [], []
+    for i in range(len(entity_pos)):
+        entity_embs, entity_atts = [], []
+        for e in entity_pos[i]:
+            if len(e) > 1:
+                e_emb, e_att = [], []
+                for start, end in e:
+                    if start + offset < c:
+                        e_emb.append(sequence_output[i, start + offset])
+                        e_att.append(attention[i, :, start + offset])
+                if len(e_emb) > 0:
+                    e_emb = torch.logsumexp(torch.stack(e_emb, dim=0), dim=0)
+                    e_att = torch.stack(e_att, dim=0).mean(0)
+                else:
+                    e_emb = torch.zeros(config.hidden_size).to(sequence_output)
+                    e_att = torch.zeros(h, c).to(attention)
+            else:
+                start, end = e[0]
+                if start + offset < c:
+                    e_emb = sequence_output[i, start + offset]
+                    e_att = attention[i, :, start + offset]
+                else:
+                    e_emb = torch.zeros(config.hidden_size).to(sequence_output)
+                    e_att = torch.zeros(h, c).to(attention)
+            entity_embs.append(e_emb)
+            entity_atts.append(e_att)
+
+        entity_embs = torch.stack(entity_embs, dim=0)
+        entity_atts = torch.stack(entity_atts, dim=0)
+
+        ht_i = torch.LongTensor(hts[i]).to(sequence_output.device)
+        hs = torch.index_select(entity_embs, 0, ht_i[:, 0])
+        ts = torch.index_select(entity_embs, 0, ht_i[:, 1])
+
+        h_att = torch.index_select(entity_atts, 0, ht_i[:, 0])
+        t_att = torch.index_select(entity_atts, 0, ht_i[:, 1])
+        ht_att = (h_att * t_att).mean(1)
+        ht_att = ht_att / (ht_att.sum(1, keepdim=True) + 1e-5)
+        rs = torch.einsum("ld,rl->rd", sequence_output[i], ht_att)
+        hss.append(hs)
+        tss.append(ts)
+        rss.append(rs)
+    return torch.cat(hss, dim=0), torch.cat(rss, dim=0), torch.cat(tss, dim=0)
+
+
+def make_batch(batch_size, max_entities, seq_len, hidden_size, heads, rng):
+    sequence_output = torch.randn(batch_size, seq_len, hidden_size)
+    attention = torch.softmax(torch.randn(batch_size, heads, seq_len, seq_len), dim=-1)
+    entity_pos, hts = [], []
+    for _ in range(batch_size):
+        num_entities = rng.randint(2, max_entities)
+        entities = []
+        for _ in range(num_entities):
+            # a few start positions run past seq_len, as when the paragraph is truncated
+            starts = [rng.randrange(seq_len + 20) for _ in range(rng.choice([1, 1, 1, 2, 3]))]
+            entities.append([(s, s + 2) for s in starts])
+        pairs = [[h, t] for h in range(num_entities) for t in range(num_entities) if h != t]
+        entity_pos.append(entities)
+        hts.append(rng.sample(pairs, max(1, len(pairs) // 2)))
+    return sequence_output, attention, entity_pos, hts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--entities", type=int, nargs="+", default=[10, 20, 40, 80])
+    parser.add_argument("--seq-len", type=int, default=384)
+    args = parser.parse_args()
+
+    hidden_size, heads = 768, 12
+    model = SimpleNamespace(config=SimpleNamespace(transformer_type="bert", hidden_size=hidden_size))
+    for max_entities in args.entities:
+        rng = random.Random(0)
+        torch.manual_seed(0)
+        batches = [make_batch(args.batch_size, max_entities, args.seq_len, hidden_size, heads, rng)
+                   for _ in range(args.batches)]
+
+        with torch.inference_mode():
+            for batch in batches:
+                for new, old in zip(DocREModel.get_hrt(model, *batch), legacy_get_hrt(model.config, *batch)):
+                    assert torch.allclose(new, old, atol=1e-5, rtol=1e-5)
+
+            timings = {}
+            for label, fn in [("loop", lambda b: legacy_get_hrt(model.config, *b)),
+                              ("batched", lambda b: DocREModel.get_hrt(model, *b))]:
+                fn(batches[0])
+                start = time.perf_counter()
+                for batch in batches:
+                    fn(batch)
+                timings[label] = (time.perf_counter() - start) / args.batches * 1e3
+        print(f"up to {max_entities:>3} entities: loop {timings['loop']:8.2f} ms/batch, "
+              f"batched {timings['batched']:8.2f} ms/batch ({timings['loop'] / timings['batched']:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Throughput of concurrent small uploads through one pooled annotator from the
+real registry (configs/annotators.yaml, model weights required): every upload
+calling _annotate on the pooled instance directly versus the same pool with the
+cross-task InferenceBroker attached. Each upload is a different set of
+paragraphs; the inference cache is not used, so every paragraph goes through
+the model. Brokered outputs are compared with the direct ones per upload.
+
+Run from the backend directory:
+    python -m benchmarks.bench_inference_broker --domain material --uploads 12 --paragraphs 3
+    python -m benchmarks.bench_inference_broker --paragraphs-file abstracts.txt
+"""
+import argparse
+import threading
+import time
+
+from utils.annotator_registry import HotAnnotatorRegistry
+
+PARAGRAPHS = [
+    "Poly(methyl methacrylate) (PMMA) films were prepared by solution casting from toluene. "
+    "The glass transition temperature of PMMA was {} C, measured by differential scanning calorimetry.",
+    "Polystyrene (PS) with a molecular weight of {} kg/mol was synthesized by anionic polymerization. "
+    "Its Young's modulus reached 3.2 GPa at 25 C.",
+    "The polyimide membrane showed a CO2 permeability of {} Barrer at 35 C and 2 bar.",
+    "Nylon-6 fibers were melt spun at 260 C. The crystallinity measured by XRD was {} %.",
+]
+
+
+def make_uploads(templates, n_uploads, n_paragraphs):
+    # distinct text per upload, as independent users would send
+    return [[templates[(u + p) % len(templates)].format(100 + 7 * u + p) for p in range(n_paragraphs)]
+            for u in range(n_uploads)]
+
+
+def run_uploads(annotator, uploads):
+    results = [None] * len(uploads)
+    barrier = threading.Barrier(len(uploads))
+
+    def upload(i):
+        barrier.wait()
+        results[i] = annotator._annotate(uploads[i])
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(len(uploads))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def pooled_annotator(config, domain, broker):
+    registry = HotAnnotatorRegistry(config, pool=True, broker=broker)
+    annotator = registry.get_annotator(domain)
+    if hasattr(annotator, "check_load_model"):
+        annotator.check_load_model()
+    return registry, annotator
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="configs/annotators.yaml")
+    parser.add_argument("--domain", default="material")
+    parser.add_argument("--uploads", type=int, default=12)
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--paragraphs-file", default=None, help="one paragraph per line, used instead of the built-in ones")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    templates = PARAGRAPHS
+    if args.paragraphs_file:
+        with open(args.paragraphs_file, encoding="utf-8") as f:
+            # literal paragraphs: escape braces so format() leaves them alone, then append a number
+            templates = [line.strip().replace("{", "{{").replace("}", "}}") + " ({})" for line in f if line.strip()]
+    uploads = make_uploads(templates, args.uploads, args.paragraphs)
+    total = args.uploads * args.paragraphs
+
+    registry, direct = pooled_annotator(args.config, args.domain, broker=False)
+    direct._annotate(uploads[0])  # warm-up: lazy model loading, allocator, kernels
+    expected, _ = run_uploads(direct, uploads)
+    direct_times = [run_uploads(direct, uploads)[1] for _ in range(args.repeats)]
+    registry.evict()
+    del direct
+
+    registry, brokered = pooled_annotator(args.config, args.domain, broker=True)
+    brokered._annotate(uploads[0])
+    broker_times = []
+    for _ in range(args.repeats):
+        results, elapsed = run_uploads(brokered, uploads)
+        broker_times.append(elapsed)
+        same = sum(result == reference for result, reference in zip(results, expected))
+    stats = registry.stats()[args.domain].get("broker")
+
+    print(f"{args.domain}: {args.uploads} concurrent uploads x {args.paragraphs} paragraphs, best of {args.repeats}")
+    for label, times in [("per-upload _annotate", direct_times), ("inference broker", broker_times)]:
+        best = min(times)
+        print(f"{label:>20}: {best * 1e3:8.1f} ms, {total / best:7.1f} paragraphs/s")
+    print(f"uploads identical to the direct path: {same}/{args.uploads}")
+    print("broker stats:", stats)
+    registry.evict()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark and equivalence check for the name clustering in legal coreference
+postprocessing (annotators/legal/utils.py): the original pairwise
+nltk.edit_distance scans of calculate_lev and create_precedent_clusters versus
+the length/character-bucketed index with bounded edit distance. Clusters must
+be identical.
+
+Run from the backend directory:
+    python -m benchmarks.bench_name_clustering --mentions 1000
+"""
+import argparse
+import random
+import time
+
+import nltk
+
+from annotators.legal import utils
+from annotators.legal.clustering import bounded_edit_distance
+
+FIRST = ["ram", "shyam", "mohan", "sita", "geeta", "rajesh", "suresh", "anil", "sunil", "vijay", "ajay",
+         "priya", "kavita", "arun", "varun", "deepak", "manoj", "rakesh", "mukesh", "neha"]
+LAST = ["kumar", "sharma", "verma", "singh", "gupta", "yadav", "patel", "reddy", "iyer", "nair", "das",
+        "mehta", "joshi", "mishra", "pandey", "chauhan", "malhotra", "kapoor", "bhat", "rao"]
+PARTIES = ["state of maharashtra", "union of india", "state of u.p.", "state of punjab", "delhi administration",
+           "m/s. tata steel ltd.", "bharat petroleum corp.", "municipal corporation of delhi"]
+REPORTERS = ["SCC", "AIR", "SCR", "Cri LJ", "Bom LR"]
+
+
+def legacy_calculate_lev(names, threshold):
+    # Reference: calculate_lev before the clustering index.
+    pairs = {}
+    deselect = []
+    for i, name in enumerate(names):
+        if i in deselect:
+            continue
+        pair = []
+        for j in range(i + 1, len(names)):
+            dis = nltk.edit_distance(name, names[j])
+            if dis <= threshold:
+                pair.append(j)
+                deselect.append(j)
+        pairs[i] = pair
+    return pairs, len(pairs.keys())
+
+
+def legacy_create_precedent_clusters(precedent_breakup, threshold):
+    # Reference: create_precedent_clusters before the clustering index.
+    cluster_num = 0
+    exclude = []
+    precedent_clusters = {}
+    for i, pre in enumerate(precedent_breakup.keys()):
+        if i in exclude:
+            continue
+        pet = precedent_breakup[pre][0]
+        res = precedent_breakup[pre][1]
+        cit = precedent_breakup[pre][2]
+        cluster = [pre]
+        if pet != None and res != None:
+            for j in range(i + 1, len(precedent_breakup)):
+                pet_1 = list(precedent_breakup.values())[j][0]
+                res_1 = list(precedent_breakup.values())[j][1]
+                cit_1 = list(precedent_breakup.values())[j][2]
+                if (pet_1 == None or res_1 == None):
+                    if cit_1 == None:
+                        exclude.append(j)
+                    else:
+                        if cit_1 == cit:
+                            exclude.append(j)
+                            cluster.append(list(precedent_breakup.keys())[j])
+                else:
+                    dis_pet = nltk.edit_distance(pet, pet_1)
+                    dis_res = nltk.edit_distance(res, res_1)
+                    if dis_pet < threshold and dis_res < threshold:
+                        exclude.append(j)
+                        cluster.append(list(precedent_breakup.keys())[j])
+            precedent_clusters[cluster_num] = cluster
+            cluster_num = cluster_num + 1
+        elif cit != None:
+            for j in range(i + 1, len(precedent_breakup)):
+                cit_1 = list(precedent_breakup.values())[j][2]
+                if cit_1 != None and cit_1 == cit:
+                    exclude.append(j)
+                    cluster.append(list(precedent_breakup.keys())[j])
+            precedent_clusters[cluster_num] = cluster
+            cluster_num = cluster_num + 1
+    return precedent_clusters
+
+
+def typo(text, rng):
+    if len(text) < 3 or rng.random() < 0.6:
+        return text
+    i = rng.randrange(len(text))
+    return rng.choice([text[:i] + text[i + 1:], text[:i] + rng.choice("aeiou") + text[i + 1:],
+                       text[:i] + text[i] + text[i:]])
+
+
+def person(rng):
+    return f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+
+
+def make_names(n, rng):
+    base = [person(rng) for _ in range(max(1, n // 4))]
+    return [typo(rng.choice(base), rng) for _ in range(n)]
+
+
+def make_precedents(n, rng):
+    # split_precedents output: [petitioner, respondent, citation]; mentions repeat with typos
+    base = []
+    for _ in range(max(1, n // 5)):
+        cit = rng.choice(["", f"({rng.randrange(1990, 2020)}) {rng.randrange(1, 12)} {rng.choice(REPORTERS)} "
+                                  f"{rng.randrange(1, 900)}"])
+        if rng.random() < 0.2:
+            base.append([None, None, cit])
+        else:
+            base.append([person(rng), rng.choice(PARTIES + [person(rng)]), cit])
+    breakup = {}
+    for k in range(n):
+        pet, res, cit = rng.choice(base)
+        if pet is not None:
+            pet, res = typo(pet, rng), typo(res, rng)
+        breakup[f"precedent {k}"] = [pet, res, cit if rng.random() < 0.9 else None]
+    return breakup
+
+
+def check_distance(rng, trials=20000):
+    for _ in range(trials):
+        a, b = typo(typo(person(rng), rng), rng), typo(person(rng), rng)
+        bound = rng.randrange(-1, 6)
+        expected = nltk.edit_distance(a, b)
+        assert bounded_edit_distance(a, b, bound) == (expected if expected <= bound else bound + 1), (a, b, bound)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mentions", type=int, default=1000)
+    parser.add_argument("--threshold", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    check_distance(rng)
+    names = make_names(args.mentions, rng)
+    breakup = make_precedents(args.mentions, rng)
+
+    start = time.perf_counter()
+    expected_names = legacy_calculate_lev(names, args.threshold)
+    legacy_names_time = time.perf_counter() - start
+    start = time.perf_counter()
+    names_result = utils.calculate_lev(names, args.threshold)
+    names_time = time.perf_counter() - start
+    assert names_result == expected_names
+
+    start = time.perf_counter()
+    expected_clusters = legacy_create_precedent_clusters(breakup, args.threshold)
+    legacy_clusters_time = time.perf_counter() - start
+    start = time.perf_counter()
+    clusters = utils.create_precedent_clusters(breakup, args.threshold)
+    clusters_time = time.perf_counter() - start
+    assert clusters == expected_clusters
+
+    print(f"{args.mentions} mentions, threshold {args.threshold}: {names_result[1]} name clusters, "
+          f"{len(clusters)} precedent clusters (identical to the original)")
+    for label, legacy, new in [("calculate_lev", legacy_names_time, names_time),
+                               ("create_precedent_clusters", legacy_clusters_time, clusters_time)]:
+        print(f"{label:>26}: original {legacy * 1e3:9.1f} ms, indexed {new * 1e3:8.1f} ms ({legacy / new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark and equivalence check for W2NER grid decoding (NER_utils.decode):
+the original dense l x l scan per sentence versus the sparse decoder, which
+pulls the THW/NNW cells of the whole batch out with np.nonzero first.
+decode_entities must be identical, including order.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ner_decode --batches 50 --batch-size 16
+"""
+import argparse
+import random
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from annotators.polymer.utils.NER_utils import convert_index_to_text, convert_text_to_index, decode
+
+
+def legacy_decode(outputs, entities, length):
+    # Reference: decode before the sparse cell extraction.
+    class Node:
+        def __init__(self):
+            self.THW = []                # [(tail, type)]
+            self.NNW = defaultdict(set)   # {(head,tail): {next_index}}
+
+    ent_r, ent_p, ent_c = 0, 0, 0
+    decode_entities = []
+    q = deque()
+    for instance, ent_set, l in zip(outputs, entities, length):
+        predicts = []
+        nodes = [Node() for _ in range(l)]
+        for cur in reversed(range(l)):
+            heads = []
+            for pre in range(cur+1):
+                if instance[cur, pre] > 1:
+                    nodes[pre].THW.append((cur, instance[cur, pre]))
+                    heads.append(pre)
+                if pre < cur and instance[pre, cur] == 1:
+                    for head in heads:
+                        nodes[pre].NNW[(head,cur)].add(cur)
+                    for head,tail in nodes[cur].NNW.keys():
+                        if tail >= cur and head <= pre:
+                            nodes[pre].NNW[(head,tail)].add(cur)
+            for tail,type_id in nodes[cur].THW:
+                if cur == tail:
+                    predicts.append(([cur], type_id))
+                    continue
+                q.clear()
+                q.append([cur])
+                while len(q) > 0:
+                    chains = q.pop()
+                    for idx in nodes[chains[-1]].NNW[(cur,tail)]:
+                        if idx == tail:
+                            predicts.append((chains + [idx], type_id))
+                        else:
+                            q.append(chains + [idx])
+        predicts = set([convert_index_to_text(x[0], x[1]) for x in predicts])
+        decode_entities.append([convert_text_to_index(x) for x in predicts])
+        ent_r += len(ent_set)
+        ent_p += len(predicts)
+        ent_c += len(predicts.intersection(ent_set))
+    return ent_c, ent_p, ent_r, decode_entities
+
+
+def make_batch(batch_size, rng, num_labels=16, noise=0.005):
+    # argmax grids as model_predict sees them: planted entities (some discontinuous,
+    # some nested/overlapping), sparse noise, and garbage in the padding
+    lengths = [rng.randrange(5, 120) for _ in range(batch_size)]
+    size = max(lengths)
+    outputs = np.zeros((batch_size, size, size), dtype=np.int64)
+    entity_text = []
+    for b, l in enumerate(lengths):
+        gold = set()
+        for _ in range(max(1, l // 8)):
+            start = rng.randrange(l)
+            span = list(range(start, min(l, start + rng.randrange(1, 5))))
+            if len(span) > 2 and rng.random() < 0.2:
+                span.pop(rng.randrange(1, len(span) - 1))
+            type_id = rng.randrange(2, num_labels)
+            for a, c in zip(span, span[1:]):
+                outputs[b, a, c] = 1
+            outputs[b, span[-1], span[0]] = type_id
+            gold.add(convert_index_to_text(span, type_id))
+        mask = np.random.default_rng(rng.randrange(1 << 30)).random((l, l)) < noise
+        outputs[b, :l, :l][mask] = rng.randrange(1, num_labels)
+        outputs[b, l:, :] = rng.randrange(num_labels)
+        outputs[b, :, l:] = rng.randrange(num_labels)
+        entity_text.append(gold)
+    return outputs, entity_text, np.array(lengths)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    batches = [make_batch(args.batch_size, rng) for _ in range(args.batches)]
+
+    start = time.perf_counter()
+    expected = [legacy_decode(outputs, ents, length) for outputs, ents, length in batches]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [decode(outputs, ents, length) for outputs, ents, length in batches]
+    sparse_time = time.perf_counter() - start
+
+    assert results == expected
+    sentences = args.batches * args.batch_size
+    print(f"{sentences} sentences, {sum(r[1] for r in expected)} decoded entities: identical")
+    for label, elapsed in [("dense scan", legacy_time), ("sparse cells", sparse_time)]:
+        print(f"{label:>13}: {elapsed / args.batches * 1e3:8.2f} ms/batch")
+
+
+if __name__ == "__main__":
+    main()
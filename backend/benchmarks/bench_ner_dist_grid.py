@@ -0,0 +1,67 @@
+"""
+Micro-benchmark for the W2NER distance grid built in process_bert: the original
+per-cell Python loop versus the broadcast lookup (dist_grid) over a realistic
+sentence-length distribution.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ner_dist_grid --sentences 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from annotators.polymer.models.NER_model import dis2idx, dist_grid
+
+
+def loop_dist_grid(length):
+    # Reference: the implementation process_bert used before vectorization.
+    _dist_inputs = np.zeros((length, length), dtype=int)
+    for k in range(length):
+        _dist_inputs[k, :] += k
+        _dist_inputs[:, k] -= k
+
+    for i in range(length):
+        for j in range(length):
+            if _dist_inputs[i, j] < 0:
+                _dist_inputs[i, j] = dis2idx[-_dist_inputs[i, j]] + 9
+            else:
+                _dist_inputs[i, j] = dis2idx[_dist_inputs[i, j]]
+    _dist_inputs[_dist_inputs == 0] = 19
+    return _dist_inputs
+
+
+def sentence_lengths(n, seed=0):
+    # Materials-science abstracts: median ~28 tokens with a long tail of 100+ token sentences.
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.lognormal(mean=3.3, sigma=0.6, size=n).astype(int), 1, 400).tolist()
+
+
+def run(fn, lengths):
+    start = time.perf_counter()
+    for length in lengths:
+        fn(length)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=2000)
+    args = parser.parse_args()
+
+    lengths = sentence_lengths(args.sentences)
+    for length in sorted(set(lengths))[::10]:
+        assert (loop_dist_grid(length) == dist_grid(length)).all()
+    dist_grid.cache_clear()
+
+    print(f"{len(lengths)} sentences, mean length {np.mean(lengths):.1f}, max {max(lengths)}")
+    loop_time = run(loop_dist_grid, lengths)
+    cold_time = run(dist_grid, lengths)
+    warm_time = run(dist_grid, lengths)
+    for label, elapsed in [("python loop", loop_time), ("vectorized (cold cache)", cold_time),
+                           ("vectorized (warm cache)", warm_time)]:
+        print(f"{label:>24}: {elapsed / len(lengths) * 1e6:10.1f} us/sentence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+CPU benchmark and equivalence check for word-piece pooling in the polymer NER
+model (NER_model.Model.forward): the original masked max over the expanded
+[B, L, L', H] tensor versus pool_word_pieces, which gathers the (contiguous)
+pieces of each word into [B, L, K, H] with K the longest word in pieces.
+Reports latency and the largest single allocation (torch profiler) per sentence
+length; word representations must be identical.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ner_word_pooling --lengths 16 32 64 128 256 --batch-size 8
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+from annotators.polymer.models.NER_model import pool_word_pieces
+
+
+def legacy_pool(bert_embs, pieces2word):
+    # Reference: the pooling Model.forward used before pool_word_pieces.
+    length = pieces2word.size(1)
+    min_value = torch.min(bert_embs).item()
+    _bert_embs = bert_embs.unsqueeze(1).expand(-1, length, -1, -1)
+    _bert_embs = torch.masked_fill(_bert_embs, pieces2word.eq(0).unsqueeze(-1), min_value)
+    word_reps, _ = torch.max(_bert_embs, dim=2)
+    return word_reps
+
+
+def make_batch(batch_size, length, hidden_size, rng):
+    # pieces2word as collate_fn builds it: 1-3 pieces per word after [CLS],
+    # shorter sentences padded, the odd word without pieces
+    lengths = [length] + [int(rng.integers(max(1, length // 2), length + 1)) for _ in range(batch_size - 1)]
+    pieces = [rng.integers(1, 4, size=l) for l in lengths]
+    for p in pieces:
+        if len(p) > 4:
+            p[rng.integers(len(p))] = 0
+    max_pie = max(int(p.sum()) for p in pieces) + 2
+    pieces2word = torch.zeros((batch_size, length, max_pie), dtype=torch.bool)
+    for b, p in enumerate(pieces):
+        start = 1
+        for i, n in enumerate(p):
+            pieces2word[b, i, start:start + n] = True
+            start += n
+    bert_embs = torch.from_numpy(rng.standard_normal((batch_size, max_pie, hidden_size)).astype(np.float32))
+    return bert_embs, pieces2word
+
+
+def peak_allocation(fn, *args):
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn(*args)
+    return max((e.cpu_memory_usage for e in prof.events()), default=0)
+
+
+def timed(fn, args, repeats):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(*args)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=768)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'words':>6} {'pieces':>6} | {'masked max':>22} | {'gathered max':>22}")
+    with torch.no_grad():
+        for length in args.lengths:
+            batch = make_batch(args.batch_size, length, args.hidden_size, rng)
+            assert torch.equal(pool_word_pieces(*batch), legacy_pool(*batch))
+            row = []
+            for fn in (legacy_pool, pool_word_pieces):
+                elapsed = timed(fn, batch, args.repeats)
+                peak = peak_allocation(fn, *batch)
+                row.append(f"{elapsed * 1e3:8.2f} ms {peak / 2 ** 20:8.1f} MiB")
+            print(f"{length:>6} {batch[1].size(2):>6} | {row[0]} | {row[1]}")
+
+
+if __name__ == "__main__":
+    main()
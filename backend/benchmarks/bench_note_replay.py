@@ -0,0 +1,131 @@
+"""
+Benchmark for user-note replay on a long editing session: the original replay
+(deep copy of the whole document per paragraph/reorder note) versus the
+copy-on-write replay, with and without snapshots (utils.note_snapshots).
+
+Run from the backend directory:
+    python -m benchmarks.bench_note_replay --notes 1000 --paragraphs 80
+"""
+import argparse
+import copy
+import gc
+import random
+import time
+
+from utils import utils
+from utils.note_snapshots import NoteSnapshotStore
+
+
+def make_document(n_paragraphs, rng):
+    paragraphs, bboxs, relations = [], [], []
+    for p in range(n_paragraphs):
+        text = " ".join(rng.choice(["polymer", "Tg", "of", "PMMA", "is", "105", "C", "film"])
+                        for _ in range(12))
+        paragraphs.append(text)
+        bboxs.append([{"x1": i, "y1": p, "x2": i + 1, "y2": p + 1, "width": 1, "height": 1,
+                       "pageNumber": 1 + p // 20} for i in range(len(text))])
+        entities = [[f"T{e}", "PROP_NAME", [[e * 4, e * 4 + 3]], "", "Tg"] for e in range(1, 9)]
+        rels = [[f"R{r}", f"T{r}", f"T{r + 1}", "has_value"] for r in range(1, 8)]
+        relations.append({"text": text, "entities": entities, "relations": rels, "edit_status": []})
+    return paragraphs, bboxs, relations
+
+
+def make_notes(n_notes, n_paragraphs, rng):
+    notes = []
+    for i in range(n_notes):
+        para_id = rng.randrange(n_paragraphs)
+        kind = rng.random()
+        rel = [f"R{100 + i}", f"T{rng.randrange(1, 9)}", f"T{rng.randrange(1, 9)}", "has_value"]
+        if kind < 0.45:
+            notes.append({"action": "add", "target": "relation", "content": [{"para_id": para_id, "rel": rel}]})
+        elif kind < 0.7:
+            notes.append({"action": "update", "target": "relation", "content": [{"para_id": para_id, "rel": rel}]})
+        elif kind < 0.85:
+            notes.append({"action": "delete", "target": "relation", "content": [{"para_id": para_id, "rel": rel}]})
+        elif kind < 0.95:
+            notes.append({"action": "update", "target": "para",
+                          "content": [{"para_id": para_id, "text": f"edited paragraph {i} with Tg 105 C"}]})
+        else:
+            order = list(range(n_paragraphs))
+            rng.shuffle(order)
+            notes.append({"action": "update", "target": "all", "content": [{"new_order": order}]})
+    return notes
+
+
+def legacy_relations(user_notes, relations):
+    # Reference: reorder_all deep-copied the whole list on every reorder note.
+    for note in user_notes:
+        if note["target"] == "relation":
+            relations = utils.execute_one_note_on_relations(note, relations)
+        elif note["target"] == "all":
+            relations = copy.deepcopy([relations[i] for i in note["content"][0]["new_order"]])
+    return relations
+
+
+def legacy_paragraphs(user_notes, paragraphs, bboxs):
+    # Reference: every paragraph note deep-copied all texts and boxes.
+    new_para, new_bbox, change_ids = copy.deepcopy(paragraphs), copy.deepcopy(bboxs), []
+    for note in user_notes:
+        if note["target"] == "para":
+            prev_para, prev_bbox = new_para, new_bbox
+            new_para, new_bbox = copy.deepcopy(prev_para), copy.deepcopy(prev_bbox)
+            for para in note["content"]:
+                change_ids.append(para["para_id"])
+                new_bbox[para["para_id"]] = utils.organize_new_box(
+                    [prev_para[para["para_id"]]], [prev_bbox[para["para_id"]]], [para["text"]])[0]
+                new_para[para["para_id"]] = para["text"]
+        elif note["target"] == "all":
+            order = note["content"][0]["new_order"]
+            new_para = copy.deepcopy([new_para[i] for i in order])
+            new_bbox = copy.deepcopy([new_bbox[i] for i in order])
+    return new_para, new_bbox, change_ids
+
+
+def timed(fn):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--paragraphs", type=int, default=80)
+    parser.add_argument("--interval", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    paragraphs, bboxs, relations = make_document(args.paragraphs, rng)
+    notes = make_notes(args.notes, args.paragraphs, rng)
+    store = NoteSnapshotStore(interval=args.interval)
+    utils.note_snapshots = store
+
+    def current_relations(history, key=None):
+        return utils.execute_user_note_on_relations(history, copy.deepcopy(relations), snapshot_key=key)
+
+    def current_paragraphs(history, key=None):
+        return utils.execute_user_note_on_paragraphs(history, paragraphs, bboxs, snapshot_key=key)[:3]
+
+    print(f"{args.paragraphs} paragraphs, {len(notes)} notes, snapshot every {args.interval} notes")
+    for label, legacy, current in [
+        ("relations", lambda h: legacy_relations(h, copy.deepcopy(relations)), current_relations),
+        ("paragraphs", lambda h: legacy_paragraphs(h, paragraphs, bboxs), current_paragraphs),
+    ]:
+        expected, legacy_time = timed(lambda: legacy(notes))
+        full, full_time = timed(lambda: current(notes))
+        assert full == expected, f"{label}: copy-on-write replay diverged from the original"
+
+        # Annotator session: the previous request already replayed all but the last note.
+        current(notes[:-1], key="bench")
+        incremental, incremental_time = timed(lambda: current(notes, key="bench"))
+        assert incremental == expected, f"{label}: snapshot replay diverged from the original"
+
+        for name, elapsed in [("original replay", legacy_time), ("copy-on-write replay", full_time),
+                              ("snapshot + tail", incremental_time)]:
+            print(f"{label:>10} {name:>22}: {elapsed * 1e3:9.1f} ms")
+    print(f"snapshot hits {store.hits}, misses {store.misses}")
+
+
+if __name__ == "__main__":
+    main()
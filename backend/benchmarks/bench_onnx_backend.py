@@ -0,0 +1,107 @@
+"""
+CPU benchmark for the ONNX Runtime encoder backend of PolymerAnnotator on the
+shipped checkpoints: each encoder (NER, DocRE) reports its largest difference to
+the PyTorch module on padded random batches, then is timed for
+latency/throughput, and whole documents are annotated with both backends.
+Export parity itself is tested in tests/test_onnx_backend.py.
+
+Run from the backend directory (needs onnxruntime):
+    python -m benchmarks.bench_onnx_backend --documents 10
+"""
+import argparse
+import time
+
+import torch
+
+from annotators.polymer.annotator import PolymerAnnotator
+from annotators.polymer.utils.onnx_backend import onnx_encoder
+
+PARAGRAPH = ("Poly(methyl methacrylate) (PMMA) films were prepared by solution casting from toluene. "
+             "The glass transition temperature of PMMA was 105 C, measured by differential scanning calorimetry. "
+             "Adding 5 wt% silica nanoparticles raised the tensile strength of the composite to 62 MPa.")
+
+
+def random_batch(batch_size, max_len, vocab_size, generator):
+    lengths = torch.randint(max_len // 2, max_len + 1, (batch_size,), generator=generator)
+    lengths[0] = max_len
+    input_ids = torch.randint(1000, vocab_size, (batch_size, max_len), generator=generator)
+    attention_mask = (torch.arange(max_len)[None, :] < lengths[:, None]).float()
+    return input_ids * attention_mask.long(), attention_mask
+
+
+def check_parity(name, torch_encoder, ort_encoder, vocab_size, atol):
+    generator = torch.Generator().manual_seed(0)
+    with torch.inference_mode():
+        for max_len in (8, 64, 256):
+            input_ids, attention_mask = random_batch(4, max_len, vocab_size, generator)
+            expected = torch_encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                     output_attentions=ort_encoder.with_attention)
+            actual = ort_encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                 output_attentions=ort_encoder.with_attention)
+            mask = attention_mask.bool()
+            hidden_diff = (expected.last_hidden_state - actual.last_hidden_state)[mask].abs().max().item()
+            att_diff = ((expected.attentions[-1] - actual.attentions[-1]).abs().max().item()
+                        if ort_encoder.with_attention else 0.0)
+            print(f"{name} encoder, length {max_len:>3}: max |diff| hidden {hidden_diff:.2e}, attention {att_diff:.2e}"
+                  f"{'' if hidden_diff < atol and att_diff < atol else '  ABOVE --atol'}")
+
+
+def time_encoder(encoder, batches, repeats):
+    with torch.inference_mode():
+        encoder(input_ids=batches[0][0], attention_mask=batches[0][1])
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for input_ids, attention_mask in batches:
+                encoder(input_ids=input_ids, attention_mask=attention_mask)
+        elapsed = (time.perf_counter() - start) / repeats
+    tokens = sum(int(mask.sum()) for _, mask in batches)
+    return elapsed / len(batches) * 1000, tokens / elapsed
+
+
+def time_documents(annotator, documents, paragraphs):
+    outputs, timings = [], []
+    for _ in range(documents):
+        start = time.perf_counter()
+        outputs.append(annotator._annotate([PARAGRAPH] * paragraphs))
+        timings.append(time.perf_counter() - start)
+    return outputs, sum(timings) / len(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    annotator = PolymerAnnotator(device="cpu", backend="torch")
+    annotator.check_load_model()
+    ner, re_model = annotator.ner_model, annotator.re_model
+    encoders = {
+        "ner": (ner.bert, onnx_encoder(ner.bert, "ner", annotator.ner_config.save_path,
+                                       num_hidden_states=4 if annotator.ner_config.use_bert_last_4_layers else 0,
+                                       with_attention=annotator.share_encoder)),
+        "docre": (re_model.model, onnx_encoder(re_model.model, "docre", annotator.re_args.load_path,
+                                               with_attention=True)),
+    }
+
+    generator = torch.Generator().manual_seed(1)
+    for name, (torch_encoder, ort_encoder) in encoders.items():
+        vocab_size = torch_encoder.config.vocab_size
+        check_parity(name, torch_encoder, ort_encoder, vocab_size, args.atol)
+        batches = [random_batch(8, max_len, vocab_size, generator) for max_len in (32, 64, 128, 256)]
+        for label, encoder in [("torch", torch_encoder), ("onnxruntime", ort_encoder)]:
+            latency, throughput = time_encoder(encoder, batches, args.repeats)
+            print(f"{name:>6} {label:>12}: {latency:8.1f} ms/batch  {throughput:8.0f} tokens/s")
+
+    torch_outputs, torch_ms = time_documents(annotator, args.documents, args.paragraphs)
+    ner.bert, re_model.model = encoders["ner"][1], encoders["docre"][1]
+    ort_outputs, ort_ms = time_documents(annotator, args.documents, args.paragraphs)
+    same = sum(a == b for a, b in zip(torch_outputs, ort_outputs))
+    print(f"documents with identical annotations: {same}/{args.documents}")
+    print(f"per document: torch {torch_ms:.1f} ms, onnxruntime {ort_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
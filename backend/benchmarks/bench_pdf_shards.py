@@ -0,0 +1,48 @@
+"""
+Wall-clock scaling of processing_pdf_using_mineru_and_pymupdf with page shards
+parsed in a process pool, for several worker counts against the serial parse.
+Each pool is warmed up first so MinerU model loading is not timed. Reports how
+many paragraphs match the serial output (MinerU analyses each shard on its
+own, so layout decisions near shard boundaries can differ).
+
+Run from the backend directory (needs MinerU and its models):
+    python -m benchmarks.bench_pdf_shards --pdf paper.pdf --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+import fitz
+
+from pdf_processing import processing_pdf_using_mineru_and_pymupdf
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--pages-per-shard", type=int, default=8)
+    args = parser.parse_args()
+
+    with fitz.open(args.pdf) as document:
+        num_pages = len(document)
+    print(f"{args.pdf}: {num_pages} pages, {args.pages_per_shard} pages per shard, {os.cpu_count()} cores")
+
+    serial_texts, _, _ = processing_pdf_using_mineru_and_pymupdf(args.pdf, workers=1)
+    serial_time = None
+    for workers in sorted(set(args.workers)):
+        # warm-up: spawns the pool (or loads the models in this process for workers=1)
+        processing_pdf_using_mineru_and_pymupdf(args.pdf, workers=workers, pages_per_shard=args.pages_per_shard)
+        start = time.perf_counter()
+        texts, _, _ = processing_pdf_using_mineru_and_pymupdf(args.pdf, workers=workers,
+                                                              pages_per_shard=args.pages_per_shard)
+        elapsed = time.perf_counter() - start
+        serial_time = serial_time or (elapsed if workers == 1 else None)
+        speedup = f"  speedup {serial_time / elapsed:4.1f}x" if serial_time else ""
+        same = len(set(texts) & set(serial_texts))
+        print(f"{workers:>3} workers: {elapsed:7.1f} s  {len(texts)} paragraphs, "
+              f"{same}/{len(serial_texts)} identical to serial{speedup}")
+
+
+if __name__ == "__main__":
+    main()
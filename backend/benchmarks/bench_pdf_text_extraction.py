@@ -0,0 +1,157 @@
+"""
+Parse-time benchmark and equivalence check for
+extract_text_n_bbox_using_pymupdf_from_mineru_result: the original per-page scan
+of every paragraph with up to six clipped RAWDICT extractions each, versus one
+extraction per page and a y-sorted character index. para_data must be identical.
+
+Paragraph rects come from PyMuPDF's own text blocks (standing in for MinerU's
+layout), plus jittered and title-sized (shorter than the padding loop can
+shrink) copies of them, so MinerU does not need to run its models. Without
+--pdf a 50-page PDF is generated. The equivalence is also tested in
+tests/test_pdf_text_extraction.py.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pdf_text_extraction --pages 50
+    python -m benchmarks.bench_pdf_text_extraction --pdf paper.pdf
+"""
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+import fitz
+import pymupdf
+
+from pdf_processing import (check_ignore_get_text, collect_text_n_bbox, merge_bounding_boxes,
+                            extract_text_n_bbox_using_pymupdf_from_mineru_result)
+
+SENTENCE = ("Poly(methyl methacrylate) films were cast from toluene and annealed at 120 C; "
+            "the glass transition temperature rose with the silica content of the com- posite. ")
+
+
+def legacy_extract(file_path, para_data):
+    # Reference: the implementation before the page-indexed rewrite (debug prints removed).
+    document = fitz.open(file_path)
+    max_x2=0
+    min_x1=10000000
+    for page_number in range(len(document)):
+        page_data = document.load_page(page_number)
+        for para in para_data:
+            if check_ignore_get_text(para["type"]):
+                para["text"] = "@"
+                x1,y1,x2,y2 = para['rect']
+                para["bbox"] = [{"x1": x1, "y1": y1, "x2": x2, "y2": y2, "width": para["width"],
+                                 "height": para["height"], "pageNumber": para["page_number"][0]}]
+                para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
+                continue
+            if para["page_number"][0] == (page_number+1):
+                threshhold = 5
+                x1,y1,x2,y2 = para['rect']
+                bounding_box = {'x1': 0, 'y1': 0, 'x2': 0, 'y2': 0}
+                padding =0
+                while (abs(bounding_box["y1"] - y1) > threshhold or abs(bounding_box["y2"] - y2) > threshhold) and (padding <= 5):
+                    new_y2 = y2-padding
+                    new_y1 = y1+padding
+                    padding += 1
+                    rect = pymupdf.Rect(x1,new_y1,x2,new_y2)
+                    text_page = page_data.get_textpage(clip=rect)
+                    text = text_page.extractRAWDICT()
+                    block_texts_data = ""
+                    block_bb_data = []
+                    for block in text['blocks']:
+                        if 'lines' in block:
+                            block_text, char_bounding_boxes = collect_text_n_bbox(block,page_data,page_number+1)
+                            block_texts_data+=block_text
+                            block_bb_data.extend(char_bounding_boxes)
+                    if len(block_bb_data) == 0 :
+                        continue
+                    bounding_box = merge_bounding_boxes(block_bb_data)
+                max_x2=bounding_box.get("x2") if bounding_box.get("x2") > max_x2 else max_x2
+                min_x1=bounding_box.get("x1") if bounding_box.get("x1") < min_x1 else min_x1
+                if len(block_bb_data) != 0:
+                    para["text"] = block_texts_data
+                    para["bbox"] = block_bb_data
+                    para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
+                else:
+                    para["text"] = "@"
+                    x1,y1,x2,y2 = para['rect']
+                    para["type"] = "discarded"
+                    para["bbox"] = [{"x1": x1, "y1": y1, "x2": x2, "y2": y2, "width": para["width"],
+                                     "height": para["height"], "pageNumber": para["page_number"][0]}]
+                    para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
+    return para_data, min_x1, max_x2
+
+
+def generate_pdf(path, pages):
+    # two columns of justified paragraphs per page, like a journal article
+    document = fitz.open()
+    for _ in range(pages):
+        page = document.new_page()
+        for column in range(2):
+            x0 = 50 + column * 260
+            y = 60
+            while y < 720:
+                height = 90
+                # insert_textbox writes nothing and returns a negative value when the text overflows
+                spare = page.insert_textbox(fitz.Rect(x0, y, x0 + 240, y + height), SENTENCE * 2, fontsize=9, align=3)
+                assert spare >= 0, spare
+                y += height + 12
+    document.save(path)
+
+
+def layout_from_blocks(file_path):
+    para_data = []
+    for page_number, page in enumerate(fitz.open(file_path)):
+        for index, block in enumerate(page.get_text("blocks")):
+            para_data.append({"type": "text", "width": page.rect.width, "height": page.rect.height,
+                              "rect": [round(v) for v in block[:4]], "page_number": [page_number + 1],
+                              "index": index})
+    return para_data
+
+
+def perturbed_layout(para_data, rng):
+    # MinerU rects are not glyph-tight: shift each edge a little, and add
+    # title-sized rects that padding can invert (y1 + pad > y2 - pad)
+    perturbed = []
+    for para in para_data:
+        x1, y1, x2, y2 = para["rect"]
+        jittered = [x1 + rng.uniform(-3, 3), y1 + rng.uniform(-3, 3), x2 + rng.uniform(-3, 3), y2 + rng.uniform(-3, 3)]
+        top = rng.uniform(y1, max(y1, y2 - 10))
+        short = [x1, top, x2, top + rng.uniform(2, 10)]
+        for rect in (jittered, short):
+            perturbed.append(dict(para, rect=[round(v, 2) for v in rect], index=len(para_data) + len(perturbed)))
+    return para_data + perturbed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    path = args.pdf
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.pdf")
+        generate_pdf(path, args.pages)
+    para_data = layout_from_blocks(path)
+    assert len(para_data) > 0, "no text blocks in {}".format(path)
+    para_data = perturbed_layout(para_data, random.Random(0))
+
+    start = time.perf_counter()
+    expected = legacy_extract(path, copy.deepcopy(para_data))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = extract_text_n_bbox_using_pymupdf_from_mineru_result(path, copy.deepcopy(para_data))
+    indexed_time = time.perf_counter() - start
+
+    assert result == expected
+    print(f"{len(fitz.open(path))} pages, {len(para_data)} paragraphs: para_data identical")
+    for label, elapsed in [("clipped re-extraction", legacy_time), ("page char index", indexed_time)]:
+        print(f"{label:>22}: {elapsed:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
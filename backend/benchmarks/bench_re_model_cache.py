@@ -0,0 +1,80 @@
+"""
+Times N consecutive PolymerAnnotator._predict_relation calls with the cached
+DocRE model against the previous behaviour: the DocREModel re-assembled around
+the already loaded base encoder and the checkpoint re-read with
+load_state_dict before every call. The base model, tokenizer and config stay
+loaded in both modes, as they did before the model was cached. Both modes use
+the PyTorch encoder without quantization so they run the same weights.
+
+Run from the backend directory:
+    python -m benchmarks.bench_re_model_cache --runs 10
+"""
+import argparse
+import time
+
+import torch
+
+from annotators.polymer.annotator import PolymerAnnotator
+from annotators.polymer.models.RE_model import DocREModel
+
+
+def build_sample(num_paragraphs=4, num_entities=12):
+    re_input, ner_data = [], []
+    for p in range(num_paragraphs):
+        tokens, entities, vertex_set = [], [], []
+        char_pos = 0
+        for e in range(num_entities):
+            for word in ["the", "polymer", f"P{e}", "shows", "a", "value", "of"]:
+                tokens.append(word)
+            start = len(tokens) - 5
+            word = tokens[start]
+            entities.append([f"T{e + 1}", "POLYMER", [[char_pos, char_pos + len(word)]], word])
+            vertex_set.append([{"name": word, "sent_id": 0, "pos": [start, start + 1],
+                                "type": "POLYMER", "brat_entity_mention_id": e + 1}])
+            char_pos += len(word) + 1
+        re_input.append({"title": str(p), "sents": [tokens], "vertexSet": vertex_set, "labels": []})
+        ner_data.append({"text": " ".join(tokens), "entities": entities})
+    return re_input, ner_data
+
+
+def rebuild_re_model(annotator):
+    # what _predict_relation did per call before the model was cached
+    args = annotator.re_args
+    model = DocREModel(annotator.re_config, annotator.re_base_model, num_labels=args.num_labels).to(args.device)
+    model.load_state_dict(torch.load(args.load_path, map_location=args.device), strict=False)
+    return model.eval()
+
+
+def time_calls(annotator, runs, rebuild_each_call):
+    cached_model = annotator.re_model
+    timings = []
+    for _ in range(runs):
+        re_input, ner_data = build_sample()
+        start = time.perf_counter()
+        if rebuild_each_call:
+            annotator.re_model = rebuild_re_model(annotator)
+        annotator._predict_relation(re_input, ner_data)
+        timings.append(time.perf_counter() - start)
+    annotator.re_model = cached_model
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    annotator = PolymerAnnotator(quantize=False, backend="torch")
+    annotator.check_load_model()
+    # warm-up so CUDA/kernel initialisation is not attributed to either mode
+    annotator._predict_relation(*build_sample())
+
+    for label, rebuild_each_call in [("rebuild per call", True), ("cached model", False)]:
+        timings = time_calls(annotator, args.runs, rebuild_each_call)
+        total = sum(timings)
+        print(f"{label:>18}: total {total:.3f}s  mean {total / len(timings) * 1000:.1f} ms/call "
+              f"over {len(timings)} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark and equivalence check for the DocRE feature builder
+(annotators/polymer/dependencies.read_docred_real): the original list-based
+version (tokenizer.tokenize per word, list membership per token and per
+entity pair) versus batched word pieces, hashed lookups and array-built labels. The pickled features must be byte-identical.
+
+The tokenizer defaults to the one of the RE config (model_name_or_path).
+
+Run from the backend directory:
+    python -m benchmarks.bench_read_docred --entities 150
+"""
+import argparse
+import pickle
+import random
+import time
+
+from annotators.polymer import dependencies
+from annotators.polymer.dependencies import docred_rel2id, read_docred_real
+from annotators.polymer.utils.tokenizer_utils import get_tokenizer
+
+WORDS = ["the", "glass", "transition", "temperature", "of", "was", "measured", "by", "DSC", "and", "found",
+         "to", "be", "higher", "than", "for", "films", "cast", "from", "solution", "at", "room", "with",
+         "increasing", "molecular", "weight", "poly(methyl", "methacrylate)", "PMMA", "polystyrene", "PS",
+         "tensile", "strength", "MPa", "°C", "wt%", "blend", "copolymer", "nanocomposite", "annealed"]
+TYPES = ["POLYMER", "PROP_NAME", "PROP_VALUE", "CONDITION", "CHAR_METHOD", "MONOMER", "MATERIAL_AMOUNT"]
+
+
+def legacy_read_docred_real(data, tokenizer, max_seq_length=1024):
+    # Reference: read_docred_real before hashed lookups and batched word pieces (prints dropped).
+    features = []
+    for sample in data:
+        sents = []
+        sent_map = []
+        entities = sample['vertexSet']
+        entity_start, entity_end = [], []
+        for entity in entities:
+            for mention in entity:
+                sent_id = mention["sent_id"]
+                pos = mention["pos"]
+                entity_start.append((sent_id, pos[0],))
+                entity_end.append((sent_id, pos[1] - 1,))
+        for i_s, sent in enumerate(sample['sents']):
+            new_map = {}
+            for i_t, token in enumerate(sent):
+                tokens_wordpiece = tokenizer.tokenize(token)
+                if (i_s, i_t) in entity_start:
+                    tokens_wordpiece = ["*"] + tokens_wordpiece
+                if (i_s, i_t) in entity_end:
+                    tokens_wordpiece = tokens_wordpiece + ["*"]
+                new_map[i_t] = len(sents)
+                sents.extend(tokens_wordpiece)
+            new_map[i_t + 1] = len(sents)
+            sent_map.append(new_map)
+
+        train_triple = {}
+        if "labels" in sample:
+            for label in sample['labels']:
+                evidence = label['evidence']
+                r = int(docred_rel2id[label['r']])
+                if (label['h'], label['t']) not in train_triple:
+                    train_triple[(label['h'], label['t'])] = [
+                        {'relations': r, 'evidence': evidence}]
+                else:
+                    train_triple[(label['h'], label['t'])].append(
+                        {'relations': r, 'evidence': evidence})
+
+        entity_pos = []
+        for e in entities:
+            entity_pos.append([])
+            for m in e:
+                start = sent_map[m["sent_id"]][m["pos"][0]]
+                end = sent_map[m["sent_id"]][m["pos"][1]]
+                entity_pos[-1].append((start, end,))
+
+        relations, hts = [], []
+        for h, t in train_triple.keys():
+            relation = [0] * len(docred_rel2id)
+            for mention in train_triple[h, t]:
+                relation[mention["relations"]] = 1
+            relations.append(relation)
+            hts.append([h, t])
+
+        for h in range(len(entities)):
+            for t in range(len(entities)):
+                if h != t and [h, t] not in hts:
+                    relation = [1] + [0] * (len(docred_rel2id) - 1)
+                    relations.append(relation)
+                    hts.append([h, t])
+        assert len(relations) == len(entities) * (len(entities) - 1)
+
+        sents = sents[:max_seq_length - 2]
+        input_ids = tokenizer.convert_tokens_to_ids(sents)
+        input_ids = tokenizer.build_inputs_with_special_tokens(input_ids)
+        features.append({'input_ids': input_ids,
+                         'entity_pos': entity_pos,
+                         'labels': relations,
+                         'hts': hts,
+                         'title': sample['title'],
+                         'entities': entities,
+                         })
+    return features
+
+
+def make_paragraph(num_entities, rng, title="0", with_labels=False):
+    # one RE input paragraph: sentences of ~25 words, entities of 1-3 words, some repeated (several mentions)
+    sents, vertex_set = [], []
+    names = {}
+    while len(vertex_set) < num_entities:
+        sent = [rng.choice(WORDS) for _ in range(25)]
+        for _ in range(rng.randrange(3, 7)):
+            if len(vertex_set) >= num_entities:
+                break
+            length = rng.randrange(1, 4)
+            start = rng.randrange(0, len(sent) - length)
+            name, entity_type = " ".join(sent[start:start + length]), rng.choice(TYPES)
+            mention = {"name": name, "sent_id": len(sents), "pos": [start, start + length],
+                       "type": entity_type, "brat_entity_mention_id": len(vertex_set) + 1}
+            key = (name, entity_type)
+            if key in names:
+                vertex_set[names[key]].append(mention)
+            else:
+                names[key] = len(vertex_set)
+                vertex_set.append([mention])
+        sents.append(sent)
+    sample = {"title": title, "sents": sents, "vertexSet": vertex_set}
+    if with_labels:
+        relations = sorted(docred_rel2id, key=docred_rel2id.get)[1:]
+        sample["labels"] = [{"h": rng.randrange(num_entities), "t": rng.randrange(num_entities),
+                             "r": rng.choice(relations), "evidence": []} for _ in range(num_entities // 2)]
+        sample["labels"] = [label for label in sample["labels"] if label["h"] != label["t"]]
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entities", type=int, default=150)
+    parser.add_argument("--tokenizer", default=None, help="defaults to model_name_or_path of the RE config")
+    args = parser.parse_args()
+
+    if args.tokenizer is None:
+        from annotators.polymer.annotator import RE_CONFIG_PATH
+        from annotators.polymer.models.RE_model import Config as RE_Config
+        args.tokenizer = RE_Config(RE_CONFIG_PATH).model_name_or_path
+    tokenizer = get_tokenizer(args.tokenizer)
+    dependencies.tqdm = lambda iterable, **kwargs: iterable
+    rng = random.Random(0)
+    data = [make_paragraph(args.entities, rng),
+            make_paragraph(args.entities // 3, rng, title="1", with_labels=True),
+            make_paragraph(1, rng, title="2")]
+
+    start = time.perf_counter()
+    expected = legacy_read_docred_real(data, tokenizer)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = read_docred_real(data, tokenizer)
+    new_time = time.perf_counter() - start
+
+    for feature in features:
+        del feature["pruned_pairs"]
+    assert pickle.dumps(features) == pickle.dumps(expected)
+    print(f"{args.entities} entities, {len(expected[0]['hts'])} pairs, {len(expected[0]['input_ids'])} word pieces: "
+          f"features byte-identical")
+    print(f"original: {legacy_time * 1e3:9.1f} ms   hashed: {new_time * 1e3:8.1f} ms   ({legacy_time / new_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
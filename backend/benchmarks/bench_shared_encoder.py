@@ -0,0 +1,91 @@
+"""
+PolymerAnnotator._annotate with the DocRE pass reusing the NER encoder outputs
+(share_encoder) against re-encoding every paragraph: per-document latency and
+how far the predicted relations move.
+
+Shared encodings are an approximation (entity markers take the embedding of
+the mention's first/last piece and attention stays within each sentence), so
+the relations of both modes are compared per document: agreement is the F1 of
+the shared-mode relations against the re-encoded ones, matched on
+(type, head, tail), plus the share of documents with identical relations.
+
+Sharing only turns on when the NER and DocRE configs load the same fine-tuned
+encoder (PolymerAnnotator.match_encoders); with the shipped, separately
+fine-tuned checkpoints it never does, and the script stops there.
+
+Run from the backend directory:
+    python -m benchmarks.bench_shared_encoder --documents 20
+"""
+import argparse
+import json
+import time
+
+from annotators.polymer.annotator import PolymerAnnotator
+
+PARAGRAPHS = [
+    "Poly(methyl methacrylate) (PMMA) films were prepared by solution casting from toluene. "
+    "The glass transition temperature of PMMA was 105 C, measured by differential scanning calorimetry. "
+    "Adding 5 wt% silica nanoparticles raised the tensile strength of the composite to 62 MPa.",
+    "Polystyrene (PS) with a molecular weight of 200 kg/mol was synthesized by anionic polymerization. "
+    "Its Young's modulus reached 3.2 GPa at 25 C, while the elongation at break stayed below 3 %.",
+    "The polyimide membrane showed a CO2 permeability of 12 Barrer at 35 C and 2 bar. "
+    "After thermal annealing at 300 C for 2 h, the CO2/CH4 selectivity increased from 28 to 41.",
+    "Nylon-6 fibers were melt spun at 260 C. The crystallinity measured by XRD was 38 %, "
+    "and the melting temperature determined by DSC was 221 C.",
+]
+
+
+def relation_set(paragraph_output):
+    return {(relation[1], json.dumps(relation[2])) for relation in paragraph_output.get("relations", [])}
+
+
+def run(annotator, documents, paragraphs_per_document):
+    outputs, timings = [], []
+    for d in range(documents):
+        paragraphs = [PARAGRAPHS[(d + p) % len(PARAGRAPHS)] for p in range(paragraphs_per_document)]
+        start = time.perf_counter()
+        model_output, _ = annotator._annotate(paragraphs)
+        timings.append(time.perf_counter() - start)
+        outputs.append([relation_set(paragraph) for paragraph in model_output])
+    return outputs, timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    args = parser.parse_args()
+
+    annotator = PolymerAnnotator(share_encoder=True)
+    annotator.check_load_model()
+    if not annotator.encoders_shared():
+        print("NER and DocRE encoders differ: sharing cannot turn on with these checkpoints")
+        return
+    # warm-up so kernel initialisation is not attributed to either mode
+    annotator._annotate(PARAGRAPHS)
+
+    results = {}
+    for label, share in [("re-encode", False), ("shared encoder", True)]:
+        annotator.share_encoder = share
+        results[label] = run(annotator, args.documents, args.paragraphs)
+    for label, (_, timings) in results.items():
+        print(f"{label:>15}: {sum(timings) / len(timings) * 1000:.1f} ms/document over {len(timings)} documents")
+
+    reference, shared = results["re-encode"][0], results["shared encoder"][0]
+    common = predicted = expected = identical = 0
+    for ref_doc, shared_doc in zip(reference, shared):
+        identical += ref_doc == shared_doc
+        for ref, new in zip(ref_doc, shared_doc):
+            common += len(ref & new)
+            predicted += len(new)
+            expected += len(ref)
+    precision = common / predicted if predicted else 1.0
+    recall = common / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"relations shared vs re-encoded: precision {precision:.3f}, recall {recall:.3f}, F1 {f1:.3f} "
+          f"({expected} re-encoded relations)")
+    print(f"documents with identical relations: {identical}/{len(reference)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,7 @@ from crud.psql import document as document_crud
 
 from utils import utils
 from utils.annotator_registry import HotAnnotatorRegistry
+from utils.inference_cache import create_inference_cache, annotate_with_cache
 from database import get_dev_db as get_db
 from annotators.polymer.annotator import PolymerAnnotator
 
@@ -39,6 +40,8 @@ import importlib
 
 annotator_config_path = "configs/annotators.yaml"
 annotator_registry = HotAnnotatorRegistry(annotator_config_path)
+# per-paragraph NER/RE outputs shared by all workers; DOCORA_INFERENCE_CACHE=off disables it
+inference_cache = create_inference_cache()
 
 def send_email(to_email,user ,document):
     # Set up the SMTP server
@@ -118,7 +121,10 @@ def process_pdf(file_path,doc_id,db,domain,new_model=False):
     # else:
     #     model_output, ner_model_output = process_text(all_pages_text_data,ner_model,ner_logger,ner_config,re_tokenizer,re_base_model, re_config,re_args)
     annotator = annotator_registry.get_annotator(domain)
-    model_output, ner_model_output = annotator._annotate(all_pages_text_data)
+    print("annotator pool stats:", annotator_registry.stats())
+    model_output, ner_model_output = annotate_with_cache(annotator, domain, all_pages_text_data, inference_cache)
+    if inference_cache is not None:
+        print("inference cache stats:", inference_cache.stats())
     # Save data before adding event extraction
     current_doc.set_paragraphs(para_data)
     current_doc.set_relations(model_output)
@@ -648,14 +654,15 @@ def re_run(update_id, user_id, document_id, run_ner, use_new_ner_model=False, us
         if run_ner:
             # ner_model_output = inference(cur_ner_model, cur_ner_logger,cur_ner_config,convert_to_NER_model_input_format(paragraphs))
             # # cur_entities = utils.execute_user_note_on_entities(user_notes,ner_model_output)
-            cur_entities = annotator._predict_entities(paragraphs)
+            # NER then RE on the stored paragraphs is exactly _annotate, so unchanged paragraphs come from the cache
+            model_output, cur_entities = annotate_with_cache(annotator, domain, paragraphs, inference_cache)
             # cur_entities = ner_model_output
         else:
+            # RE over the user's edited entities: the input is not the paragraph text, so it is not cacheable
             cur_entities = update.get_entities()
-
-        re_model_input = convert_to_RE_model_input_format(cur_entities)
-        # model_output = predict_re(cur_re_args, cur_re_tokenizer, cur_re_base_model,cur_re_config,re_model_input, cur_entities)
-        model_output = annotator._predict_relation(re_model_input,cur_entities)
+            re_model_input = convert_to_RE_model_input_format(cur_entities)
+            # model_output = predict_re(cur_re_args, cur_re_tokenizer, cur_re_base_model,cur_re_config,re_model_input, cur_entities)
+            model_output = annotator._predict_relation(re_model_input,cur_entities)
         # cur_relations = utils.execute_user_note_on_relations(user_notes,model_output)
 
         new_para, new_bbox, cur_entities, cur_relations, change_ids, para_data = utils.execute_user_note_on_all_data(user_notes, paragraphs, old_bboxs, cur_entities, model_output,para_data=para_data)
@@ -708,7 +715,13 @@ def re_run_for_changed_para(update_id, user_id, document_id):
         info_obj = document.get_infor()
         domain = info_obj.get("domain","polymer")
         annotator = annotator_registry.get_annotator(domain)
-        new_model_output, new_ner = annotator._annotate(changed_para)
+        if getattr(annotator, "paragraph_local", True):
+            new_model_output, new_ner = annotate_with_cache(annotator, domain, changed_para, inference_cache)
+        else:
+            # document-level annotators need the whole document to annotate the edited paragraphs
+            all_model_output, all_ner = annotator._annotate(new_para)
+            new_model_output = [all_model_output[index] for index in changed_ids]
+            new_ner = [all_ner[index] for index in changed_ids]
 
         for id,index in enumerate(changed_ids):
             old_entity[index] = new_ner[id]
@@ -1,23 +1,24 @@
 import json
 from config import DEBUG, nlp
 from utils import utils
-def convert_to_NER_model_input_format(paragraphs):
+from utils.tokenization import create_backend
+from utils.char_alignment import character_index_map
+
+# Batched, cached CoreNLP tokenization by default; see utils/tokenization.py
+tokenizer_backend = create_backend(nlp)
+
+def convert_to_NER_model_input_format(paragraphs, backend=None):
+    backend = backend or tokenizer_backend
     json_list = []
     counters = []
-    for idx, paragraph_text in enumerate(paragraphs):
-        output = nlp.annotate(paragraph_text, properties={
-            'annotators': 'tokenize',
-            'outputFormat': 'json'
-        })
+    tokenized_paragraphs = backend.tokenize(paragraphs)
+    for idx, sentences in enumerate(tokenized_paragraphs):
         if DEBUG:
-            print(output)
-        
-        if type(output) == str:
-            output = json.loads(output)
+            print(sentences)
         
         sent_id = 0
         
-        for sentence in output['sentences']:
+        for sentence in sentences:
             sent_id += 1
             json_item = {}
             json_item_tokens = []
@@ -41,9 +42,11 @@ def convert_to_NER_model_input_format(paragraphs):
     return json_list
 
 
-def convert_to_RE_model_input_format(ner_output_paragraphs):
+def convert_to_RE_model_input_format(ner_output_paragraphs, backend=None):
+    backend = backend or tokenizer_backend
     count_multi_span = 0
     json_list = []
+    tokenized_paragraphs = backend.tokenize([paragraph["text"] for paragraph in ner_output_paragraphs])
     for idx, paragraph in enumerate(ner_output_paragraphs):
         entities = []
         for entity in paragraph["entities"]:
@@ -59,20 +62,12 @@ def convert_to_RE_model_input_format(ner_output_paragraphs):
                 ent['word'] = entity_text
                 entities.append(ent)
 
-        output = nlp.annotate(paragraph["text"], properties={
-            'annotators': 'tokenize',
-            'outputFormat': 'json'
-        })
-        
-        if type(output) == str:
-            output = json.loads(output)
-    
         json_item = {}
         json_item_sents = []
         json_item_vertexSet = {}
 
         sent_id = -1
-        for sentence in output['sentences']:
+        for sentence in tokenized_paragraphs[idx]:
             sent_id += 1
             json_item_tokens = []
             text = []
@@ -174,53 +169,21 @@ def convert_to_RE_model_input_format(ner_output_paragraphs):
 #     return mapping_dict
 
 def build_character_mapping(model_output_text, original_text, debug=False):
-    import difflib
-
+    """
+    Index map from model_output_text characters to original_text characters
+    (NumPy int64 array, see utils.char_alignment.character_index_map).
+    """
     if isinstance(original_text, list):
         original_text = ''.join(original_text)
 
-    s = difflib.SequenceMatcher(None, model_output_text, original_text)
-    mapping_dict = {}
-    o_idx = -1  # last known index in original_text
-
-    for tag, i1, i2, j1, j2 in s.get_opcodes():
-        if debug:
-            print(f"tag: {tag}, i1: {i1}, i2: {i2}, j1: {j1}, j2: {j2}")
-        if tag == 'equal':
-            for m_pos, o_pos in zip(range(i1, i2), range(j1, j2)):
-                mapping_dict[m_pos] = o_pos
-                o_idx = o_pos
-        elif tag == 'replace':
-            for m_pos, o_pos in zip(range(i1, i2), range(j1, j2)):
-                mapping_dict[m_pos] = o_pos
-                o_idx = o_pos
-            len_m = i2 - i1
-            len_o = j2 - j1
-            if len_m > len_o:
-                for m_pos in range(i1 + len_o, i2):
-                    mapping_dict[m_pos] = o_idx
-        elif tag == 'insert':
-            # Inserted characters in original_text: no change to model_output
-            pass  # No m_pos to map
-        elif tag == 'delete':
-            for m_pos in range(i1, i2):
-                mapping_dict[m_pos] = o_idx
-
-    # Ensure all model_output_text indices are mapped
-    for idx in range(len(model_output_text)):
-        if idx not in mapping_dict:
-            mapping_dict[idx] = o_idx
+    mapping = character_index_map(model_output_text, original_text, debug=debug)
 
     if debug:
-        print("mapping dict:", mapping_dict)
+        print("mapping:", mapping)
         print("model output text:", model_output_text)
         print("original_text:", original_text)
-        character_mapping_dict = {}
-        # for key in mapping_dict:
-        #     character_mapping_dict["{}_{}".format(key,model_output_text[key])]="{}_{}".format(mapping_dict[key],original_text[mapping_dict[key]])
-        # print(character_mapping_dict)
 
-    return mapping_dict
+    return mapping
 
 
 def normalize_org_text_and_bbox(model_output_item, bbox_item, org_text_item):
@@ -244,10 +207,10 @@ def brat_output_text_bb_convert(brat_output_text, bbox, character_mapping_dict,
     output = []
     if len(bbox)==0:
         return output
-    for char_idx, char in enumerate(brat_output_text):
-        # if debug:
-        #     print(char_idx)
-        output.append(bbox[character_mapping_dict[char_idx]])
+    if len(brat_output_text) > len(character_mapping_dict):
+        # the map covers every character of the text it was built from
+        raise KeyError(len(character_mapping_dict))
+    output = [bbox[o_pos] for o_pos in character_mapping_dict[:len(brat_output_text)]]
     if debug:
         print("len brat_output_text", len(brat_output_text))
         print("len bbox ",len(bbox))
@@ -359,7 +322,8 @@ def convert_to_output_v2(model_output, bbox, org_texts, para_data=None,full_data
             blank_id.append(para_id)
             continue
         
-        character_mapping_dict = build_character_mapping(para_output["text"], nomalized_org_text,debug=False)
+        # plain ints for the per-entity span lookups below
+        character_mapping_dict = build_character_mapping(para_output["text"], nomalized_org_text,debug=False).tolist()
 
         nomalized_org_texts.append(para_output["text"])
         debug=False
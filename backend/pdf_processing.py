@@ -6,9 +6,17 @@ from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedData
 from magic_pdf.data.dataset import PymuDocDataset
 from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
 from magic_pdf.config.enums import SupportedPdfParseMethod
+import bisect
 import json
+import multiprocessing
 import os
 import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_WORKERS_ENV = "DOCORA_PDF_WORKERS"
+PDF_PAGES_PER_SHARD_ENV = "DOCORA_PDF_PAGES_PER_SHARD"
 
 # def convert_pdf_to_text_v2(path, min_length):
 #     file = Reader()
@@ -176,8 +184,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
                                             "y1": bbox[1],
                                             "x2": bbox[2],
                                             "y2": bbox[3],
-                                            "width": page.rect.width,
-                                            "height": page.rect.height,
+                                            "width": page_width,
+                                            "height": page_height,
                                             "pageNumber": page_number
                                         })
                                     else:
@@ -189,8 +197,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
                                             "y1": last_char_bbox[1],
                                             "x2": last_char_bbox[2],
                                             "y2": last_char_bbox[3],
-                                            "width": page.rect.width,
-                                            "height": page.rect.height,
+                                            "width": page_width,
+                                            "height": page_height,
                                             "pageNumber": page_number
                                         }
                                         char_bounding_boxes.append(space_bbox)
@@ -200,8 +208,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
                                             "y1": bbox[1],
                                             "x2": bbox[2],
                                             "y2": bbox[3],
-                                            "width": page.rect.width,
-                                            "height": page.rect.height,
+                                            "width": page_width,
+                                            "height": page_height,
                                             "pageNumber": page_number
                                         })
                                 else:
@@ -212,8 +220,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
                                         "y1": bbox[1],
                                         "x2": bbox[2],
                                         "y2": bbox[3],
-                                        "width": page.rect.width,
-                                        "height": page.rect.height,
+                                        "width": page_width,
+                                        "height": page_height,
                                         "pageNumber": page_number
                                     })
                             else:
@@ -224,8 +232,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
                                     "y1": bbox[1],
                                     "x2": bbox[2],
                                     "y2": bbox[3],
-                                    "width": page.rect.width,
-                                    "height": page.rect.height,
+                                    "width": page_width,
+                                    "height": page_height,
                                     "pageNumber": page_number
                                 })
 
@@ -272,6 +280,8 @@ def convert_pdf_to_text_and_bounding_boxes(path):
 
 
 def collect_text_n_bbox(block,page,page_number):
+    # page.rect builds a new Rect on every access; read it once per block, not per character
+    page_width, page_height = page.rect.width, page.rect.height
     if 'lines' in block:
         block_text = ""
         char_bounding_boxes = []
@@ -298,8 +308,8 @@ def collect_text_n_bbox(block,page,page_number):
                                     "y1": bbox[1],
                                     "x2": bbox[2],
                                     "y2": bbox[3],
-                                    "width": page.rect.width,
-                                    "height": page.rect.height,
+                                    "width": page_width,
+                                    "height": page_height,
                                     "pageNumber": page_number
                                 })
                             else:
@@ -311,8 +321,8 @@ def collect_text_n_bbox(block,page,page_number):
                                     "y1": last_char_bbox[1],
                                     "x2": last_char_bbox[2],
                                     "y2": last_char_bbox[3],
-                                    "width": page.rect.width,
-                                    "height": page.rect.height,
+                                    "width": page_width,
+                                    "height": page_height,
                                     "pageNumber": page_number
                                 }
                                 char_bounding_boxes.append(space_bbox)
@@ -322,8 +332,8 @@ def collect_text_n_bbox(block,page,page_number):
                                     "y1": bbox[1],
                                     "x2": bbox[2],
                                     "y2": bbox[3],
-                                    "width": page.rect.width,
-                                    "height": page.rect.height,
+                                    "width": page_width,
+                                    "height": page_height,
                                     "pageNumber": page_number
                                 })
                         else:
@@ -334,8 +344,8 @@ def collect_text_n_bbox(block,page,page_number):
                                 "y1": bbox[1],
                                 "x2": bbox[2],
                                 "y2": bbox[3],
-                                "width": page.rect.width,
-                                "height": page.rect.height,
+                                "width": page_width,
+                                "height": page_height,
                                 "pageNumber": page_number
                             })
                     else:
@@ -346,8 +356,8 @@ def collect_text_n_bbox(block,page,page_number):
                             "y1": bbox[1],
                             "x2": bbox[2],
                             "y2": bbox[3],
-                            "width": page.rect.width,
-                            "height": page.rect.height,
+                            "width": page_width,
+                            "height": page_height,
                             "pageNumber": page_number
                         })
 
@@ -438,7 +448,7 @@ def remove_reference(para_data):
             new_result.append(para)
     return new_result
 
-def extract_mineru_result(mineru_json):
+def collect_mineru_paragraphs(mineru_json):
     # block_texts_data = [] 
     # block_bb_data = []
     para_data = []
@@ -455,6 +465,10 @@ def extract_mineru_result(mineru_json):
         # para_data = collect_para(discarded_blocks, para_data,page_idx,width, height)
         # para_data = collect_para(tables, para_data,page_idx,width, height)
     # para_data = sort_by_page_and_index(para_data)
+    return para_data
+
+def extract_mineru_result(mineru_json):
+    para_data = collect_mineru_paragraphs(mineru_json)
     para_data = remove_reference(para_data)
     return para_data
 
@@ -476,81 +490,114 @@ def check_ignore_get_text(para_type):
     else:
         return False
 
+class PageCharIndex:
+    """
+    Characters of one page from a single RAWDICT extraction, sorted by y0 so the
+    ones overlapping a clip rectangle are found by bisection instead of
+    re-extracting the page with get_textpage(clip=rect). Selection follows
+    PyMuPDF's clip rule (character bbox overlaps the rectangle) and keeps the
+    characters in their text blocks, in extraction order.
+    """
+    def __init__(self, page):
+        self.chars = []
+        for block_idx, block in enumerate(page.get_textpage().extractRAWDICT()['blocks']):
+            for line in block.get('lines', []):
+                for span in line['spans']:
+                    for char in span['chars']:
+                        self.chars.append((block_idx, char))
+        self.order = sorted(range(len(self.chars)), key=lambda i: self.chars[i][1]['bbox'][1])
+        self.y0 = [self.chars[i][1]['bbox'][1] for i in self.order]
+        self.max_height = max((char['bbox'][3] - char['bbox'][1] for _, char in self.chars), default=0)
+
+    def blocks_in(self, x1, y1, x2, y2):
+        """RAWDICT-like blocks holding the characters that overlap (x1, y1, x2, y2)."""
+        if x1 >= x2 or y1 >= y2:
+            # an empty or inverted clip (the padding loop can shrink a short rect past itself)
+            # gets no characters from get_textpage(clip=...) either
+            return []
+        # a char overlaps iff y0 < y2 and y0 + height > y1, so only y0 in (y1 - max_height, y2) can
+        lo = bisect.bisect_right(self.y0, y1 - self.max_height)
+        hi = bisect.bisect_left(self.y0, y2)
+        selected = []
+        for i in self.order[lo:hi]:
+            cx1, cy1, cx2, cy2 = self.chars[i][1]['bbox']
+            if x1 < cx2 and y1 < cy2 and x2 > cx1 and y2 > cy1:
+                selected.append(i)
+        blocks = {}
+        for i in sorted(selected):
+            block_idx, char = self.chars[i]
+            blocks.setdefault(block_idx, []).append(char)
+        return [{'lines': [{'spans': [{'chars': chars}]}]} for chars in blocks.values()]
+
+
+def rect_placeholder(para):
+    # "@" text and the MinerU rect for paragraphs whose text is not extracted
+    x1,y1,x2,y2 = para['rect']
+    para["text"] = "@"
+    para["bbox"] = [
+        {
+            "x1": x1,
+            "y1": y1,
+            "x2": x2,
+            "y2": y2,
+            "width": para["width"],
+            "height": para["height"],
+            "pageNumber": para["page_number"][0]
+        }
+    ]
+    para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
+
+
 def extract_text_n_bbox_using_pymupdf_from_mineru_result(file_path,para_data):
     document = fitz.open(file_path)
-    # block_texts_data = []
     max_x2=0
     min_x1=10000000
-    # block_bb_data = []
-    for page_number in range(len(document)):
+    num_pages = len(document)
+
+    # group paragraphs by page once; each page is extracted a single time
+    paras_by_page = {}
+    for para in para_data:
+        if check_ignore_get_text(para["type"]):
+            if num_pages > 0:
+                rect_placeholder(para)
+            continue
+        paras_by_page.setdefault(para["page_number"][0], []).append(para)
+
+    for page_number in range(num_pages):
+        if (page_number+1) not in paras_by_page:
+            continue
         page_data = document.load_page(page_number)
-        for para in para_data:
-            if check_ignore_get_text(para["type"]):
-                para["text"] = "@"
-                x1,y1,x2,y2 = para['rect']
-                para["bbox"] = [
-                    {
-                        "x1": x1,
-                        "y1": y1,
-                        "x2": x2,
-                        "y2": y2,
-                        "width": para["width"],
-                        "height": para["height"],
-                        "pageNumber": para["page_number"][0]
-                    }
-                ]
+        char_index = PageCharIndex(page_data)
+        for para in paras_by_page[page_number+1]:
+            threshhold = 5
+            x1,y1,x2,y2 = para['rect']
+            bounding_box = {'x1': 0, 'y1': 0, 'x2': 0, 'y2': 0}
+            padding =0
+            # shrink the rect vertically until the text bbox matches the MinerU rect
+            while (abs(bounding_box["y1"] - y1) > threshhold or abs(bounding_box["y2"] - y2) > threshhold) and (padding <= 5):
+                new_y2 = y2-padding
+                new_y1 = y1+padding
+                padding += 1
+                block_texts_data = ""
+                block_bb_data = []
+                for block in char_index.blocks_in(x1, new_y1, x2, new_y2):
+                    block_text, char_bounding_boxes = collect_text_n_bbox(block,page_data,page_number+1)
+                    block_texts_data+=block_text
+                    block_bb_data.extend(char_bounding_boxes)
+                if len(block_bb_data) == 0 :
+                    print(pymupdf.Rect(x1,new_y1,x2,new_y2))
+                    continue
+                bounding_box = merge_bounding_boxes(block_bb_data)
+            max_x2=bounding_box.get("x2") if bounding_box.get("x2") > max_x2 else max_x2
+            min_x1=bounding_box.get("x1") if bounding_box.get("x1") < min_x1 else min_x1
+            if len(block_bb_data) != 0:
+                para["text"] = block_texts_data
+                para["bbox"] = block_bb_data
                 para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
-                continue
-            if para["page_number"][0] == (page_number+1):    
-                threshhold = 5
-                x1,y1,x2,y2 = para['rect']
-                bounding_box = {'x1': 0, 'y1': 0, 'x2': 0, 'y2': 0}
-                padding =0
-                loop_again = False
-                while (abs(bounding_box["y1"] - y1) > threshhold or abs(bounding_box["y2"] - y2) > threshhold) and (padding <= 5):
-                    new_y2 = y2-padding
-                    new_y1 = y1+padding
-                    padding += 1
-                    rect = pymupdf.Rect(x1,new_y1,x2,new_y2)
-                    text_page = page_data.get_textpage(clip=rect)
-                    text = text_page.extractRAWDICT()
-                    if len(text['blocks']) > 1:
-                        print("WE have error during locate bounding box!!!!!!!!!!!!")
-                    block_texts_data = ""
-                    block_bb_data = []
-                    for block in text['blocks']:
-                        if 'lines' in block:
-                            block_text, char_bounding_boxes = collect_text_n_bbox(block,page_data,page_number+1)
-                            block_texts_data+=block_text
-                            block_bb_data.extend(char_bounding_boxes)
-                    if len(block_bb_data) == 0 :
-                        print(rect)
-                        print(text)
-                        continue
-                    bounding_box = merge_bounding_boxes(block_bb_data)
-                max_x2=bounding_box.get("x2") if bounding_box.get("x2") > max_x2 else max_x2
-                min_x1=bounding_box.get("x1") if bounding_box.get("x1") < min_x1 else min_x1
-                if len(block_bb_data) != 0:
-                    para["text"] = block_texts_data
-                    para["bbox"] = block_bb_data
-                    para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
-                else:
-                    para["text"] = "@"
-                    x1,y1,x2,y2 = para['rect']
-                    para["type"] = "discarded"
-                    para["bbox"] = [
-                                    {
-                                        "x1": x1,
-                                        "y1": y1,
-                                        "x2": x2,
-                                        "y2": y2,
-                                        "width": para["width"],
-                                        "height": para["height"],
-                                        "pageNumber": para["page_number"][0]
-                                    }
-                                ]
-                    para["bounding_box"] = [merge_bounding_boxes(para["bbox"])]
-    
+            else:
+                para["type"] = "discarded"
+                rect_placeholder(para)
+
     return para_data, min_x1, max_x2
 
 def get_bbox_n_text_seperated(para_data):
@@ -613,11 +660,90 @@ def merge_broken_paragraph(para_data):
     return para_data
 
 
-def processing_pdf_using_mineru_and_pymupdf(file_path):
-    mineru_json_content = parse_layout_with_mineru(file_path)
-    # # print(type(mineru_json_content))
-    mineru_json = json.loads(mineru_json_content)
-    para_data = extract_mineru_result(mineru_json)
+_shard_executor = None
+_shard_executor_workers = 0
+_shard_executor_lock = threading.Lock()
+
+
+def get_shard_executor(workers):
+    """
+    Process pool for page shards, created once and kept warm so each worker loads
+    the MinerU models a single time. Workers are spawned, not forked, so a parent
+    that has already initialised CUDA or torch threads is safe.
+    """
+    global _shard_executor, _shard_executor_workers
+    with _shard_executor_lock:
+        if _shard_executor is None or _shard_executor_workers != workers:
+            if _shard_executor is not None:
+                _shard_executor.shutdown(wait=False)
+            _shard_executor = ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+            _shard_executor_workers = workers
+        return _shard_executor
+
+
+def page_shards(num_pages, pages_per_shard):
+    return [(start, min(start + pages_per_shard, num_pages)) for start in range(0, num_pages, pages_per_shard)]
+
+
+def parse_page_shard(file_path, start, end):
+    """
+    MinerU layout analysis for pages [start, end) of the PDF, run on a temporary
+    PDF holding only those pages. Page numbers in the returned paragraphs are
+    those of the full document. References are not removed and no text is
+    extracted here: the reference section can span shards, and remove_reference
+    must see the MinerU paragraph types before extraction marks empty ones as
+    discarded, as in the serial path.
+    """
+    shard = fitz.open()
+    with fitz.open(file_path) as document:
+        shard.insert_pdf(document, from_page=start, to_page=end - 1)
+    fd, shard_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        shard.save(shard_path)
+        shard.close()
+        mineru_json = json.loads(parse_layout_with_mineru(shard_path))
+        para_data = collect_mineru_paragraphs(mineru_json)
+    finally:
+        os.remove(shard_path)
+    for para in para_data:
+        para["page_number"] = [page + start for page in para["page_number"]]
+    return para_data
+
+
+def processing_pdf_using_mineru_and_pymupdf(file_path, workers=None, pages_per_shard=None):
+    """
+    Parse a PDF into paragraphs with text and per-character boxes. With more than
+    one worker (DOCORA_PDF_WORKERS), the PDF is cut into shards of `pages_per_shard`
+    pages (DOCORA_PDF_PAGES_PER_SHARD, default 8) whose MinerU layouts are computed
+    in a process pool and concatenated in page order; reference removal, text
+    extraction and merge_broken_paragraph then run over the whole document,
+    across shard boundaries and in the same order as the serial path.
+    """
+    workers = int(workers or os.environ.get(PDF_WORKERS_ENV, 1))
+    if workers > 1 and multiprocessing.current_process().daemon:
+        # e.g. a prefork Celery child, which may not start worker processes
+        print("PDF parsing in a daemonic process, sharding disabled")
+        workers = 1
+    shards = []
+    if workers > 1:
+        pages_per_shard = int(pages_per_shard or os.environ.get(PDF_PAGES_PER_SHARD_ENV, 8))
+        with fitz.open(file_path) as document:
+            shards = page_shards(len(document), pages_per_shard)
+
+    if len(shards) > 1:
+        executor = get_shard_executor(workers)
+        futures = [executor.submit(parse_page_shard, file_path, start, end) for start, end in shards]
+        para_data = []
+        for future in futures:
+            para_data.extend(future.result())
+        para_data = remove_reference(para_data)
+    else:
+        mineru_json_content = parse_layout_with_mineru(file_path)
+        # # print(type(mineru_json_content))
+        mineru_json = json.loads(mineru_json_content)
+        para_data = extract_mineru_result(mineru_json)
     para_data,min_x1, max_x2 = extract_text_n_bbox_using_pymupdf_from_mineru_result(file_path, para_data)
     para_data = merge_broken_paragraph(para_data)
     block_texts_data, block_bb_data = get_bbox_n_text_seperated(para_data)
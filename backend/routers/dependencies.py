@@ -25,6 +25,7 @@ from ner_re_processing import  convert_to_output_v2
 
 
 from utils import utils
+from utils.render_cache import render_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 dev_account_id = 2335
@@ -419,6 +420,7 @@ def update_entity_function(db,new_entity_dict,cur_entities,cur_relations,user_no
     update.set_user_notes(user_notes)
     update.set_entities(cur_entities)  
     update.set_relations(cur_relations)  
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
 
 
@@ -475,9 +477,9 @@ def load_para(document,user_notes):
     if type(para_data[0]) == str:
         old_pos = document.get_positions()
         old_text = para_data
-        old_text, old_pos,change_ids, _ = utils.execute_user_note_on_paragraphs(user_notes, old_text, old_pos)
+        old_text, old_pos,change_ids, _ = utils.execute_user_note_on_paragraphs(user_notes, old_text, old_pos, snapshot_key=document.id)
     else:
         old_text,old_pos = utils.get_bbox_n_text_seperated(para_data)
-        old_text, old_pos,change_ids, para_data = utils.execute_user_note_on_paragraphs(user_notes, old_text, old_pos,para_data=para_data)
+        old_text, old_pos,change_ids, para_data = utils.execute_user_note_on_paragraphs(user_notes, old_text, old_pos,para_data=para_data, snapshot_key=document.id)
     
     return old_text, old_pos,change_ids, para_data
\ No newline at end of file
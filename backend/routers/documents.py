@@ -29,6 +29,7 @@ from dev_tasks import process_pdf_task, process_pdf_task_with_json, extract_tabl
 from ner_re_processing import  convert_to_output_v2
 # from EAE.predict_EAE import predict as eae_predict
 from utils import utils
+from utils.render_cache import render_cache, render_version
 
 from .dependencies import get_current_user, format_output, format_output_for_rerun, get_db, load_para
 
@@ -96,6 +97,10 @@ async def get_document_as_id(document_id:int, current_user: user_model.User = De
     """
     document = document_crud.get_document(db,document_id)
     last_update = document_crud.get_last_update(db,document_id,current_user.id)
+    version = render_version(document, last_update)
+    cached = render_cache.get(document.id, last_update.id, "latest", version)
+    if cached is not None:
+        return cached
     # TODO: reformat this function
     # 1. get last update need to be reworked. Since update id no longer incremental -> need another method to get last update
     if last_update.get_user_notes():
@@ -115,6 +120,7 @@ async def get_document_as_id(document_id:int, current_user: user_model.User = De
         output = format_output(output,document.id,document.FileName,-1,[],apply_visibility=False)
     if "domamin" not in output:
         output['domain']="polymer"
+    render_cache.set(document.id, last_update.id, "latest", version, output)
     return output
 
 @router.get("/delete-document/{document_id}")
@@ -420,6 +426,11 @@ async def get_document_as_id(document_id:int,update_id:int,
         # 1. last_update no longer be able to be None
         # 2. Need to perform user notes before send to users
         # delete
+    version = render_version(document, last_update)
+    cached = render_cache.get(document.id, last_update.id, "update", version)
+    if cached is not None:
+        utils.h_log(log_folder)
+        return cached
     if last_update.get_user_notes():
         user_notes = last_update.get_user_notes()
         paragraphs,old_bboxs, change_ids, para_data = load_para(document, user_notes)    
@@ -434,6 +445,7 @@ async def get_document_as_id(document_id:int,update_id:int,
         else:
             output, normalized_all_pages_bb_data, normalized_all_pages_text_data = convert_to_output_v2(relations, old_bboxs, paragraphs, para_data=para_data)
         output = format_output(output,document.id,document.FileName,last_update.id,last_update.get_user_notes(),apply_visibility=True)
+        render_cache.set(document.id, last_update.id, "update", version, output)
     utils.h_log(log_folder)
     return output
 
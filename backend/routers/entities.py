@@ -21,6 +21,8 @@ from schemas import document as document_schemas
 
 from utils.utils import get_cur_relations_entities
 from utils import utils
+from utils.render_cache import render_cache
+from utils.char_index import positions_version
 
 from .dependencies import get_current_user, return_formated_result, update_entity_function, find_new_entity_position_within_range, get_db, load_para
 
@@ -93,6 +95,7 @@ async def delete_entity(entity:document_schemas.DeleteEntitySchema,current_user:
     update.set_entities(cur_entities)  
     update.set_relations(cur_relations)
     
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     return return_formated_result(db,entity,document,update,cur_entities)
 
@@ -209,7 +212,8 @@ async def create_entity(entity:document_schemas.CreateEntitySchema,
 
     old_text, old_pos,change_ids, para_data =load_para(document, user_notes)
 
-    para_id,idx = utils.decide_new_pos(entity,old_pos)
+    para_id,idx = utils.decide_new_pos(entity,old_pos,
+                                       index_key=(document.id, positions_version(user_notes)))
 
     if len(idx) == 0:
         print(entity)
@@ -272,6 +276,7 @@ async def create_entity(entity:document_schemas.CreateEntitySchema,
     update.set_user_notes(user_notes)
     update.set_relations(cur_relations)
     
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     new_relations = update.get_relations()
     # print(new_relations[7]["entities"])
@@ -322,6 +327,7 @@ async def mark_edit(edit_entity: document_schemas.ChangeEditStatusSchema,current
 
         update.set_user_notes(user_notes)
         update.set_relations(cur_relations)
+        render_cache.invalidate(update.DocumentID)
         update = document_crud.modify_update_as_object(db,update.id,update)
 
         return "ok"
@@ -16,6 +16,7 @@ from schemas import document as document_schemas
 
 from utils.utils import get_cur_relations_entities, compose_update_event_content
 from utils import utils
+from utils.render_cache import render_cache
 
 from .dependencies import get_current_user, return_formated_result, execute_update_on_entities_wrapper, get_db
 
@@ -84,6 +85,7 @@ async def edit_event(update_info: document_schemas.UpdateEventSchema, db:Session
     update.set_user_notes(user_notes)
     update.set_entities(cur_entities)  
     update.set_relations(cur_relations)  
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
 
 
@@ -126,6 +128,7 @@ async def edit_event(update_info: document_schemas.UpdateEventSchema, db:Session
         update.set_user_notes(user_notes)
         update.set_entities(cur_entities)  
         update.set_relations(cur_relations)
+        render_cache.invalidate(update.DocumentID)
         update = document_crud.modify_update_as_object(db,update.id,update)
     return return_formated_result(db,update_info,document,update,cur_entities)
 
@@ -175,6 +178,7 @@ async def delete_event(update_infor: document_schemas.DeleteEventSchema, db:Sess
     update.set_user_notes(user_notes)
     update.set_entities(cur_entities)  
     update.set_relations(cur_relations)  
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
 
     return return_formated_result(db,update_infor,document,update,cur_entities)
@@ -21,6 +21,7 @@ from dev_tasks import re_run_for_changed_para
 from ner_re_processing import convert_to_output_v2
 
 from utils import utils
+from utils.render_cache import render_cache
 
 from .dependencies import get_current_user, format_output, get_db, load_para
 
@@ -99,6 +100,7 @@ async def update_paragraph(data: document_schemas.ParaUpdate,current_user: user_
     user_notes.append(update_note)
     update.set_user_notes(user_notes)
     
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     
 
@@ -199,6 +201,7 @@ async def update_paragraph(data: document_schemas.ReorderPara,current_user: user
     update.set_entities(new_entities)
     update.set_relations(new_relations)
     
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     
     if type(para_data[0])==str:
@@ -241,6 +244,7 @@ async def set_visible(infor: document_schemas.VisibleList, db:Session = Depends(
     }
     user_notes.append(action)
     update.set_user_notes(user_notes)
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     
     utils.h_log(log_folder)
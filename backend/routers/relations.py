@@ -12,6 +12,7 @@ from schemas import document as document_schemas
 from ner_re_processing import convert_to_output_v2
 
 from utils import utils
+from utils.render_cache import render_cache
 
 from .dependencies import get_current_user, format_output, get_db, load_para
 
@@ -99,6 +100,7 @@ async def update_relation(entity:document_schemas.UpdateRelationSchema,
     new_output, _, _ = convert_to_output_v2(cur_relations, old_bboxs, paragraphs, 
                             para_data=para_data if type(para_data[0]) != str else None)
 
+    render_cache.invalidate(update.DocumentID)
     update = document_crud.modify_update_as_object(db,update.id,update)
     # new_output["document_id"] = entity.document_id
     # new_output["update_id"] = update.id
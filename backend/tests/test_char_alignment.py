@@ -0,0 +1,130 @@
+"""
+utils.char_alignment against the difflib mapping build_character_mapping used
+before it. Known edge cases map exactly as before. Where several alignments
+are equally valid (e.g. which of two equal characters an insertion or deletion
+lands next to), the anchored Myers diff can pick a different one than difflib's
+longest-match recursion; those cases are pinned below, and random lightly
+edited strings are checked for a valid alignment that keeps at least as many
+characters unchanged as difflib.
+"""
+import difflib
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.char_alignment import align_opcodes, character_index_map  # noqa: E402
+
+EDGE_CASES = [
+    ("", ""),
+    ("abc", ""),
+    ("", "abc"),
+    ("Tg of PMMA", "Tg of PMMA"),
+    # normalize_org_text_and_bbox doubles characters the model text lacks
+    ("Tg = 105 C", "Tg = 105 °°C"),
+    ("Tg = 105 C", "Tg = 105 ℃℃"),
+    ("poly ( methyl methacrylate )", "poly(methyl methacrylate)"),
+    ("tensile strength , 45 MPa .", "tensile strength, 45 MPa."),
+    ("a  b", "a b"),
+    ("films", "ﬁﬁlms"),
+    ("x", "y"),
+    ("leading", "  leading"),
+    ("trailing", "trailing  "),
+    ("abcabc", "abc"),
+    ("abc", "abcabc"),
+    ("x  y", "x   y"),
+]
+
+# (model text, original text, map): accepted tie-breaks that differ from difflib
+DIVERGENT_CASES = [
+    # difflib maps the first "e" to the second one, the prefix match keeps it on the first
+    ("eih, ", "eeih, ", [0, 2, 3, 4, 5]),
+    # difflib pairs the model's "." with the first original ".", Myers replaces y -> "."
+    ("fy.", "f..", [0, 1, 2]),
+    ("d..igcb", "d.igcb", [0, 1, 1, 2, 3, 4, 5]),
+    # a moved double space: the spaces map onto different (equal) original spaces
+    ("a  b c", "a b  c", [0, 1, 1, 2, 3, 5]),
+    ("Tg  of PMMA", "Tg of  PMMA", [0, 1, 2, 2, 3, 4, 5, 7, 8, 9, 10]),
+]
+
+
+def difflib_mapping(model_output_text, original_text):
+    # build_character_mapping before the switch to utils.char_alignment
+    s = difflib.SequenceMatcher(None, model_output_text, original_text)
+    mapping_dict = {}
+    o_idx = -1
+    for tag, i1, i2, j1, j2 in s.get_opcodes():
+        if tag == 'equal' or tag == 'replace':
+            for m_pos, o_pos in zip(range(i1, i2), range(j1, j2)):
+                mapping_dict[m_pos] = o_pos
+                o_idx = o_pos
+            if tag == 'replace' and i2 - i1 > j2 - j1:
+                for m_pos in range(i1 + j2 - j1, i2):
+                    mapping_dict[m_pos] = o_idx
+        elif tag == 'delete':
+            for m_pos in range(i1, i2):
+                mapping_dict[m_pos] = o_idx
+    return [mapping_dict.get(idx, o_idx) for idx in range(len(model_output_text))]
+
+
+def lightly_edited(rng):
+    original = "".join(rng.choice("abcdefgh ijk.,") for _ in range(rng.randrange(0, 60)))
+    model = list(original)
+    for _ in range(rng.randrange(0, 4)):
+        op, pos = rng.random(), rng.randrange(len(model) + 1)
+        if op < 0.4:
+            model.insert(pos, rng.choice(" .,a"))
+        elif op < 0.7 and pos < len(model):
+            del model[pos]
+        elif pos < len(model):
+            model[pos] = rng.choice(" xyz")
+    return "".join(model), original
+
+
+def equal_chars(opcodes):
+    return sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == 'equal')
+
+
+@pytest.mark.parametrize("model_text, original", EDGE_CASES)
+def test_edge_cases_match_difflib(model_text, original):
+    mapping = character_index_map(model_text, original)
+    assert mapping.dtype == np.int64
+    assert mapping.tolist() == difflib_mapping(model_text, original)
+
+
+@pytest.mark.parametrize("model_text, original, expected", DIVERGENT_CASES)
+def test_pinned_tie_breaks(model_text, original, expected):
+    assert difflib_mapping(model_text, original) != expected
+    assert character_index_map(model_text, original).tolist() == expected
+
+
+def test_difflib_env_restores_difflib(monkeypatch):
+    monkeypatch.setenv("DOCORA_CHAR_ALIGNER", "difflib")
+    for model_text, original, _ in DIVERGENT_CASES:
+        assert character_index_map(model_text, original).tolist() == difflib_mapping(model_text, original)
+
+
+def test_random_edits_give_a_valid_alignment():
+    rng = random.Random(0)
+    for _ in range(3000):
+        model_text, original = lightly_edited(rng)
+        opcodes = align_opcodes(model_text, original)
+
+        # contiguous cover of both texts, "equal" spans really are equal
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            assert (i1, j1) == (i, j)
+            if tag == 'equal':
+                assert model_text[i1:i2] == original[j1:j2]
+            i, j = i2, j2
+        assert (i, j) == (len(model_text), len(original))
+        # never fewer unchanged characters than difflib (it is not a minimal diff)
+        assert equal_chars(opcodes) >= equal_chars(difflib.SequenceMatcher(None, model_text, original).get_opcodes())
+
+        mapping = character_index_map(model_text, original)
+        assert len(mapping) == len(model_text)
+        assert np.all(np.diff(mapping) >= 0)
+        assert np.all((mapping >= -1) & (mapping < max(len(original), 1)))
+        if model_text == original:
+            assert mapping.tolist() == list(range(len(original)))
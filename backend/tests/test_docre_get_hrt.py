@@ -0,0 +1,50 @@
+"""
+DocREModel.get_hrt (batched mention gather, per-document Gram matrix for the
+pair attentions) against the per-entity loop it replaced: head, context and
+tail representations must match on random batches with multi-mention
+entities, truncated mentions and entities with no surviving mention.
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("RE.long_seq")
+
+from annotators.polymer.models.RE_model import DocREModel  # noqa: E402
+from benchmarks.bench_docre_get_hrt import legacy_get_hrt, make_batch  # noqa: E402
+
+
+def model_for(transformer_type, hidden_size):
+    return SimpleNamespace(config=SimpleNamespace(transformer_type=transformer_type, hidden_size=hidden_size))
+
+
+@pytest.mark.parametrize("transformer_type", ["bert", "gpt2"])
+@pytest.mark.parametrize("max_entities", [2, 5, 20])
+def test_get_hrt_matches_loop(transformer_type, max_entities):
+    rng = random.Random(max_entities)
+    torch.manual_seed(max_entities)
+    model = model_for(transformer_type, 32)
+    for _ in range(10):
+        batch = make_batch(3, max_entities, 48, 32, 4, rng)
+        expected = legacy_get_hrt(model.config, *batch)
+        result = DocREModel.get_hrt(model, *batch)
+        for new, old in zip(result, expected):
+            assert new.shape == old.shape
+            assert torch.allclose(new, old, atol=1e-5, rtol=1e-5)
+
+
+def test_entity_without_surviving_mention():
+    torch.manual_seed(0)
+    model = model_for("bert", 16)
+    sequence_output = torch.randn(2, 8, 16)
+    attention = torch.softmax(torch.randn(2, 2, 8, 8), dim=-1)
+    # every mention of entity 1 in the first document starts past the sequence
+    entity_pos = [[[(0, 1)], [(9, 10), (12, 13)], [(3, 4), (5, 6)]], [[(2, 3)], [(7, 8)]]]
+    hts = [[[0, 1], [1, 0], [1, 2], [2, 0]], [[1, 0]]]
+    expected = legacy_get_hrt(model.config, sequence_output, attention, entity_pos, hts)
+    result = DocREModel.get_hrt(model, sequence_output, attention, entity_pos, hts)
+    for new, old in zip(result, expected):
+        assert torch.allclose(new, old, atol=1e-6, rtol=1e-5)
+    assert torch.count_nonzero(result[0][1]) == 0
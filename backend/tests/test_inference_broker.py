@@ -0,0 +1,71 @@
+"""
+utils.inference_broker: concurrent callers get exactly what a direct
+_annotate call returns, and a request holding a paragraph that yields no
+output runs on its own instead of sending the whole batch through twice.
+"""
+import threading
+
+from utils.inference_broker import InferenceBroker
+
+
+class DroppingAnnotator:
+    # like the polymer annotator: paragraphs without any word give no output
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _annotate(self, text):
+        with self.lock:
+            self.calls.append(list(text))
+        outputs = [{"text": paragraph} for paragraph in text if any(c.isalnum() for c in paragraph)]
+        return outputs, outputs
+
+
+def run_concurrently(broker, requests):
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def task(i):
+        barrier.wait()
+        results[i] = broker.annotate(requests[i])
+
+    threads = [threading.Thread(target=task, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_outputs_match_direct_calls():
+    annotator = DroppingAnnotator()
+    broker = InferenceBroker(annotator._annotate, max_batch=64, max_wait_ms=200)
+    requests = [[f"task {i} paragraph {j}" for j in range(3)] for i in range(12)]
+    requests[5] = ["task 5 paragraph 0", "  ", "task 5 paragraph 2"]
+    results = run_concurrently(broker, requests)
+    broker.close()
+
+    direct = DroppingAnnotator()
+    for request, result in zip(requests, results):
+        assert tuple(result) == tuple(direct._annotate(request))
+    stats = broker.stats()
+    assert stats["fallbacks"] == 0
+    assert stats["isolated"] == 1
+    # the request with the empty paragraph ran once, alone; nobody ran twice
+    assert sum(len(call) for call in annotator.calls) == sum(len(request) for request in requests)
+    assert requests[5] in annotator.calls
+
+
+def test_unexpected_mismatch_falls_back_per_request():
+    def annotate(text):
+        # drops a paragraph the broker cannot know about
+        outputs = [{"text": paragraph} for paragraph in text if "skip" not in paragraph]
+        return outputs, outputs
+
+    broker = InferenceBroker(annotate, max_batch=64, max_wait_ms=200)
+    requests = [["a 1", "skip 2"], ["b 1"], ["c 1", "c 2"]]
+    results = run_concurrently(broker, requests)
+    broker.close()
+    for request, result in zip(requests, results):
+        assert tuple(result) == tuple(annotate(request))
+    assert broker.stats()["fallbacks"] == 1
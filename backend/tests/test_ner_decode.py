@@ -0,0 +1,31 @@
+"""
+The sparse W2NER grid decoder (NER_utils.decode) against the dense l x l scan
+it replaced: counts and decode_entities, including their order, must be
+identical on random argmax grids with discontinuous and nested entities,
+sparse noise and garbage in the padding.
+"""
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pycorenlp")
+
+from annotators.polymer.utils.NER_utils import decode  # noqa: E402
+from benchmarks.bench_ner_decode import legacy_decode, make_batch  # noqa: E402
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_sparse_decode_matches_dense_scan(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        outputs, entity_text, length = make_batch(4, rng)
+        assert decode(outputs, entity_text, length) == legacy_decode(outputs, entity_text, length)
+
+
+def test_empty_and_padded_rows():
+    rng = random.Random(0)
+    outputs, entity_text, length = make_batch(3, rng)
+    length[1] = 0
+    entity_text[1] = set()
+    assert decode(outputs, entity_text, length) == legacy_decode(outputs, entity_text, length)
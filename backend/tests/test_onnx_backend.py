@@ -0,0 +1,84 @@
+"""
+ONNX Runtime encoders (utils.onnx_backend) against the PyTorch module they were
+exported from, on a tiny randomly initialised BERT: last hidden state, exported
+hidden states and last-layer attention must match on padded batches, and the
+attention is only part of the export when asked for.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+transformers = pytest.importorskip("transformers")
+
+from annotators.polymer.utils.onnx_backend import OnnxEncoder, export_encoder, onnx_encoder  # noqa: E402
+
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def encoder():
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=120, hidden_size=32, num_hidden_layers=4, num_attention_heads=4,
+                                     intermediate_size=64, max_position_embeddings=64, attn_implementation="eager")
+    return transformers.BertModel(config).eval()
+
+
+def padded_batches():
+    generator = torch.Generator().manual_seed(0)
+    for max_len in (5, 16, 40):
+        lengths = torch.randint(1, max_len + 1, (3,), generator=generator)
+        lengths[0] = max_len
+        attention_mask = (torch.arange(max_len)[None, :] < lengths[:, None]).float()
+        input_ids = torch.randint(5, 120, (3, max_len), generator=generator) * attention_mask.long()
+        yield input_ids, attention_mask
+
+
+def assert_close(actual, expected, mask):
+    assert actual.shape == expected.shape
+    assert torch.allclose(actual[mask], expected[mask], atol=ATOL)
+
+
+def test_parity_with_attention(encoder, tmp_path):
+    ort_encoder = OnnxEncoder(export_encoder(encoder, str(tmp_path / "docre.onnx"), with_attention=True))
+    assert ort_encoder.with_attention
+    with torch.inference_mode():
+        for input_ids, attention_mask in padded_batches():
+            expected = encoder(input_ids=input_ids, attention_mask=attention_mask, output_attentions=True)
+            actual = ort_encoder(input_ids=input_ids, attention_mask=attention_mask, output_attentions=True)
+            mask = attention_mask.bool()
+            assert_close(actual.last_hidden_state, expected.last_hidden_state, mask)
+            assert actual.hidden_states is None
+            assert len(actual.attentions) == 1
+            # [batch, heads, query, key]: compare the rows of real query positions
+            assert_close(actual.attentions[0].transpose(1, 2), expected.attentions[-1].transpose(1, 2), mask)
+
+
+def test_parity_hidden_states_without_attention(encoder, tmp_path):
+    ort_encoder = OnnxEncoder(export_encoder(encoder, str(tmp_path / "ner.onnx"), num_hidden_states=4))
+    assert not ort_encoder.with_attention
+    assert "attention" not in ort_encoder.output_names
+    with torch.inference_mode():
+        for input_ids, attention_mask in padded_batches():
+            expected = encoder(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True)
+            actual = ort_encoder(input_ids=input_ids, attention_mask=attention_mask)
+            mask = attention_mask.bool()
+            assert_close(actual.last_hidden_state, expected.last_hidden_state, mask)
+            assert actual.attentions is None
+            assert len(actual.hidden_states) == 4
+            for ort_layer, torch_layer in zip(actual.hidden_states, expected.hidden_states[-4:]):
+                assert_close(ort_layer, torch_layer, mask)
+        with pytest.raises(ValueError):
+            ort_encoder(input_ids=input_ids, attention_mask=attention_mask, output_attentions=True)
+
+
+def test_exports_are_cached_per_attention_output(encoder, tmp_path):
+    checkpoint = tmp_path / "model.pt"
+    checkpoint.write_bytes(b"weights")
+    onnx_dir = tmp_path / "onnx"
+    without = onnx_encoder(encoder, "ner", str(checkpoint), onnx_dir=str(onnx_dir))
+    with_attention = onnx_encoder(encoder, "ner", str(checkpoint), with_attention=True, onnx_dir=str(onnx_dir))
+    assert without.path != with_attention.path
+    assert not without.with_attention and with_attention.with_attention
+    assert onnx_encoder(encoder, "ner", str(checkpoint), onnx_dir=str(onnx_dir)).path == without.path
+    assert len(list(onnx_dir.iterdir())) == 2
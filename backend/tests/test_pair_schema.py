@@ -0,0 +1,41 @@
+"""
+The DocRE pair schema enabled in the RE configs must never drop a pair that
+the annotation setting (resources/setting.json) allows a relation between,
+otherwise those relations can never be predicted.
+"""
+import json
+import os
+
+import pytest
+
+from annotators.polymer.utils.pair_schema import PairSchema
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RE_CONFIGS = ["DocRE_model_DeBERTa.json", "DocRE_model_MatSciBERT.json"]
+
+
+def setting_pairs():
+    with open(os.path.join(BACKEND, "annotators/polymer/resources/setting.json"), encoding="utf-8") as f:
+        relation_types = json.load(f)["setting"]["relation_types"]
+    pairs = set()
+    for relation_type in relation_types:
+        heads, tails = [arg["targets"] for arg in relation_type["args"]]
+        pairs.update((h, t) for h in heads for t in tails if "<ENTITY>" not in (h, t))
+    return pairs
+
+
+@pytest.mark.parametrize("config_name", RE_CONFIGS)
+def test_config_schema_covers_setting(config_name):
+    with open(os.path.join(BACKEND, "annotators/polymer/configs/RE_config", config_name), encoding="utf-8") as f:
+        config = json.load(f)
+    schema = PairSchema.from_file(os.path.join(BACKEND, config["relation_schema"]))
+    expected = setting_pairs()
+    assert ("REF_EXP", "CONDITION") in expected
+    assert schema.allowed >= expected
+
+
+def test_keep_follows_setting():
+    schema = PairSchema.from_file(os.path.join(BACKEND, "annotators/polymer/resources/setting.json"))
+    assert schema.keep("ref_exp", "condition", [(0, 1)], [(5, 6)])
+    assert not schema.keep("condition", "ref_exp", [(0, 1)], [(5, 6)])
+    assert not schema.keep("SYN_METHOD", "CONDITION", [(0, 1)], [(5, 6)])
@@ -0,0 +1,54 @@
+"""
+extract_text_n_bbox_using_pymupdf_from_mineru_result (one extraction per page,
+y-sorted character index) against the clipped per-paragraph re-extraction it
+replaced: para_data must be identical, including for jittered rects and
+title-sized rects that the padding loop shrinks until they are inverted.
+"""
+import copy
+import random
+
+import pytest
+
+pytest.importorskip("fitz")
+pytest.importorskip("magic_pdf")
+
+from benchmarks.bench_pdf_text_extraction import (generate_pdf, layout_from_blocks,  # noqa: E402
+                                                  legacy_extract, perturbed_layout)
+from pdf_processing import extract_text_n_bbox_using_pymupdf_from_mineru_result  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("pdf") / "synthetic.pdf")
+    generate_pdf(path, 2)
+    return path
+
+
+def check(path, para_data):
+    expected = legacy_extract(path, copy.deepcopy(para_data))
+    assert extract_text_n_bbox_using_pymupdf_from_mineru_result(path, copy.deepcopy(para_data)) == expected
+    return expected
+
+
+def test_block_rects(pdf_path):
+    para_data = layout_from_blocks(pdf_path)
+    assert len(para_data) > 0
+    para_data, _, _ = check(pdf_path, para_data)
+    assert all(para["text"] != "@" for para in para_data)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_jittered_and_short_rects(pdf_path, seed):
+    para_data, _, _ = check(pdf_path, perturbed_layout(layout_from_blocks(pdf_path), random.Random(seed)))
+    # some short rects are inverted by the padding loop and come back as placeholders
+    assert any(para["type"] == "discarded" for para in para_data)
+
+
+def test_inverted_rect_is_discarded(pdf_path):
+    para = dict(layout_from_blocks(pdf_path)[0])
+    x1, y1, x2, _ = para["rect"]
+    # 8.79pt across two text lines: the characters never match the rect, and at
+    # padding 5 the clip is inverted (y1 + 5 > y2 - 5), which selects nothing
+    para["rect"] = [x1, y1 + 5, x2, y1 + 13.79]
+    para_data, _, _ = check(pdf_path, [para])
+    assert para_data[0]["type"] == "discarded" and para_data[0]["text"] == "@"
@@ -0,0 +1,55 @@
+"""
+read_docred_real (batched word pieces, hashed lookups, array-built labels)
+against the version it replaced, which called tokenizer.tokenize per word: the
+pickled features must be byte-identical, with a fast and a slow tokenizer
+built from a small local vocabulary.
+"""
+import os
+import pickle
+import random
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("ujson")
+pytest.importorskip("pycorenlp")
+if not os.path.exists("RE/meta/rel2id_polymer.json"):
+    # read at import time by annotators.polymer.dependencies, relative to the backend directory
+    pytest.skip("RE/meta/rel2id_polymer.json not found", allow_module_level=True)
+
+from transformers import BertTokenizer, BertTokenizerFast  # noqa: E402
+
+from annotators.polymer.dependencies import read_docred_real  # noqa: E402
+from benchmarks.bench_read_docred import WORDS, legacy_read_docred_real, make_paragraph  # noqa: E402
+
+
+@pytest.fixture(scope="module", params=[BertTokenizerFast, BertTokenizer], ids=["fast", "slow"])
+def tokenizer(request, tmp_path_factory):
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "*", "(", ")", "%", "°", "##C", "##s"]
+    vocab += sorted({w for word in WORDS for w in word.replace("(", " ").replace(")", " ").split()})
+    path = tmp_path_factory.mktemp("vocab") / "vocab.txt"
+    path.write_text("\n".join(dict.fromkeys(vocab)) + "\n", encoding="utf-8")
+    return request.param(vocab_file=str(path), do_lower_case=False)
+
+
+def test_features_byte_identical(tokenizer):
+    rng = random.Random(0)
+    data = [make_paragraph(60, rng),
+            make_paragraph(20, rng, title="1", with_labels=True),
+            make_paragraph(1, rng, title="2")]
+    expected = legacy_read_docred_real(data, tokenizer)
+    features = read_docred_real(data, tokenizer)
+    for feature in features:
+        del feature["pruned_pairs"]
+    assert pickle.dumps(features) == pickle.dumps(expected)
+
+
+def test_truncated_features_byte_identical(tokenizer):
+    rng = random.Random(1)
+    data = [make_paragraph(40, rng, title=str(i)) for i in range(3)]
+    expected = legacy_read_docred_real(data, tokenizer, max_seq_length=64)
+    features = read_docred_real(data, tokenizer, max_seq_length=64)
+    for feature in features:
+        del feature["pruned_pairs"]
+    assert pickle.dumps(features) == pickle.dumps(expected)
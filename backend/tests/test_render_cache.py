@@ -0,0 +1,35 @@
+"""
+utils.render_cache: the two /get-document routes render the same update from
+different inputs and must not serve each other's cached output.
+"""
+from utils.render_cache import RenderCache
+
+
+def test_routes_do_not_share_entries():
+    cache = RenderCache()
+    cache.set(1, 7, "latest", "v1", {"route": "latest"})
+    assert cache.get(1, 7, "update", "v1") is None
+    cache.set(1, 7, "update", "v1", {"route": "update"})
+    assert cache.get(1, 7, "latest", "v1") == {"route": "latest"}
+    assert cache.get(1, 7, "update", "v1") == {"route": "update"}
+
+
+def test_newer_version_replaces_only_its_variant():
+    cache = RenderCache()
+    cache.set(1, 7, "latest", "v1", {"route": "latest"})
+    cache.set(1, 7, "update", "v1", {"route": "update"})
+    cache.set(1, 7, "update", "v2", {"route": "update", "version": 2})
+    assert cache.get(1, 7, "update", "v1") is None
+    assert cache.get(1, 7, "update", "v2") == {"route": "update", "version": 2}
+    assert cache.get(1, 7, "latest", "v1") == {"route": "latest"}
+
+
+def test_invalidate_drops_both_variants():
+    cache = RenderCache()
+    cache.set(1, 7, "latest", "v1", {})
+    cache.set(1, 7, "update", "v1", {})
+    cache.set(2, 8, "latest", "v1", {})
+    cache.invalidate(1)
+    assert cache.get(1, 7, "latest", "v1") is None
+    assert cache.get(1, 7, "update", "v1") is None
+    assert cache.get(2, 8, "latest", "v1") == {}
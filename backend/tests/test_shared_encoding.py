@@ -0,0 +1,134 @@
+"""
+Reuse of NER encoder outputs by the DocRE stage (EncodingCache and the
+piece_sources recorded by read_docred_real), on a tiny randomly initialised
+BERT used by both stages: entity markers and [CLS]/[SEP] must point at the
+right NER positions, and a one-sentence document without markers must come
+back as the encoder's own outputs.
+"""
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("ujson")
+pytest.importorskip("pycorenlp")
+if not os.path.exists("RE/meta/rel2id_polymer.json"):
+    # read at import time by annotators.polymer.dependencies, relative to the backend directory
+    pytest.skip("RE/meta/rel2id_polymer.json not found", allow_module_level=True)
+
+from annotators.polymer.dependencies import read_docred_real  # noqa: E402
+from annotators.polymer.utils.shared_encoding import EncodingCache  # noqa: E402
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "*", "poly", "##styrene", "##imide", "film", "was",
+         "cast", "from", "toluene", "at", "25", "°", "##C", "the", "glass", "transition", "is", "high", "."]
+SENTS = [["polystyrene", "film", "was", "cast", "from", "toluene", "at", "25", "°C", "."],
+         ["the", "glass", "transition", "of", "polyimide", "is", "high", "."]]
+
+
+@pytest.fixture(scope="module")
+def tokenizer(tmp_path_factory):
+    path = tmp_path_factory.mktemp("vocab") / "vocab.txt"
+    path.write_text("\n".join(VOCAB) + "\n", encoding="utf-8")
+    return transformers.BertTokenizerFast(vocab_file=str(path), do_lower_case=False)
+
+
+@pytest.fixture(scope="module")
+def encoder():
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(VOCAB), hidden_size=32, num_hidden_layers=2,
+                                     num_attention_heads=4, intermediate_size=64, max_position_embeddings=64,
+                                     attn_implementation="eager")
+    return transformers.BertModel(config).eval()
+
+
+def ner_inputs(tokenizer, sents):
+    # what NER_model.process_bert builds: "[CLS] pieces [SEP]" and the word -> piece map
+    bert_inputs, pieces2word = [], []
+    for words in sents:
+        pieces = [tokenizer.tokenize(word) for word in words]
+        ids = [tokenizer.cls_token_id] + tokenizer.convert_tokens_to_ids(sum(pieces, [])) + [tokenizer.sep_token_id]
+        p2w = torch.zeros((len(words), len(ids)), dtype=torch.bool)
+        start = 0
+        for i, word_pieces in enumerate(pieces):
+            p2w[i, start + 1:start + len(word_pieces) + 1] = True
+            start += len(word_pieces)
+        bert_inputs.append(ids)
+        pieces2word.append(p2w)
+    return bert_inputs, pieces2word
+
+
+def encode(encoder, ids):
+    with torch.no_grad():
+        output = encoder(torch.tensor([ids]), attention_mask=torch.ones((1, len(ids))), output_attentions=True)
+    return output.last_hidden_state[0], output.attentions[-1][0]
+
+
+def fill_cache(tokenizer, encoder, sents):
+    # NER batch: padded inputs, as model_predict hands them to EncodingCache.add_batch
+    bert_inputs, pieces2word = ner_inputs(tokenizer, sents)
+    max_len, max_words = max(map(len, bert_inputs)), max(map(len, sents))
+    input_ids = torch.zeros((len(sents), max_len), dtype=torch.long)
+    p2w = torch.zeros((len(sents), max_words, max_len), dtype=torch.bool)
+    for b, (ids, mask) in enumerate(zip(bert_inputs, pieces2word)):
+        input_ids[b, :len(ids)] = torch.tensor(ids)
+        p2w[b, :mask.size(0), :mask.size(1)] = mask
+    with torch.no_grad():
+        output = encoder(input_ids, attention_mask=input_ids.ne(0).float(), output_attentions=True)
+    cache = EncodingCache()
+    cache.add_batch(sents, p2w, input_ids, output.last_hidden_state, output.attentions[-1])
+    return cache, bert_inputs
+
+
+def document(sents, mentions):
+    vertex_set = [[{"name": " ".join(sents[s][start:end]), "sent_id": s, "pos": [start, end], "type": "POLYMER"}]
+                  for s, start, end in mentions]
+    return {"title": "0", "sents": sents, "vertexSet": vertex_set}
+
+
+def test_piece_sources_point_at_ner_positions(tokenizer, encoder):
+    # "polystyrene" and "25 °C" (3 pieces) in sentence 0, "polyimide" in sentence 1
+    sample = document(SENTS, [(0, 0, 1), (0, 7, 9), (1, 4, 5)])
+    feature = read_docred_real([sample], tokenizer, record_sources=True)[0]
+    sources, input_ids = feature["piece_sources"], feature["input_ids"]
+    bert_inputs, _ = ner_inputs(tokenizer, SENTS)
+    assert len(sources) == len(input_ids)
+
+    # [CLS] is sentence 0's [CLS], [SEP] is the [SEP] of the last sentence
+    assert sources[0] == (0, 0)
+    assert sources[-1] == (1, len(bert_inputs[1]) - 1)
+    star = tokenizer.convert_tokens_to_ids("*")
+    markers = [j for j, token in enumerate(input_ids) if token == star]
+    assert len(markers) == 6
+    # start markers take the first piece of the mention, end markers its last piece
+    assert [sources[j] for j in markers] == [(0, 1), (0, 2), (0, 9), (0, 11), (1, 5), (1, 6)]
+    for j, (s, p) in enumerate(sources):
+        if j not in markers:
+            assert input_ids[j] == bert_inputs[s][p]
+
+    cache, _ = fill_cache(tokenizer, encoder, SENTS)
+    assert cache.covers(feature)
+
+
+def test_assemble_without_markers_is_the_encoder_output(tokenizer, encoder):
+    sents = SENTS[:1]
+    feature = read_docred_real([document(sents, [])], tokenizer, record_sources=True)[0]
+    cache, bert_inputs = fill_cache(tokenizer, encoder, sents)
+    assert feature["input_ids"] == bert_inputs[0]
+    assert cache.covers(feature)
+
+    sequence_output, attention = cache.assemble([feature], torch.device("cpu"))
+    hidden, expected_attention = encode(encoder, feature["input_ids"])
+    assert torch.allclose(sequence_output[0], hidden, atol=1e-5)
+    assert torch.allclose(attention[0], expected_attention, atol=1e-5)
+
+
+def test_covers_needs_matching_sentences(tokenizer, encoder):
+    feature = read_docred_real([document(SENTS, [(0, 0, 1)])], tokenizer, record_sources=True)[0]
+    cache, _ = fill_cache(tokenizer, encoder, SENTS[:1])
+    assert not cache.covers(feature)
+
+    cache, _ = fill_cache(tokenizer, encoder, SENTS)
+    words, (pieces, hidden, attention) = next(iter(cache.sentences.items()))
+    cache.sentences[words] = (pieces[:-1] + (pieces[-1] + 1,), hidden, attention)
+    assert not cache.covers(feature)
@@ -0,0 +1,98 @@
+"""
+utils.tokenization.CoreNLPBackend: batched requests (paragraphs joined with a
+blank line, UTF-16 offsets re-based per paragraph) against one request per
+paragraph, through a fake CoreNLP server. The NER input records (sentence,
+doc_ID, sent_ID) and the token offsets must be the same, including after
+characters outside the BMP, which count as two Java chars.
+"""
+import json
+import re
+
+import pytest
+
+from utils.tokenization import CoreNLPBackend
+
+PARAGRAPHS = [
+    "PMMA films were cast from toluene. The Tg was 105 °C.",
+    "The 𝛼-relaxation of PS 🧪 shifted by 4 K. Samples were annealed.",
+    "   ",
+    "𝛽 = 0.3 for 𝜑 < 0.5! Above that, the fit fails.",
+    "Nylon-6 fibres were melt spun at 260 °C.",
+]
+
+
+class FakeCoreNLP:
+    """
+    Tokenizes like the server as far as the backend can tell: sentences end at
+    ., ! or ? followed by a space and at blank lines, and offsets are in UTF-16
+    code units of the whole request.
+    """
+    token_re = re.compile(r"\d+(?:\.\d+)?|\w+(?:-\w+)*|\S", re.UNICODE)
+    sentence_end_re = re.compile(r"(?<=[.!?]) +|\n\s*\n")
+
+    def __init__(self):
+        self.requests = []
+
+    @staticmethod
+    def java_offset(text, index):
+        return len(text[:index].encode("utf-16-le")) // 2
+
+    def annotate(self, text, properties=None):
+        self.requests.append(text)
+        sentences = []
+        start = 0
+        for end in [m.start() for m in self.sentence_end_re.finditer(text)] + [len(text)]:
+            tokens = [{"word": m.group(),
+                       "characterOffsetBegin": self.java_offset(text, start + m.start()),
+                       "characterOffsetEnd": self.java_offset(text, start + m.end())}
+                      for m in self.token_re.finditer(text[start:end])]
+            if tokens:
+                sentences.append({"index": len(sentences), "tokens": tokens})
+            start = end
+        # pycorenlp returns the raw body as a string when it cannot parse it; the backend takes both
+        return json.dumps({"sentences": sentences}) if len(self.requests) % 2 else {"sentences": sentences}
+
+
+def ner_records(backend):
+    pytest.importorskip("pycorenlp")
+    from annotators.polymer.utils.NER_utils import convert_to_NER_model_input_format
+    return convert_to_NER_model_input_format(PARAGRAPHS, backend=backend)
+
+
+def sentences_only(per_paragraph):
+    # drop the CoreNLP sentence index, which counts across the joined request
+    return [[[dict(token) for token in sentence["tokens"]] for sentence in sentences] for sentences in per_paragraph]
+
+
+@pytest.mark.parametrize("max_chars", [90000, 60])
+def test_batched_matches_per_paragraph(max_chars):
+    single_nlp, batched_nlp = FakeCoreNLP(), FakeCoreNLP()
+    single = CoreNLPBackend(single_nlp, batched=False).tokenize(PARAGRAPHS)
+    batched = CoreNLPBackend(batched_nlp, batched=True, max_chars=max_chars).tokenize(PARAGRAPHS)
+
+    assert len(single_nlp.requests) == len(PARAGRAPHS)
+    assert 1 <= len(batched_nlp.requests) < len(PARAGRAPHS)
+    assert sentences_only(batched) == sentences_only(single)
+    assert batched[2] == []
+    # offsets are UTF-16: "𝛼" and "🧪" count as two Java chars each
+    token = next(token for token in batched[1][0]["tokens"] if token["word"] == "🧪")
+    assert (token["characterOffsetBegin"], token["characterOffsetEnd"]) == (24, 26)
+
+
+def test_ner_records_match_per_paragraph():
+    single = ner_records(CoreNLPBackend(FakeCoreNLP(), batched=False))
+    batched = ner_records(CoreNLPBackend(FakeCoreNLP(), batched=True))
+    assert batched == single
+    assert [(r["doc_ID"], r["sent_ID"]) for r in batched] == [(1, 1), (1, 2), (2, 1), (2, 2), (4, 1), (4, 2), (5, 1)]
+    assert batched[2]["sentence"][:3] == ["The", "𝛼-relaxation", "of"]
+
+
+def test_cached_paragraphs_are_not_requested_again():
+    nlp = FakeCoreNLP()
+    backend = CoreNLPBackend(nlp, batched=True)
+    first = backend.tokenize(PARAGRAPHS[:2])
+    requests = len(nlp.requests)
+    second = backend.tokenize(PARAGRAPHS)
+    assert second[:2] == first
+    assert len(nlp.requests) == requests + 1
+    assert PARAGRAPHS[0] not in nlp.requests[-1]
@@ -5,14 +5,18 @@ import importlib.util
 import importlib.metadata as imd
 import importlib.util
 import io
+import json
 import os
 import sys
 import threading
+import time
 from dataclasses import dataclass, field
-from typing import Any, Dict, Type
+from typing import Any, Dict, Optional, Tuple, Type
 
 import yaml  # pip install pyyaml
 
+from utils.inference_broker import attach_broker, detach_broker, use_broker
+
 @dataclass
 class AnnotatorSpec:
     domain: str
@@ -26,6 +30,20 @@ class Config:
     version: int
     annotators: list[AnnotatorSpec]
 
+@dataclass
+class _PoolEntry:
+    instance: Any
+    cls: Type
+    base_kwargs: Dict[str, Any]
+    load_seconds: float
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+
 def _parse_config(raw: dict) -> Config:
     specs: list[AnnotatorSpec] = []
     for item in raw.get("annotators", []):
@@ -44,6 +62,12 @@ def _read_config(path: str) -> Config:
     with io.open(path, "r", encoding="utf-8") as f:
         return _parse_config(yaml.safe_load(f) or {})
 
+def _kwargs_key(kwargs: Dict[str, Any]) -> str:
+    """
+    Stable, hashable key for annotator kwargs (values may be nested dicts/lists).
+    """
+    return json.dumps(kwargs, sort_keys=True, default=repr)
+
 def _module_origin_mtime(module_name: str) -> float:
     """
     Returns the source file mtime for a module, or 0 if not found (eg. namespace pkg).
@@ -60,14 +84,28 @@ class HotAnnotatorRegistry:
     """
     Config-driven registry that hot-loads NEW modules and reloads CHANGED modules.
     No service restart required.
+
+    Annotator instances are kept warm in a per-process pool keyed by
+    (domain, kwargs), so model weights are loaded once per worker instead of
+    once per task. A pooled instance is dropped only when its class is
+    rebound (module reloaded) or its configured kwargs change.
+
+    With `broker` (or DOCORA_INFERENCE_BROKER=1) each pooled instance gets an
+    InferenceBroker, so concurrent tasks sharing it (thread/gevent worker
+    pools) have their _annotate calls coalesced into larger batches.
     """
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, pool: bool = True, broker: Optional[bool] = None):
         self._config_path = os.path.abspath(config_path)
         self._lock = threading.RLock()
         self._cfg_mtime = 0.0
         self._class_by_domain: Dict[str, Type] = {}
         self._kwargs_by_domain: Dict[str, Dict[str, Any]] = {}
         self._module_mtime: Dict[str, float] = {}  # module -> last seen mtime
+        self._pool_enabled = pool
+        self._pool: Dict[Tuple[str, str], _PoolEntry] = {}  # (domain, kwargs key) -> entry
+        self._stats: Dict[str, PoolStats] = {}
+        self._pool_pid = os.getpid()
+        self._broker_enabled = pool and use_broker(broker)
         # initial load
         self._maybe_reload(force=True)
 
@@ -80,15 +118,68 @@ class HotAnnotatorRegistry:
             except KeyError as e:
                 raise ValueError(f"Unknown annotator '{domain}'. "
                                  f"Available: {sorted(self._class_by_domain)}") from e
-            kwargs = dict(self._kwargs_by_domain.get(domain, {}))
-        kwargs.update(overrides)
-        return cls(**kwargs)
+            base_kwargs = dict(self._kwargs_by_domain.get(domain, {}))
+            kwargs = dict(base_kwargs)
+            kwargs.update(overrides)
+            if not self._pool_enabled:
+                return cls(**kwargs)
+
+            self._check_fork()
+            stats = self._stats.setdefault(domain, PoolStats())
+            key = (domain, _kwargs_key(kwargs))
+            entry = self._pool.get(key)
+            if entry is not None and entry.cls is cls:
+                stats.hits += 1
+                return entry.instance
+
+            # Build under the lock so concurrent callers never load the same model twice.
+            stats.misses += 1
+            start = time.perf_counter()
+            instance = cls(**kwargs)
+            if self._broker_enabled:
+                attach_broker(instance)
+            elapsed = time.perf_counter() - start
+            stats.load_seconds += elapsed
+            self._pool[key] = _PoolEntry(instance=instance, cls=cls,
+                                         base_kwargs=base_kwargs, load_seconds=elapsed)
+            return instance
 
     def available_domains(self) -> list[str]:
         self._maybe_reload()
         with self._lock:
             return sorted(self._class_by_domain)
 
+    def evict(self, domain: Optional[str] = None) -> int:
+        """
+        Drop pooled instances for `domain` (or all domains). Returns the number evicted.
+        """
+        with self._lock:
+            keys = [k for k in self._pool if domain is None or k[0] == domain]
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-domain pool counters: hits, misses, evictions, cumulative load time
+        and the number of instances currently warm.
+        """
+        with self._lock:
+            out: Dict[str, Dict[str, Any]] = {}
+            for domain, st in self._stats.items():
+                out[domain] = {
+                    "hits": st.hits,
+                    "misses": st.misses,
+                    "evictions": st.evictions,
+                    "load_seconds": round(st.load_seconds, 3),
+                    "warm": sum(1 for k in self._pool if k[0] == domain),
+                }
+                brokers = [e.instance._inference_broker.stats() for k, e in self._pool.items()
+                           if k[0] == domain and hasattr(e.instance, "_inference_broker")]
+                if brokers:
+                    out[domain]["broker"] = brokers
+            return out
+
     # ---------- internals ----------
     def _maybe_reload(self, force: bool = False):
         """
@@ -112,6 +203,7 @@ class HotAnnotatorRegistry:
                 # atomic swap
                 self._class_by_domain = new_classes
                 self._kwargs_by_domain = new_kwargs
+                self._invalidate_stale()
 
             # Even without config edits, developer might edit code on disk:
             # if any module backing files changed, reload and rebuild classes.
@@ -125,6 +217,36 @@ class HotAnnotatorRegistry:
                         continue
                     reb_classes[spec.domain] = self._get_class(spec.module, spec.cls)
                 self._class_by_domain = reb_classes  # keep existing kwargs
+                self._invalidate_stale()
+
+    def _invalidate_stale(self):
+        """
+        Evict pooled instances whose domain was disabled/removed, whose class
+        object was rebound by a module reload, or whose configured kwargs changed.
+        """
+        for key, entry in list(self._pool.items()):
+            domain = key[0]
+            cls = self._class_by_domain.get(domain)
+            if (cls is not entry.cls
+                    or self._kwargs_by_domain.get(domain, {}) != entry.base_kwargs):
+                self._drop(key)
+
+    def _drop(self, key: Tuple[str, str]):
+        entry = self._pool.pop(key, None)
+        if entry is not None:
+            detach_broker(entry.instance)
+        self._stats.setdefault(key[0], PoolStats()).evictions += 1
+
+    def _check_fork(self):
+        """
+        Instances (and their CUDA contexts) must not be shared across a fork;
+        a child process starts with an empty pool.
+        """
+        pid = os.getpid()
+        if pid != self._pool_pid:
+            self._pool = {}
+            self._stats = {}
+            self._pool_pid = pid
 
     def _config_changed(self) -> bool:
         try:
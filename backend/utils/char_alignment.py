@@ -0,0 +1,219 @@
+import bisect
+import difflib
+import os
+import re
+
+import numpy as np
+
+ALIGNER_ENV = "DOCORA_CHAR_ALIGNER"
+_WORD_RE = re.compile(r"\w+")
+
+
+def _common_prefix_len(a, i, b, j):
+    # Length of the common run a[i:], b[j:], found with C-level slice
+    # comparisons (galloping + bisection) instead of a per-character loop.
+    limit = min(len(a) - i, len(b) - j)
+    if limit <= 0 or a[i] != b[j]:
+        return 0
+    lo, step = 1, 1
+    while lo < limit:
+        hi = min(lo + step, limit)
+        if a[i + lo:i + hi] != b[j + lo:j + hi]:
+            break
+        lo, step = hi, step * 2
+    else:
+        return limit
+    # a[i:i+lo] matches and the mismatch lies in [lo, hi)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[i + lo:i + mid] == b[j + lo:j + mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _common_suffix_len(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _myers_blocks(a, b, max_edits):
+    """
+    Matching blocks (i, j, size) of a shortest edit script between a and b
+    (Myers' O(ND) greedy algorithm), or None if more than max_edits edits
+    are needed.
+    """
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(v[:])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            x += _common_prefix_len(a, x, b, y)
+            v[offset + k] = x
+            if x >= n and x - k >= m:
+                return _backtrack(trace, offset, n, m)
+    return None
+
+
+def _backtrack(trace, offset, x, y):
+    blocks = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[offset + prev_k]
+        prev_y = prev_x - prev_k
+        # the snake ends at (x, y) and starts right after the edit from (prev_x, prev_y)
+        size = min(x - max(prev_x, 0), y - max(prev_y, 0))
+        if size > 0:
+            blocks.append((x - size, y - size, size))
+        x, y = prev_x, prev_y
+    blocks.reverse()
+    return blocks
+
+
+def _opcodes(blocks, len_a, len_b):
+    # Same grouping as difflib.SequenceMatcher.get_opcodes over matching blocks.
+    merged = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+    merged.append((len_a, len_b, 0))
+
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in merged:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def _unique_words(text):
+    # A word keyed by its neighbours: word trigrams are nearly always unique in
+    # prose, so even common words ("the", "of") become usable anchors.
+    words = [(m.group(), m.start()) for m in _WORD_RE.finditer(text)]
+    positions = {}
+    for idx, (word, start) in enumerate(words):
+        key = (words[idx - 1][0] if idx else None, word,
+               words[idx + 1][0] if idx + 1 < len(words) else None)
+        positions.setdefault(key, []).append(start)
+    return {key: starts[0] for key, starts in positions.items() if len(starts) == 1}
+
+
+def _anchors(a, b):
+    """
+    Words whose trigram occurs exactly once in each text, reduced to the
+    longest chain that is increasing in both (patience diff). Returns
+    [(i, j, size)].
+    """
+    unique_a, unique_b = _unique_words(a), _unique_words(b)
+    pairs = sorted((unique_a[k], unique_b[k], len(k[1])) for k in unique_a.keys() & unique_b.keys())
+    tails, tail_idx, prev = [], [], [None] * len(pairs)
+    for idx, (_, j, _) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_idx.append(idx)
+        else:
+            tails[pos] = j
+            tail_idx[pos] = idx
+        prev[idx] = tail_idx[pos - 1] if pos else None
+    chain = []
+    idx = tail_idx[-1] if tail_idx else None
+    while idx is not None:
+        chain.append(pairs[idx])
+        idx = prev[idx]
+    chain.reverse()
+    return chain
+
+
+def _segment_blocks(a, b, max_edits):
+    # common prefix/suffix first, Myers' diff only on what is left in between
+    prefix = _common_prefix_len(a, 0, b, 0)
+    suffix = _common_suffix_len(a[prefix:], b[prefix:], min(len(a), len(b)) - prefix)
+    middle = _myers_blocks(a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], max_edits)
+    if middle is None:
+        return None
+    blocks = [(0, 0, prefix)] if prefix else []
+    blocks += [(i + prefix, j + prefix, size) for i, j, size in middle]
+    if suffix:
+        blocks.append((len(a) - suffix, len(b) - suffix, suffix))
+    return blocks
+
+
+def align_opcodes(model_output_text, original_text, max_edits=512):
+    """
+    Opcodes (as in difflib.SequenceMatcher.get_opcodes) turning
+    model_output_text into original_text.
+
+    The two texts are normally identical up to sparse whitespace/normalization
+    differences, so they are cut at words that are unique in context in both
+    (see _anchors), and each gap is aligned by anchoring its common
+    prefix/suffix and running Myers' diff on the rest. A gap that needs more than max_edits edits falls back to
+    difflib for the whole text, as does DOCORA_CHAR_ALIGNER=difflib.
+    """
+    a, b = model_output_text, original_text
+    if os.environ.get(ALIGNER_ENV) == "difflib":
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+    if a == b:
+        return [('equal', 0, len(a), 0, len(b))] if a else []
+
+    blocks = []
+    i = j = 0
+    for ai, bj, size in _anchors(a, b) + [(len(a), len(b), 0)]:
+        gap = _segment_blocks(a[i:ai], b[j:bj], max_edits)
+        if gap is None:
+            return difflib.SequenceMatcher(None, a, b).get_opcodes()
+        blocks += [(gi + i, gj + j, gsize) for gi, gj, gsize in gap]
+        if size:
+            blocks.append((ai, bj, size))
+        i, j = ai + size, bj + size
+    return _opcodes(blocks, len(a), len(b))
+
+
+def character_index_map(model_output_text, original_text, debug=False):
+    """
+    For every character of model_output_text, the index of the character of
+    original_text it came from, as an int64 array. Characters replaced by a
+    shorter run or deleted map to the last aligned original index (-1 if none).
+    """
+    mapping = np.full(len(model_output_text), -1, dtype=np.int64)
+    o_idx = -1  # last known index in original_text
+    for tag, i1, i2, j1, j2 in align_opcodes(model_output_text, original_text):
+        if debug:
+            print(f"tag: {tag}, i1: {i1}, i2: {i2}, j1: {j1}, j2: {j2}")
+        if tag == 'equal' or tag == 'replace':
+            paired = min(i2 - i1, j2 - j1)
+            mapping[i1:i1 + paired] = np.arange(j1, j1 + paired)
+            o_idx = j1 + paired - 1
+            mapping[i1 + paired:i2] = o_idx
+        elif tag == 'delete':
+            mapping[i1:i2] = o_idx
+    return mapping
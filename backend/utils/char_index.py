@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# check_character_inside_bounding_rect accepts characters whose top/bottom lie
+# within this distance of the selection's; the index bands candidates on it.
+Y_TOLERANCE = 3
+X_TOLERANCE = 0.05
+
+
+def positions_version(user_notes):
+    """
+    Digest of the notes that move character boxes (paragraph edits and
+    reorders); other notes leave the positions of a document unchanged.
+    """
+    moving = [note for note in user_notes if note.get("target") in ("para", "all")]
+    return hashlib.sha1(json.dumps(moving, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CharacterIndex:
+    """
+    Character boxes of a document bucketed by page and paragraph, each bucket
+    sorted by y1, so a selection only touches the characters in its own line
+    band instead of every character of the document.
+    """
+    def __init__(self, char_positions):
+        self.n_paragraphs = len(char_positions)
+        self.has_empty_paragraph = any(len(char_list) == 0 for char_list in char_positions)
+        self.first_sizes = []
+        self.pages = {}  # page -> {para_id: (y1, y2, x1, x2, idx)}, all sorted by y1
+        for para_id, char_list in enumerate(char_positions):
+            if not char_list:
+                self.first_sizes.append(None)
+                continue
+            self.first_sizes.append((float(char_list[0]["width"]), float(char_list[0]["height"])))
+            boxes = np.array([[c["x1"], c["y1"], c["x2"], c["y2"], c["pageNumber"]] for c in char_list],
+                             dtype=np.float64)
+            page_numbers = boxes[:, 4].astype(np.int64)
+            for page in np.unique(page_numbers):
+                idx = np.flatnonzero(page_numbers == page)
+                idx = idx[np.argsort(boxes[idx, 1], kind="stable")]
+                self.pages.setdefault(int(page), {})[para_id] = (
+                    boxes[idx, 1], boxes[idx, 3], boxes[idx, 0], boxes[idx, 2], idx)
+
+    def overlapping(self, para_id, page, x1, y1, x2, y2):
+        """Indices of the paragraph's characters inside the (scaled) rect, same test as check_character_inside_bounding_rect."""
+        bucket = self.pages.get(page, {}).get(para_id)
+        if bucket is None:
+            return np.empty(0, dtype=np.int64)
+        c_y1, c_y2, c_x1, c_x2, idx = bucket
+        # a slightly wider band; the exact strict tolerance is applied below
+        lo = np.searchsorted(c_y1, y1 - Y_TOLERANCE - 1, side="left")
+        hi = np.searchsorted(c_y1, y1 + Y_TOLERANCE + 1, side="right")
+        c_y1, c_y2, c_x1, c_x2 = c_y1[lo:hi], c_y2[lo:hi], c_x1[lo:hi], c_x2[lo:hi]
+        inside = ((x1 - c_x2 <= X_TOLERANCE) & (x2 - c_x1 >= -X_TOLERANCE)
+                  & (y1 <= c_y2) & (y2 >= c_y1)
+                  & (np.abs(y1 - c_y1) < Y_TOLERANCE) & (np.abs(y2 - c_y2) < Y_TOLERANCE))
+        return idx[lo:hi][inside]
+
+    def paragraphs_on(self, pages):
+        para_ids = set()
+        for page in pages:
+            para_ids.update(self.pages.get(page, {}))
+        return sorted(para_ids)
+
+
+class CharacterIndexCache:
+    """Process-local LRU of CharacterIndex keyed by (document id, positions version)."""
+    def __init__(self, max_entries=16):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key, char_positions):
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+        index = CharacterIndex(char_positions)
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+character_index_cache = CharacterIndexCache()
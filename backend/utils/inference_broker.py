@@ -0,0 +1,181 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from utils.inference_cache import attributable
+
+BROKER_ENV = "DOCORA_INFERENCE_BROKER"
+BROKER_MAX_BATCH_ENV = "DOCORA_BROKER_MAX_BATCH"
+BROKER_MAX_WAIT_ENV = "DOCORA_BROKER_MAX_WAIT_MS"
+
+
+def use_broker(flag=None):
+    if flag is None:
+        flag = os.environ.get(BROKER_ENV, "0")
+    if isinstance(flag, str):
+        return flag.strip().lower() in ("1", "true", "yes", "on")
+    return bool(flag)
+
+
+@dataclass
+class _Request:
+    paragraphs: List[str]
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class BrokerStats:
+    requests: int = 0
+    paragraphs: int = 0
+    batches: int = 0
+    isolated: int = 0
+    fallbacks: int = 0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "paragraphs": self.paragraphs,
+            "batches": self.batches,
+            "isolated": self.isolated,
+            "fallbacks": self.fallbacks,
+            "paragraphs_per_batch": round(self.paragraphs / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class InferenceBroker:
+    """
+    Coalesces `_annotate` calls made concurrently on one annotator instance
+    (e.g. Celery tasks in a thread/gevent pool sharing a pooled model) into
+    larger batches.
+
+    A single dispatcher thread takes the first waiting request, keeps
+    collecting until `max_batch` paragraphs are queued or `max_wait_ms` has
+    passed, runs the wrapped `_annotate` once over all of them and scatters
+    the per-paragraph outputs back to the callers. Requests holding a
+    paragraph without any word run on their own instead, since such a
+    paragraph can come back without an output and would shift the outputs of
+    everyone after it. If the combined outputs still cannot be split per
+    paragraph, or the combined call fails, each request is re-run on its own
+    so callers see exactly what a direct call returns.
+    """
+    def __init__(self, annotate, max_batch=64, max_wait_ms=20):
+        self._annotate = annotate
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats = BrokerStats()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="inference-broker", daemon=True)
+        self._thread.start()
+
+    def annotate(self, paragraphs):
+        """Drop-in replacement for annotator._annotate(paragraphs)."""
+        if self._closed or threading.current_thread() is self._thread:
+            return self._annotate(paragraphs)
+        request = _Request(list(paragraphs))
+        self._queue.put(request)
+        return request.future.result()
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+
+    def stats(self):
+        return self._stats.as_dict()
+
+    def _collect(self, first):
+        batch, size = [first], len(first.paragraphs)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # let _run see the shutdown after this batch
+                break
+            batch.append(request)
+            size += len(request.paragraphs)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            self._stats.requests += len(batch)
+            self._stats.paragraphs += sum(len(r.paragraphs) for r in batch)
+            self._stats.batches += 1
+            if len(batch) == 1:
+                self._run_alone(first)
+            else:
+                self._run_batch(batch)
+
+    def _run_alone(self, request):
+        try:
+            request.future.set_result(self._annotate(request.paragraphs))
+        except BaseException as e:
+            request.future.set_exception(e)
+
+    def _run_batch(self, batch):
+        combined = []
+        for request in batch:
+            if all(attributable(p) for p in request.paragraphs):
+                combined.append(request)
+            else:
+                self._stats.isolated += 1
+                self._run_alone(request)
+        if len(combined) <= 1:
+            for request in combined:
+                self._run_alone(request)
+            return
+        paragraphs = [p for request in combined for p in request.paragraphs]
+        try:
+            outputs = self._annotate(paragraphs)
+            split = all(len(output) == len(paragraphs) for output in outputs)
+        except Exception:
+            split = False
+        if not split:
+            self._stats.fallbacks += 1
+            for request in combined:
+                self._run_alone(request)
+            return
+        start = 0
+        for request in combined:
+            end = start + len(request.paragraphs)
+            request.future.set_result(tuple(list(output[start:end]) for output in outputs))
+            start = end
+
+
+def attach_broker(annotator: Any, max_batch=None, max_wait_ms=None) -> Optional[InferenceBroker]:
+    """
+    Route annotator._annotate through an InferenceBroker. The method is
+    shadowed on the instance, so callers keep calling _annotate as before.
+    Annotators that are not paragraph-local (BaseAnnotator.paragraph_local)
+    are left alone: joining other requests' paragraphs would change their output.
+    """
+    if not getattr(annotator, "paragraph_local", True):
+        return None
+    if max_batch is None:
+        max_batch = int(os.environ.get(BROKER_MAX_BATCH_ENV, 64))
+    if max_wait_ms is None:
+        max_wait_ms = float(os.environ.get(BROKER_MAX_WAIT_ENV, 20))
+    broker = InferenceBroker(annotator._annotate, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    annotator._annotate = broker.annotate
+    annotator._inference_broker = broker
+    return broker
+
+
+def detach_broker(annotator: Any):
+    broker = annotator.__dict__.pop("_inference_broker", None)
+    if broker is not None:
+        annotator.__dict__.pop("_annotate", None)
+        broker.close()
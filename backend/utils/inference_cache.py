@@ -0,0 +1,187 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+INFERENCE_CACHE_ENV = "DOCORA_INFERENCE_CACHE"
+INFERENCE_CACHE_SIZE_ENV = "DOCORA_INFERENCE_CACHE_MAX_ENTRIES"
+DEFAULT_CACHE_PATH = "cache/inference_cache.sqlite3"
+
+
+def checkpoint_fingerprint(*paths):
+    """
+    Cheap identity of checkpoint files (path, size, mtime) - hashing multi-GB
+    weights on every call would cost more than the inference it saves.
+    """
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def paragraph_key(domain, annotator_name, fingerprint, paragraph):
+    # Exact paragraph text: the cached outputs carry character offsets into it,
+    # so any normalization beyond this would make them point at the wrong span.
+    raw = json.dumps([domain, annotator_name, fingerprint, paragraph])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class InferenceCache:
+    """
+    Persistent, size-bounded cache of per-paragraph annotator outputs in
+    SQLite, shared by every Celery worker on the host (WAL mode, one
+    connection per thread). Least recently used entries are evicted once
+    max_entries is exceeded; hit/miss counters are stored alongside so
+    `stats()` reports the hit rate across workers.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, conn, name, amount):
+        if amount:
+            conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def get_many(self, keys):
+        """Return {key: value} for the cached keys; the rest count as misses."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._connection() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self._count(conn, "hits", len(found))
+            self._count(conn, "misses", len(keys) - len(found))
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)",
+                             [(key, json.dumps(value), now) for key, value in items.items()])
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM entries WHERE key IN "
+                             "(SELECT key FROM entries ORDER BY last_used LIMIT ?)", (excess,))
+                self._count(conn, "evictions", excess)
+
+    def stats(self):
+        with self._connection() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
+
+
+def create_inference_cache():
+    """
+    Cache at DOCORA_INFERENCE_CACHE (default cache/inference_cache.sqlite3),
+    or None when it is set to "off".
+    """
+    path = os.environ.get(INFERENCE_CACHE_ENV, DEFAULT_CACHE_PATH)
+    if path.lower() in ("off", "none", "0", ""):
+        return None
+    return InferenceCache(path, max_entries=int(os.environ.get(INFERENCE_CACHE_SIZE_ENV, 200000)))
+
+
+def attributable(text):
+    # Paragraphs without any word can come back without an output (the polymer
+    # annotator drops paragraphs that tokenize to no sentence).
+    return any(c.isalnum() for c in text)
+
+
+def annotate_with_cache(annotator, domain, paragraphs, cache):
+    """
+    annotator._annotate(paragraphs), sending only paragraphs without a cached
+    output to the model. Returns (model_output, ner_model_output) in input order.
+
+    Outputs are cached per paragraph, which assumes the annotator is
+    paragraph-local (BaseAnnotator.paragraph_local): one output per paragraph,
+    computed from that paragraph alone. Other annotators bypass the cache.
+    """
+    if cache is None or not paragraphs or not getattr(annotator, "paragraph_local", True):
+        return annotator._annotate(paragraphs)
+
+    cls = type(annotator)
+    annotator_name, fingerprint = f"{cls.__module__}.{cls.__qualname__}", annotator.cache_fingerprint()
+    keys = [paragraph_key(domain, annotator_name, fingerprint, text) for text in paragraphs]
+    cached = cache.get_many(keys)
+    misses = OrderedDict((key, text) for key, text in zip(keys, paragraphs) if key not in cached)
+    print(f"inference cache: {sum(key in cached for key in keys)}/{len(paragraphs)} paragraphs cached")
+
+    if len(misses) < len(paragraphs) and not all(attributable(text) for text in misses.values()):
+        # the outputs of a subset might not line up with its paragraphs, so
+        # annotate the whole list once rather than risk running the misses twice
+        model_output, ner_model_output = annotator._annotate(paragraphs)
+        if len(model_output) == len(ner_model_output) == len(paragraphs):
+            cache.put_many({key: [rel, ner] for key, rel, ner in zip(keys, model_output, ner_model_output)
+                            if key in misses})
+        return model_output, ner_model_output
+
+    if misses:
+        model_output, ner_model_output = annotator._annotate(list(misses.values()))
+        if len(model_output) != len(misses) or len(ner_model_output) != len(misses):
+            if len(misses) == len(paragraphs):
+                return model_output, ner_model_output
+            raise ValueError("{} returned {} outputs for {} paragraphs".format(
+                annotator_name, len(model_output), len(misses)))
+        computed = {key: [rel, ner] for key, rel, ner in zip(misses, model_output, ner_model_output)}
+        cache.put_many(computed)
+        cached.update(computed)
+
+    # repeated paragraphs (boilerplate) must not share one mutable output
+    seen = Counter()
+    model_output, ner_model_output = [], []
+    for key in keys:
+        rel, ner = cached[key]
+        if seen[key]:
+            rel, ner = copy.deepcopy(rel), copy.deepcopy(ner)
+        seen[key] += 1
+        model_output.append(rel)
+        ner_model_output.append(ner)
+    return model_output, ner_model_output
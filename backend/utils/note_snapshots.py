@@ -0,0 +1,104 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+SNAPSHOT_INTERVAL_ENV = "DOCORA_NOTE_SNAPSHOT_INTERVAL"
+
+
+def _note_digests(user_notes, targets=None):
+    """
+    Chained digests of the note log: digests[i] identifies the notes among
+    user_notes[:i + 1] whose target is in `targets` (all notes when None), so a
+    snapshot taken after n notes is only reused when none of the first n notes
+    that the replay applies has changed. Notes the replay skips, such as the
+    edit-status note that /mark-edit rewrites in place, do not invalidate it.
+    """
+    digests = []
+    running = hashlib.sha1()
+    for note in user_notes:
+        if targets is None or note.get("target") in targets:
+            running.update(pickle.dumps(note, protocol=pickle.HIGHEST_PROTOCOL))
+        digests.append(running.hexdigest())
+    return digests
+
+
+class NoteSnapshotStore:
+    """
+    Materialized states of a user-note replay, taken every `interval` notes.
+
+    `replay(key, kind, user_notes, base, apply_notes, targets)` restores the newest
+    snapshot whose note prefix still matches and applies only the remaining
+    tail, so the cost follows the notes added since the last snapshot instead
+    of the whole editing session. Snapshots are pickled, which keeps them
+    independent of whatever the caller later does with the returned state.
+    A snapshot is tied to a fingerprint of `base`, so rewriting the document
+    (e.g. a re-run) never resurrects stale states.
+    """
+    def __init__(self, interval=None, max_keys=64, max_snapshots=4):
+        if interval is None:
+            interval = int(os.environ.get(SNAPSHOT_INTERVAL_ENV, 50))
+        self.interval = interval
+        self._max_keys = max_keys
+        self._max_snapshots = max_snapshots
+        self._entries = OrderedDict()  # (key, kind, base digest) -> [(n, note digest, blob)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def replay(self, key, kind, user_notes, base, apply_notes, targets=None):
+        """
+        Return apply_notes(user_notes, base), resuming from a snapshot when one
+        matches. `apply_notes(notes, state)` must return the new state and only
+        act on notes whose target is in `targets` (None: any note).
+        """
+        if self.interval <= 0 or len(user_notes) < self.interval:
+            return apply_notes(user_notes, base)
+
+        base_digest = hashlib.sha1(pickle.dumps(base, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+        entry_key = (key, kind, base_digest)
+        digests = _note_digests(user_notes, targets)
+
+        start, state = 0, base
+        with self._lock:
+            snapshots = self._entries.get(entry_key, [])
+            for n, digest, blob in reversed(snapshots):
+                if n <= len(user_notes) and digests[n - 1] == digest:
+                    start, state = n, pickle.loads(blob)
+                    break
+            if start:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        taken = {n for n, _, _ in snapshots}
+        boundary = (start // self.interval + 1) * self.interval
+        while boundary <= len(user_notes):
+            state = apply_notes(user_notes[start:boundary], state)
+            start = boundary
+            if boundary not in taken:
+                self._store(entry_key, boundary, digests[boundary - 1],
+                            pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+            boundary += self.interval
+        return apply_notes(user_notes[start:], state)
+
+    def _store(self, entry_key, n, digest, blob):
+        with self._lock:
+            snapshots = self._entries.setdefault(entry_key, [])
+            snapshots[:] = [s for s in snapshots if s[0] != n]
+            snapshots.append((n, digest, blob))
+            snapshots.sort(key=lambda s: s[0])
+            del snapshots[:-self._max_snapshots]
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self._max_keys:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[entry_key]
+
+
+note_snapshots = NoteSnapshotStore()
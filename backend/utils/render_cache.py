@@ -0,0 +1,75 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def _digest(value):
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def render_version(document, update=None):
+    """
+    Fingerprint of everything a /get-document render depends on: the user-note
+    log and stored relations of the update, and the document's own state
+    (status/counters change when a Celery task rewrites it). Writes done by
+    Celery workers in another process therefore still produce a new version.
+    """
+    parts = [_digest(document.get_infor()), str(len(document.get_relations() or []))]
+    if update is not None:
+        relation = update.Relation
+        if isinstance(relation, dict) and "data" in relation:
+            relation = relation["data"]
+        parts += [_digest(update.UserNote), _digest(relation)]
+    return "|".join(parts)
+
+
+class RenderCache:
+    """
+    In-process LRU of rendered /get-document outputs keyed by
+    (document_id, update_id, variant, version). `variant` names the route that
+    rendered the output ("latest" for POST /get-document/{id}, "update" for
+    GET /get-document/{id}/{update_id}): the two render the same update from
+    different inputs, so one must not serve the other. Routers that write an update call
+    `invalidate(document_id)`; the version guards against writes made elsewhere.
+    Cached outputs are shared between requests and must not be mutated.
+    """
+    def __init__(self, max_entries=32):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, document_id, update_id, variant, version):
+        key = (document_id, update_id, variant, version)
+        with self._lock:
+            output = self._entries.get(key)
+            if output is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return output
+
+    def set(self, document_id, update_id, variant, version, output):
+        with self._lock:
+            # only the newest render of a (document, update, variant) is worth keeping
+            for key in [k for k in self._entries if k[:3] == (document_id, update_id, variant)]:
+                del self._entries[key]
+            self._entries[(document_id, update_id, variant, version)] = output
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, document_id, update_id=None):
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == document_id and (update_id is None or key[1] == update_id):
+                    del self._entries[key]
+
+
+render_cache = RenderCache()
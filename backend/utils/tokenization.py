@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Joined paragraphs are separated by a blank line: CoreNLP's default
+# ssplit.newlineIsSentenceBreak=two always ends a sentence there, so a batched
+# request splits exactly like one request per paragraph.
+PARAGRAPH_SEPARATOR = "\n\n"
+TOKENIZER_ENV = "DOCORA_TOKENIZER"
+
+
+def _java_len(text):
+    # CoreNLP reports offsets in UTF-16 code units (Java chars), not Python code points.
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class TokenizationBackend:
+    """
+    Sentence splitting + tokenization for model input building.
+
+    `tokenize(paragraphs)` returns, per paragraph, a CoreNLP-shaped list of
+    sentences: [{"tokens": [{"word", "characterOffsetBegin", "characterOffsetEnd"}]}]
+    with offsets relative to the paragraph. Results are cached by a hash of the
+    paragraph text, so only unseen paragraphs reach the tokenizer.
+    Cached sentence lists are shared and must be treated as read-only.
+    `name` identifies the tokenization (see create_backend) in cache fingerprints.
+    """
+    name = None
+
+    def __init__(self, cache_size=4096):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def tokenize(self, paragraphs):
+        keys = [_text_key(text) for text in paragraphs]
+        results = [None] * len(paragraphs)
+        missing = OrderedDict()  # key -> paragraph text, deduplicated
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, paragraphs[i])
+                    self.misses += 1
+
+        if missing:
+            computed = dict(zip(missing.keys(), self._tokenize_batch(list(missing.values()))))
+            with self._lock:
+                for key, sentences in computed.items():
+                    self._cache[key] = sentences
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = computed[key]
+        return results
+
+    def _tokenize_batch(self, paragraphs):
+        raise NotImplementedError
+
+
+class CoreNLPBackend(TokenizationBackend):
+    """
+    Tokenizes through a CoreNLP server. In batched mode paragraphs are joined
+    into as few requests as `max_chars` allows (the server rejects documents
+    above its -maxCharLength) and sentences are routed back by character offset.
+    """
+    def __init__(self, nlp, batched=True, max_chars=90000, cache_size=4096):
+        super().__init__(cache_size=cache_size)
+        self.nlp = nlp
+        self.batched = batched
+        self.name = "corenlp" if batched else "corenlp-single"
+        self.max_chars = max_chars
+
+    def _annotate(self, text):
+        output = self.nlp.annotate(text, properties={
+            'annotators': 'tokenize',
+            'outputFormat': 'json'
+        })
+        if type(output) == str:
+            output = json.loads(output)
+        return output['sentences']
+
+    def _tokenize_batch(self, paragraphs):
+        if not self.batched:
+            return [self._annotate(text) for text in paragraphs]
+
+        results = []
+        chunk, chunk_len = [], 0
+        for text in paragraphs:
+            if chunk and chunk_len + len(text) > self.max_chars:
+                results.extend(self._annotate_joined(chunk))
+                chunk, chunk_len = [], 0
+            chunk.append(text)
+            chunk_len += len(text) + len(PARAGRAPH_SEPARATOR)
+        if chunk:
+            results.extend(self._annotate_joined(chunk))
+        return results
+
+    def _annotate_joined(self, paragraphs):
+        starts = []
+        pos = 0
+        for text in paragraphs:
+            starts.append(pos)
+            pos += _java_len(text) + len(PARAGRAPH_SEPARATOR)
+        sentences = self._annotate(PARAGRAPH_SEPARATOR.join(paragraphs))
+
+        per_paragraph = [[] for _ in paragraphs]
+        para_idx = 0
+        for sentence in sentences:
+            if not sentence['tokens']:
+                continue
+            begin = int(sentence['tokens'][0]['characterOffsetBegin'])
+            while para_idx + 1 < len(paragraphs) and begin >= starts[para_idx + 1]:
+                para_idx += 1
+            shift = starts[para_idx]
+            tokens = []
+            for token in sentence['tokens']:
+                token = dict(token)
+                token['characterOffsetBegin'] = int(token['characterOffsetBegin']) - shift
+                token['characterOffsetEnd'] = int(token['characterOffsetEnd']) - shift
+                tokens.append(token)
+            per_paragraph[para_idx].append({'tokens': tokens})
+        return per_paragraph
+
+
+class SimpleBackend(TokenizationBackend):
+    """
+    In-process regex tokenizer: a dependency-free stand-in for CoreNLP in tests
+    and offline runs. Splits sentences on ., ! or ? followed by whitespace and
+    an upper-case letter or digit, and on blank lines.
+    """
+    name = "simple"
+    _token_re = re.compile(r"\d+(?:[.,]\d+)*|\w+(?:[-']\w+)*|[^\w\s]", re.UNICODE)
+    _sentence_end_re = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])|\n\s*\n")
+
+    def _tokenize_batch(self, paragraphs):
+        return [self._tokenize_paragraph(text) for text in paragraphs]
+
+    def _tokenize_paragraph(self, text):
+        sentences = []
+        start = 0
+        bounds = [m.start() for m in self._sentence_end_re.finditer(text)] + [len(text)]
+        for end in bounds:
+            tokens = [{'word': m.group(), 'characterOffsetBegin': start + m.start(),
+                       'characterOffsetEnd': start + m.end()}
+                      for m in self._token_re.finditer(text[start:end])]
+            if tokens:
+                sentences.append({'tokens': tokens})
+            start = end
+        return sentences
+
+
+def create_backend(nlp=None, name=None):
+    """
+    Build the backend selected by `name` or the DOCORA_TOKENIZER env setting:
+    "corenlp" (batched, default), "corenlp-single" (one request per paragraph)
+    or "simple" (in-process stand-in).
+    """
+    name = name or os.environ.get(TOKENIZER_ENV, "corenlp")
+    if name == "simple":
+        return SimpleBackend()
+    if name == "corenlp-single":
+        return CoreNLPBackend(nlp, batched=False)
+    return CoreNLPBackend(nlp, batched=True)
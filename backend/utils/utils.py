@@ -9,6 +9,8 @@ import pymupdf
 # import fitz
 import numpy as np
 from schemas.document import Rect
+from utils.note_snapshots import note_snapshots
+from utils.char_index import CharacterIndex, character_index_cache
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -298,11 +300,8 @@ def generate_id():
     return unique_id
 
 def reorder_all(new_order, list_object):
-    copy_list_object = copy.deepcopy(list_object)
-    new_list_object = []
-    for index in new_order:
-        new_list_object.append(copy_list_object[index])
-    return new_list_object
+    # new_order is a permutation, so the items can be moved rather than copied
+    return [list_object[index] for index in new_order]
 
 def execute_one_note_on_entities(user_note,entities):
     actions = user_note["action"]
@@ -338,7 +337,17 @@ def execute_one_note_on_entities(user_note,entities):
                                                             ]
         return entities
     
-def execute_user_note_on_entities(user_notes, entities):
+# note targets each replay acts on; snapshots of a replay only depend on these notes
+ENTITY_NOTE_TARGETS = ("ent", "all")
+PARAGRAPH_NOTE_TARGETS = ("para", "all")
+RELATION_NOTE_TARGETS = ("relation", "edit_status", "all", "ent", "event")
+
+def execute_user_note_on_entities(user_notes, entities, snapshot_key=None):
+    if snapshot_key is not None:
+        return note_snapshots.replay(snapshot_key, "entities", user_notes, entities, _replay_notes_on_entities, ENTITY_NOTE_TARGETS)
+    return _replay_notes_on_entities(user_notes, entities)
+
+def _replay_notes_on_entities(user_notes, entities):
     for note in user_notes:
         if note["target"]=="ent":
             entities = execute_one_note_on_entities(note,entities)
@@ -349,8 +358,9 @@ def execute_user_note_on_entities(user_notes, entities):
     return entities
 
 def execute_one_note_on_paragraphs(user_note, paragraphs, old_bboxs, change_ids):
-    new_para = copy.deepcopy(paragraphs)
-    new_bbox = copy.deepcopy(old_bboxs)
+    # only the edited slots are replaced, the other paragraphs/boxes are shared
+    new_para = list(paragraphs)
+    new_bbox = list(old_bboxs)
     for para in user_note["content"]:
         # print(para)
         para_id = para["para_id"]
@@ -362,26 +372,37 @@ def execute_one_note_on_paragraphs(user_note, paragraphs, old_bboxs, change_ids)
     return new_para, new_bbox, change_ids
 
 def execute_one_note_on_event(user_note, wrapper):
-    new_wrapper = copy.deepcopy(wrapper)
+    new_wrapper = copy.copy(wrapper)
     para_id = user_note["content"]["para_id"]
     event_id = user_note["content"]["event_id"]
     if user_note["action"] =="update":
+        new_wrapper = copy.deepcopy(wrapper)
         for index, event in enumerate(new_wrapper.get("events_info",{}).get("event",[])):
             event_id, trigger_id, arguments = event
             if event_id == event_id:
                 new_wrapper.get("events_info",{}).get("event",[])[index][2] = user_note["content"]["new_arguments"]
                 new_wrapper.get("events_info",{}).get("event",[])[index][1] = user_note["content"]["new_trigger_id"]
     if user_note["action"] =="delete":
-        new_wrapper[para_id]["events_info"]["events"] = list(filter(lambda e: e[0] != event_id, wrapper[para_id]["events_info"].get("events",[])))
+        new_para = dict(wrapper[para_id])
+        new_para["events_info"] = dict(new_para["events_info"])
+        new_para["events_info"]["events"] = list(filter(lambda e: e[0] != event_id, wrapper[para_id]["events_info"].get("events",[])))
+        new_wrapper[para_id] = new_para
     return new_wrapper
 
-def execute_user_note_on_paragraphs(user_notes, paragraphs, old_bboxs,para_data=None):
-    change_ids = []
-    # changed_para = []
+def execute_user_note_on_paragraphs(user_notes, paragraphs, old_bboxs,para_data=None, snapshot_key=None):
     print(len(paragraphs))
     print(len(old_bboxs))
-    new_para = copy.deepcopy(paragraphs)
-    new_bbox = copy.deepcopy(old_bboxs)
+    # one private copy up front; the notes below only replace list slots
+    state = (copy.deepcopy(paragraphs), copy.deepcopy(old_bboxs), [], para_data)
+    if snapshot_key is not None:
+        state = note_snapshots.replay(snapshot_key, "paragraphs", user_notes, state, _replay_notes_on_paragraphs, PARAGRAPH_NOTE_TARGETS)
+    else:
+        state = _replay_notes_on_paragraphs(user_notes, state)
+    return state
+
+def _replay_notes_on_paragraphs(user_notes, state):
+    new_para, new_bbox, change_ids, para_data = state
+    # changed_para = []
     for note in user_notes:
         if note["target"]=="para":
             # for para in note["content"]:
@@ -446,7 +467,12 @@ def execute_one_note_on_edit_status(user_note, relations):
             print(note_list)
     return relations
 
-def execute_user_note_on_relations(user_notes, relations):
+def execute_user_note_on_relations(user_notes, relations, snapshot_key=None):
+    if snapshot_key is not None:
+        return note_snapshots.replay(snapshot_key, "relations", user_notes, relations, _replay_notes_on_relations, RELATION_NOTE_TARGETS)
+    return _replay_notes_on_relations(user_notes, relations)
+
+def _replay_notes_on_relations(user_notes, relations):
     # check if result is no longer keep the id when user make update, check both text and type
     for note in user_notes:
         if note["target"] == "relation":
@@ -480,6 +506,9 @@ def execute_user_note_on_relations(user_notes, relations):
 def execute_user_note_on_all_data(usernotes, paragraphs, bboxs, entities, relations,para_data=None):
     new_para = copy.deepcopy(paragraphs)
     new_bbox = copy.deepcopy(bboxs)
+    # reorder_all no longer copies, so detach entities/relations once here
+    entities = copy.deepcopy(entities)
+    relations = copy.deepcopy(relations)
     change_ids = []
     for note in usernotes:
         if note["target"]=="edit_status":
@@ -543,59 +572,42 @@ def change_para_id(new_id, object_list):
     for object in object_list:
         return 1
 
-def decide_new_pos(new_entity,char_positions):
+def decide_new_pos(new_entity,char_positions,index_key=None):
     """
     Calculate the relative character positions in a paragraph based on the new entity's absolute positions.
     
     :param entity: CreateEntitySchema, the new entity with absolute positions.
     :param char_positions: List of character positions in the paragraph, where each character is represented by a Rect.
+    :param index_key: optional cache key (e.g. document id + positions_version) to reuse the character index across calls.
     :return: List of indices representing the relative character positions covered by the new entity.
     """
     print("original entity", new_entity)
     entity_rects = new_entity.position.rects
     print("original new entity rects", entity_rects)
+    if index_key is not None:
+        index = character_index_cache.get(index_key, char_positions)
+    else:
+        index = CharacterIndex(char_positions)
+    # the former per-paragraph scan returned [] as soon as it met an empty paragraph
+    if index.has_empty_paragraph:
+        return []
+
     found_para_id = -1
     found_idx = []
-    for para_id, char_list in enumerate(char_positions):
-        relative_indices = []
-        # Flatten character positions for easy comparison
-        # if char_list[0]["pageNumber"] != entity_rects[0].pageNumber:
-        #     continue
-        flattened_char_positions = [(idx, Rect(**char)) for idx, char in enumerate(char_list)]
-
-        
-        # Assume the first character rect from the server as a reference for scaling
-        if not flattened_char_positions:
-            return []
-
-        _, first_server_rect = flattened_char_positions[0]
-        
-        # Calculate scale factors based on width and height
-        width_scale = first_server_rect.width / entity_rects[0].width
-        height_scale = first_server_rect.height / entity_rects[0].height
+    # only paragraphs with characters on the selected pages can match
+    for para_id in index.paragraphs_on({rect.pageNumber for rect in entity_rects}):
+        # Calculate scale factors based on width and height, taking the first character rect
+        # of the paragraph as the reference for scaling
+        first_width, first_height = index.first_sizes[para_id]
+        width_scale = first_width / entity_rects[0].width
+        height_scale = first_height / entity_rects[0].height
 
-        
-        # Scale the entity's rects to match the server's coordinate system
-        scaled_entity_rects = [
-            Rect(
-                x1=rect.x1 * width_scale,
-                y1=rect.y1 * height_scale,
-                x2=rect.x2 * width_scale,
-                y2=rect.y2 * height_scale,
-                width=first_server_rect.width,
-                height=first_server_rect.height,
-                pageNumber=rect.pageNumber
-            )
-            for rect in entity_rects
-        ]
-
-        # Compare each scaled entity rectangle with character positions
-        for scaled_entity_rect in scaled_entity_rects:
-            for idx, char_rect in flattened_char_positions:
-
-                if check_character_inside_bounding_rect(scaled_entity_rect,char_rect):
-                    # If scaled entity rect overlaps with character rect, add index to relative indices
-                    relative_indices.append(idx)
+        relative_indices = []
+        for rect in entity_rects:
+            relative_indices.extend(index.overlapping(
+                para_id, rect.pageNumber,
+                rect.x1 * width_scale, rect.y1 * height_scale,
+                rect.x2 * width_scale, rect.y2 * height_scale).tolist())
 
         # Remove duplicates and sort the indices
         if relative_indices != []: